@@ -0,0 +1,130 @@
+# adaptive_sampling.py
+# Sequential sampling: instead of a fixed number of runs, keep sending requests to a
+# provider until the confidence interval of its mean response time is narrower than a
+# target fraction of the mean, or until a run or spend cap is hit. Stable providers stop
+# after a handful of runs; noisy ones get as many samples as it takes (or as you allow).
+
+import math
+from statistics import NormalDist
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_RUNS = 5
+DEFAULT_MAX_RUNS = 100
+
+# Metric the stopping rule is applied to
+TARGET_METRIC = "response_time"
+
+
+def t_critical(df, confidence=DEFAULT_CONFIDENCE):
+    """
+    Two-sided Student t critical value for `df` degrees of freedom. Exact for df 1 and 2,
+    otherwise from the normal quantile via the Cornish-Fisher expansion (within 1% of the
+    exact value for df >= 3 at 95% confidence, and for df >= 5 at 99%).
+    """
+    p = 0.5 + confidence / 2
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def confidence_half_width(count, total, sum_squares, confidence=DEFAULT_CONFIDENCE):
+    """
+    Half-width of the t confidence interval of a mean, from running sums so that it can
+    be computed in a single pass. Returns None with fewer than two samples.
+    """
+    if count < 2:
+        return None
+    mean = total / count
+    variance = max(0.0, (sum_squares - count * mean * mean) / (count - 1))
+    return t_critical(count - 1, confidence) * math.sqrt(variance / count)
+
+
+class SampleTarget:
+    """
+    Stopping rule for one provider's benchmark. Feed it every result with `add`; `stop_reason`
+    returns why sampling should stop, or None to keep going.
+    """
+
+    def __init__(self, relative_ci, min_runs=DEFAULT_MIN_RUNS, max_runs=DEFAULT_MAX_RUNS, max_spend=None,
+                 confidence=DEFAULT_CONFIDENCE):
+        self.relative_ci = relative_ci
+        self.min_runs = max(2, min_runs)
+        self.max_runs = max_runs
+        self.max_spend = max_spend
+        self.confidence = confidence
+        self.attempts = 0  # Every run, including failures
+        self.count = 0  # Successful runs, which are the ones averaged
+        self.total = 0.0
+        self.sum_squares = 0.0
+        self.spend = 0.0
+
+    def add(self, result):
+        self.attempts += 1
+        self.spend += result["cost"]
+        if result.get("error"):
+            return
+        value = result[TARGET_METRIC]
+        self.count += 1
+        self.total += value
+        self.sum_squares += value * value
+
+    def achieved(self):
+        """Return the current relative CI half-width (half-width / mean), or None."""
+        half_width = confidence_half_width(self.count, self.total, self.sum_squares, self.confidence)
+        if half_width is None or self.total <= 0:
+            return None
+        return half_width / (self.total / self.count)
+
+    def stop_reason(self):
+        if self.max_runs is not None and self.attempts >= self.max_runs:
+            return "max runs"
+        if self.max_spend is not None and self.spend >= self.max_spend:
+            return "max spend"
+        achieved = self.achieved()
+        if self.count >= self.min_runs and achieved is not None and achieved <= self.relative_ci:
+            return "target reached"
+        return None
+
+
+def add_sampling_arguments(parser):
+    """Add the shared sequential sampling options to a script's argument parser."""
+    parser.add_argument(
+        "--target-ci",
+        type=float,
+        default=None,
+        help="Keep sampling each provider until the 95%% CI half-width of the mean response time is "
+             "within this fraction of the mean (e.g. 0.05), instead of a fixed number of runs."
+    )
+    parser.add_argument(
+        "--min-runs",
+        type=int,
+        default=DEFAULT_MIN_RUNS,
+        help="With --target-ci, the fewest successful runs before stopping."
+    )
+    parser.add_argument(
+        "--max-runs",
+        type=int,
+        default=DEFAULT_MAX_RUNS,
+        help="With --target-ci, stop after this many runs per provider even if the target is not met."
+    )
+    parser.add_argument(
+        "--max-spend",
+        type=float,
+        default=None,
+        help="With --target-ci, stop once a provider's runs have cost this many USD."
+    )
+
+
+def target_from_args(args):
+    """Build a fresh SampleTarget (one per provider) from the command line, or None for fixed runs."""
+    if args.target_ci is None:
+        return None
+    return SampleTarget(args.target_ci, args.min_runs, args.max_runs, args.max_spend)
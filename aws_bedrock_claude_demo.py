@@ -1,56 +1,144 @@
-# Use the native inference API to send a text message to Anthropic Claude.
+# aws_bedrock_claude_demo.py
+# Use the native inference API to send a text message to Anthropic Claude on AWS Bedrock.
+# boto3 has no asyncio interface, so each invoke_model call is run on a worker thread.
+# boto3 is imported when the provider is authenticated, so importing this module (or --help) stays fast.
+# The batch_* functions run a workload as a Bedrock batch inference job (see batch_inference.py).
 
-import boto3
+import os
+import sys
 import json
 import time
-import csv
 import argparse
-import sys
-import datetime
-
-# Parse command-line arguments for the question and CSV filename
-parser = argparse.ArgumentParser(description="Benchmark AWS Bedrock Claude model responses.")
-parser.add_argument(
-    "--question",
-    type=str,
-    default="I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?",
-    help="The question to send to the Claude model."
-)
-parser.add_argument(
-    "--csv",
-    type=str,
-    default="bedrock_claude_results.csv",
-    help="The CSV filename to write results to."
+import asyncio
+import functools
+import contextvars
+
+from workload import load_requests, parse_jsonl, to_jsonl
+from response_cache import add_cache_arguments, cache_from_args
+from results_store import ResultsStore, add_store_arguments
+from adaptive_sampling import add_sampling_arguments, target_from_args
+from prompt_cache import add_prompt_cache_arguments, apply_prompt_cache
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from rate_limiter import add_retry_arguments, apply_retry_args, quota_from_env
+from connection_trace import instrument_botocore, mark
+from benchmark_common import (
+    DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, NUM_RUNS, error_result, make_result, stream_metrics, run_benchmark
 )
-args = parser.parse_args()
-prompt = args.question
-csv_filename = args.csv
-
-# Set up Bedrock runtime client and model details
-region_name = "us-east-1"  # Set region as a variable
-client = boto3.client("bedrock-runtime", region_name=region_name)
-model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
-num_runs = 5
-
-# Lists to store metrics for each run
-response_times = []
-completion_tokens_list = []
-prompt_tokens_list = []
-total_tokens_list = []
-responses = []
-costs = []
-timestamps = []  # New list to store timestamps
-
-# Pricing for Claude 3 Sonnet (update if you use a different model)
-input_token_price = 0.003  # USD per 1K input tokens
-output_token_price = 0.015  # USD per 1K output tokens
-
-for i in range(num_runs):
+
+PROVIDER_NAME = "AWS Bedrock Claude"
+DEFAULT_CSV = "bedrock_claude_results.csv"
+
+# Bedrock rejects batch inference jobs with fewer records than this
+BATCH_MIN_RECORDS = 100
+
+# Model invocation job status -> batch_inference.py's "queued", "running", "completed" or "failed"
+BATCH_STATES = {
+    "Submitted": "queued",
+    "Validating": "queued",
+    "Scheduled": "queued",
+    "InProgress": "running",
+    "Stopping": "running",
+    "Completed": "completed",
+    "PartiallyCompleted": "completed",
+    "Failed": "failed",
+    "Stopped": "failed",
+    "Expired": "failed",
+}
+
+
+def load_config(endpoint_url=None):
+    """
+    Return the Bedrock region, model and pricing settings. `endpoint_url` (e.g. a
+    simulated_provider.py server) replaces the regional Bedrock endpoint.
+    """
+    return {
+        "region": "local" if endpoint_url else "us-east-1",
+        "endpoint_url": endpoint_url,
+        "model": "anthropic.claude-3-sonnet-20240229-v1:0",
+        "system": None,  # Optional system prompt
+        "max_tokens": 1100,
+        "temperature": 1.0,
+        "max_pool_connections": 64,
+        # Pricing for Claude 3 Sonnet (update if you use a different model), USD per 1K tokens
+        "input_token_price": 0.003,
+        "output_token_price": 0.015,
+        # Prompt cache reads cost 10% of the input price and writes 125% (prompt caching needs a
+        # model that supports it, e.g. Claude 3.5 Haiku or 3.7 Sonnet)
+        "cached_input_token_price": 0.0003,
+        "cache_write_token_price": 0.00375,
+        # Batch inference reads its records from and writes its output to S3 under
+        # BEDROCK_BATCH_S3_URI (e.g. s3://bucket/prefix), with the service role in
+        # BEDROCK_BATCH_ROLE_ARN, and is priced at 50% of on-demand
+        "batch_s3_uri": os.getenv("BEDROCK_BATCH_S3_URI") or ("s3://local-batch/bedrock" if endpoint_url else None),
+        "batch_role_arn": os.getenv("BEDROCK_BATCH_ROLE_ARN") or (
+            "arn:aws:iam::000000000000:role/local" if endpoint_url else None
+        ),
+        "batch_price_factor": 0.5,
+        # Client-side quota from BEDROCK_RPM / BEDROCK_TPM (unset = unlimited)
+        **quota_from_env("BEDROCK"),
+    }
+
+
+def region_config(config, region):
+    """Return a copy of `config` that targets another Bedrock region, e.g. "us-west-2"."""
+    return dict(config, region=region)
+
+
+def authenticate(config):
+    """
+    Return a boto3 session with its credentials already resolved, so walking the credential
+    chain (environment, profile, SSO, instance metadata) is timed as part of the cold start.
+    """
+    import boto3
+
+    if config.get("endpoint_url"):
+        # A local stand-in does not check signatures, so skip the AWS credential chain
+        return boto3.Session(aws_access_key_id="local", aws_secret_access_key="local")
+    session = boto3.Session()
+    credentials = session.get_credentials()
+    if credentials is not None:
+        credentials.get_frozen_credentials()
+    return session
+
+
+def create_client(config):
+    """Set up the Bedrock runtime client."""
+    from botocore.config import Config
+
+    session = config.get("auth") or authenticate(config)
+    # A worker thread cannot be cancelled, so with --deadline botocore's own socket timeouts
+    # are what free a thread stuck on a hung invoke_model (botocore's default is 60s each)
+    timeouts = {}
+    if config.get("deadline"):
+        timeouts = {"connect_timeout": config["deadline"], "read_timeout": config["deadline"]}
+    client = session.client(
+        "bedrock-runtime",
+        region_name=config["region"],
+        endpoint_url=config.get("endpoint_url"),
+        # Size the connection pool for concurrent load tests. botocore's own retries are off so
+        # throttling is retried (and counted) by the shared retry loop in benchmark_common.
+        config=Config(
+            max_pool_connections=config["max_pool_connections"],
+            retries={"total_max_attempts": 1, "mode": "standard"},
+            **timeouts,
+        ),
+    )
+    # botocore event hooks record connection reuse per request
+    return instrument_botocore(client)
+
+
+async def close_client(client):
+    client.close()
+
+
+def build_request_body(config, prompt):
     # Prepare the request payload
     native_request = {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 1100,
-        "temperature": 1.0,
+        "max_tokens": config["max_tokens"],
+        "temperature": config["temperature"],
         "messages": [
             {
                 "role": "user",
@@ -58,127 +146,288 @@ for i in range(num_runs):
             }
         ],
     }
+    if config.get("system") and config.get("prompt_cache"):
+        # A cache checkpoint after the system prompt caches it for the following requests
+        native_request["system"] = [
+            {"type": "text", "text": config["system"], "cache_control": {"type": "ephemeral"}}
+        ]
+    elif config.get("system"):
+        native_request["system"] = config["system"]
+    return json.dumps(native_request)
 
-    # Send the request and measure response time
-    try:
-        start_time = time.time()
-        response = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(native_request)
-        )
-        end_time = time.time()
-        elapsed = end_time - start_time
-        response_times.append(elapsed)
-    except Exception as e:
-        print(f"ERROR: Can't invoke '{model_id}'. Reason: {e}")
-        response_times.append(0)
-        responses.append("")
-        prompt_tokens_list.append(0)
-        completion_tokens_list.append(0)
-        total_tokens_list.append(0)
-        costs.append(0)
-        timestamps.append("")  # Keep lists in sync
-        continue
-
-    # Decode the response body
+
+def token_counts(usage):
+    """
+    Return (prompt tokens, cached tokens, cache write tokens) from Anthropic usage, where
+    input_tokens leaves out the tokens read from and written to the prompt cache.
+    """
+    cached = usage.get("cache_read_input_tokens") or 0
+    written = usage.get("cache_creation_input_tokens") or 0
+    return usage.get("input_tokens", 0) + cached + written, cached, written
+
+
+def invoke_model(client, model_id, body):
+    """Blocking invoke_model call that returns the raw response body bytes."""
+    response = client.invoke_model(modelId=model_id, body=body)
     body_bytes = response["body"].read() if hasattr(response["body"], "read") else response["body"]
+    mark("response.body.complete")
+    return body_bytes
+
+
+def invoke_model_stream(client, model_id, body):
+    """
+    Blocking invoke_model_with_response_stream call. Events are consumed on the worker
+    thread, so each text delta is timestamped when it arrives rather than when the
+    event loop gets around to it. Returns (text, usage, chunk_times, end_time, messages).
+    """
+    response = client.invoke_model_with_response_stream(modelId=model_id, body=body)
+    chunk_times = []
+    parts = []
+    messages = []
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        message = json.loads(chunk["bytes"].decode("utf-8"))
+        messages.append(message)
+        if message["type"] == "content_block_delta" and message["delta"].get("text"):
+            chunk_times.append(time.perf_counter())
+            parts.append(message["delta"]["text"])
+        elif message["type"] == "message_start":
+            usage.update(message["message"].get("usage", {}))
+        elif message["type"] == "message_delta":
+            usage["output_tokens"] = message.get("usage", {}).get("output_tokens", 0)
+    mark("response.body.complete")
+    return "".join(parts), usage, chunk_times, time.perf_counter(), messages
+
+
+async def send_request(client, config, prompt):
+    """Invoke the model once on a worker thread and return its result record."""
+    if config.get("stream"):
+        return await send_streaming_request(client, config, prompt)
+
+    loop = asyncio.get_running_loop()
+    body = build_request_body(config, prompt)
+
+    # Send the request and measure response time. Errors propagate to the shared retry loop.
+    start_time = time.perf_counter()
+    # Run in a copy of this task's context so the connection hooks see the current request's trace
+    body_bytes = await loop.run_in_executor(
+        None, functools.partial(contextvars.copy_context().run, invoke_model, client, config["model"], body)
+    )
+    elapsed = time.perf_counter() - start_time
+
+    mark("decode.started")
     model_response = json.loads(body_bytes.decode("utf-8"))
+    mark("decode.complete")
 
     # Extract the response text
     try:
         resp_text = model_response["content"][0]["text"]
     except Exception:
         resp_text = ""
-    responses.append(resp_text)
 
     # Extract token usage if available (Bedrock Claude returns usage in 'usage' key)
     usage = model_response.get("usage", {})
-    prompt_tokens = usage.get("input_tokens", 0)
+    prompt_tokens, cached_tokens, cache_write_tokens = token_counts(usage)
     completion_tokens = usage.get("output_tokens", 0)
     total_tokens = prompt_tokens + completion_tokens
 
-    prompt_tokens_list.append(prompt_tokens)
-    completion_tokens_list.append(completion_tokens)
-    total_tokens_list.append(total_tokens)
-
-    # Calculate cost for this call
-    input_cost = (prompt_tokens / 1000) * input_token_price
-    output_cost = (completion_tokens / 1000) * output_token_price
-    total_cost = input_cost + output_cost
-    costs.append(total_cost)
-
-    # Add timestamp for when the model completes
-    completion_time = datetime.datetime.now().isoformat()
-    timestamps.append(completion_time)
-
-    # Count characters and words
-    char_count = len(resp_text)
-    word_count = len(resp_text.split())
-
-    # Print metrics for this run
-    print(f"Run {i+1}:")
-    print(resp_text)
-    print(f"Response time: {elapsed:.2f} seconds")
-    print(f"Prompt tokens: {prompt_tokens}")
-    print(f"Completion tokens: {completion_tokens}")
-    print(f"Total tokens: {total_tokens}")
-    print(f"Characters: {char_count}")
-    print(f"Words: {word_count}")
-    print(f"Region: {region_name}")
-    print(f"Timestamp: {completion_time}")
-    print("-" * 40)
-
-# Write all results to a CSV file for later analysis
-with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
-    writer = csv.writer(csvfile)
-    # Write header row
-    writer.writerow([
-        "Run", "Response Time (s)", "Prompt Tokens", "Completion Tokens", "Total Tokens",
-        "Characters", "Words", "Cost (USD)", "Region", "Timestamp", "Response"
-    ])
-    # Write each run's data
-    for i in range(num_runs):
-        resp_text = responses[i] or ""
-        char_count = len(resp_text)
-        word_count = len(resp_text.split())
-        writer.writerow([
-            i + 1,
-            f"{response_times[i]:.2f}",
-            prompt_tokens_list[i],
-            completion_tokens_list[i],
-            total_tokens_list[i],
-            char_count,
-            word_count,
-            f"{costs[i]:.6f}",
-            region_name,
-            timestamps[i],
-            resp_text.replace('\n', ' ')
-        ])
-    # Write averages row
-    writer.writerow([])
-    writer.writerow([
-        "Average",
-        f"{sum(response_times)/num_runs:.2f}",
-        f"{sum(prompt_tokens_list)/num_runs:.2f}",
-        f"{sum(completion_tokens_list)/num_runs:.2f}",
-        f"{sum(total_tokens_list)/num_runs:.2f}",
-        f"{sum(len(r) for r in responses)/num_runs:.2f}",
-        f"{sum(len(r.split()) for r in responses)/num_runs:.2f}",
-        f"{sum(costs)/num_runs:.6f}",
-        region_name,
-        timestamps[i],
-        ""
-    ])
-
-print(f"Results written to {csv_filename}")
-
-# Print averages to the console for quick reference
-print("Averages over", num_runs, "runs:")
-print(f"Average response time: {sum(response_times)/num_runs:.2f} seconds")
-print(f"Average prompt tokens: {sum(prompt_tokens_list)/num_runs:.2f}")
-print(f"Average completion tokens: {sum(completion_tokens_list)/num_runs:.2f}")
-print(f"Average total tokens: {sum(total_tokens_list)/num_runs:.2f}")
-print(f"Average characters: {sum(len(r) for r in responses)/num_runs:.2f}")
-print(f"Average words: {sum(len(r.split()) for r in responses)/num_runs:.2f}")
-
-print(sys.prefix != sys.base_prefix)
\ No newline at end of file
+    result = make_result(
+        config, elapsed, prompt_tokens, completion_tokens, total_tokens, resp_text,
+        cached_tokens=cached_tokens, cache_write_tokens=cache_write_tokens
+    )
+    if config.get("keep_raw"):
+        result["raw"] = model_response
+    return result
+
+
+async def send_streaming_request(client, config, prompt):
+    """Stream one response with invoke_model_with_response_stream and record chunk timings."""
+    loop = asyncio.get_running_loop()
+    body = build_request_body(config, prompt)
+
+    start_time = time.perf_counter()
+    resp_text, usage, chunk_times, end_time, messages = await loop.run_in_executor(
+        None,
+        functools.partial(contextvars.copy_context().run, invoke_model_stream, client, config["model"], body)
+    )
+
+    prompt_tokens, cached_tokens, cache_write_tokens = token_counts(usage)
+    completion_tokens = usage["output_tokens"]
+    total_tokens = prompt_tokens + completion_tokens
+
+    timing = stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+    result = make_result(
+        config, end_time - start_time, prompt_tokens, completion_tokens, total_tokens, resp_text, timing,
+        cached_tokens=cached_tokens, cache_write_tokens=cache_write_tokens
+    )
+    if config.get("keep_raw"):
+        result["raw"] = messages
+    return result
+
+
+def batch_record(config, prompt, record_id):
+    """One record of a batch inference input file: the invoke_model body under modelInput."""
+    return {"recordId": record_id, "modelInput": json.loads(build_request_body(config, prompt))}
+
+
+def create_batch_client(config):
+    """The Bedrock control plane client that runs batch jobs, and the S3 client for their files."""
+    from botocore.config import Config
+
+    session = config.get("auth") or authenticate(config)
+    # A local stand-in serves every bucket from one host, so address buckets by path
+    s3_config = Config(s3={"addressing_style": "path"}) if config.get("endpoint_url") else None
+    return {
+        "bedrock": session.client("bedrock", region_name=config["region"], endpoint_url=config.get("endpoint_url")),
+        "s3": session.client(
+            "s3", region_name=config["region"], endpoint_url=config.get("endpoint_url"), config=s3_config
+        ),
+    }
+
+
+async def close_batch_client(client):
+    for service_client in client.values():
+        service_client.close()
+
+
+def s3_location(uri):
+    """(bucket, key) of an s3:// URI."""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a blocking boto3 call on a worker thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+async def submit_batch(client, config, records, name):
+    """Write the records to S3 and create the model invocation job; returns the job."""
+    if not config.get("batch_s3_uri") or not config.get("batch_role_arn"):
+        raise ValueError("BEDROCK_BATCH_S3_URI and BEDROCK_BATCH_ROLE_ARN environment variables must be set.")
+    if len(records) < BATCH_MIN_RECORDS and not config.get("endpoint_url"):
+        raise ValueError(f"Bedrock batch inference needs at least {BATCH_MIN_RECORDS} records (got {len(records)}).")
+    prefix = f"{config['batch_s3_uri'].rstrip('/')}/{name}"
+    bucket, key = s3_location(f"{prefix}/input.jsonl")
+    await run_blocking(client["s3"].put_object, Bucket=bucket, Key=key, Body=to_jsonl(records))
+    response = await run_blocking(
+        client["bedrock"].create_model_invocation_job,
+        jobName=name,
+        roleArn=config["batch_role_arn"],
+        modelId=config["model"],
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": f"{prefix}/input.jsonl"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"{prefix}/output/"}},
+    )
+    return {"id": response["jobArn"], "output_uri": f"{prefix}/output/"}
+
+
+async def batch_status(client, config, job):
+    """Poll the job; returns its status (see BATCH_STATES)."""
+    response = await run_blocking(client["bedrock"].get_model_invocation_job, jobIdentifier=job["id"])
+    job["message"] = response.get("message")
+    return response["status"]
+
+
+def batch_line_result(config, line):
+    """The result record for one record of the job's output file."""
+    if "modelOutput" not in line:
+        error = line.get("error") or {}
+        return error_result(config, RuntimeError(error.get("errorMessage") or "No model output"))
+    output = line["modelOutput"]
+    usage = output.get("usage", {})
+    prompt_tokens, cached_tokens, cache_write_tokens = token_counts(usage)
+    completion_tokens = usage.get("output_tokens", 0)
+    text = "".join(block.get("text", "") for block in output.get("content", []))
+    return make_result(
+        config, None, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens, text,
+        cached_tokens=cached_tokens, cache_write_tokens=cache_write_tokens
+    )
+
+
+async def batch_results(client, config, job):
+    """Read the finished job's output file from S3; returns {record id: result record}."""
+    # Bedrock writes <output prefix>/<job id>/<input file name>.out
+    bucket, key = s3_location(f"{job['output_uri']}{job['id'].rsplit('/', 1)[-1]}/input.jsonl.out")
+    response = await run_blocking(client["s3"].get_object, Bucket=bucket, Key=key)
+    body = await run_blocking(response["Body"].read)
+    return {line["recordId"]: batch_line_result(config, line) for line in parse_jsonl(body.decode("utf-8"))}
+
+
+def parse_args(argv=None):
+    # Parse command-line arguments for the question and CSV filename
+    parser = argparse.ArgumentParser(description="Benchmark AWS Bedrock Claude model responses.")
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send to the Claude model."
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        default=DEFAULT_CSV,
+        help="The CSV filename to write results to."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to send instead of repeating --question (see workload.py)."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send requests to this endpoint instead, e.g. a simulated_provider.py server."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use the streaming API and record TTFT, inter-chunk gaps and output tokens/sec."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent before measuring, left out of the results (default 0; the first times the cold start)."
+    )
+    add_cache_arguments(parser)
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_sampling_arguments(parser)
+    add_prompt_cache_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Adaptive sampling decides itself when to stop, so it gets an endless request stream
+    requests = load_requests(args.workload, args.question, NUM_RUNS if args.target_ci is None else None)
+    config = apply_retry_args(load_config(args.endpoint_url), args)
+    apply_hedge_args(config, args)
+    requests, stream = apply_prompt_cache(requests, config, args)
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    run_id = store.start_run(args.run_id, args.resume)
+    print(f"Appending results to {args.results_db} as run {run_id}")
+    try:
+        asyncio.run(run_benchmark(
+            sys.modules[__name__], requests, args.csv, config=config, stream=stream,
+            cache=cache_from_args(args), store=store, run_id=run_id, target=target_from_args(args),
+            warmup=args.warmup, quiet=args.quiet
+        ))
+    finally:
+        stop_trace()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
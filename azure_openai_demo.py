@@ -1,179 +1,375 @@
+# azure_openai_demo.py
+# This script benchmarks Azure OpenAI model responses, including timing, token usage, and output statistics.
+# The openai SDK is imported when a client is created, so importing this module (or --help) stays fast.
+# The batch_* functions run a workload as an Azure OpenAI Batch job (see batch_inference.py).
+
 import os
 import time
-import csv
+import sys
 import argparse
-import datetime
-from openai import AzureOpenAI
-
-# Parse command-line arguments for the question and CSV filename
-parser = argparse.ArgumentParser(description="Benchmark Azure OpenAI model responses.")
-parser.add_argument(
-    "--question",
-    type=str,
-    default="I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?",
-    help="The question to send to the Azure OpenAI model."
-)
-parser.add_argument(
-    "--csv",
-    type=str,
-    default="openai_results.csv",
-    help="The CSV filename to write results to."
+import asyncio
+
+from workload import load_requests, parse_jsonl, to_jsonl
+from response_cache import add_cache_arguments, cache_from_args
+from results_store import ResultsStore, add_store_arguments
+from adaptive_sampling import add_sampling_arguments, target_from_args
+from prompt_cache import add_prompt_cache_arguments, apply_prompt_cache
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from rate_limiter import add_retry_arguments, apply_retry_args, quota_from_env
+from connection_trace import httpx_event_hooks, mark, trace_dns
+from benchmark_common import (
+    DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, NUM_RUNS, error_result, make_result, stream_metrics, run_benchmark
 )
-args = parser.parse_args()
-prompt = args.question
-csv_filename = args.csv
 
-# Load sensitive data from environment variables
-api_key = os.getenv("AZURE_OPENAI_API_KEY")
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")  # Azure OpenAI endpoint
+PROVIDER_NAME = "Azure OpenAI"
+DEFAULT_CSV = "openai_results.csv"
+API_VERSION = "2024-12-01-preview"
 
-if endpoint is None:
-    raise ValueError("AZURE_OPENAI_ENDPOINT environment variable is not set.")
+# Azure OpenAI batch status -> batch_inference.py's "queued", "running", "completed" or "failed"
+BATCH_STATES = {
+    "validating": "queued",
+    "in_progress": "running",
+    "finalizing": "running",
+    "completed": "completed",
+    "failed": "failed",
+    "expired": "failed",
+    "cancelling": "failed",
+    "cancelled": "failed",
+}
 
-model_name = "gpt-4"
-deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")  # Deployment name from environment variable
 
-if deployment is None:
-    raise ValueError("AZURE_OPENAI_DEPLOYMENT environment variable is not set.")
+def load_config(endpoint_url=None):
+    """
+    Read the Azure OpenAI endpoint, deployment and region from environment variables.
+    `endpoint_url` (e.g. a simulated_provider.py server) replaces AZURE_OPENAI_ENDPOINT
+    and makes the other variables optional.
+    """
+    endpoint = endpoint_url or os.getenv("AZURE_OPENAI_ENDPOINT")  # Azure OpenAI endpoint
+    if endpoint is None:
+        raise ValueError("AZURE_OPENAI_ENDPOINT environment variable is not set.")
 
-# Get region/location from environment variable instead of parsing endpoint
-region = os.getenv("AZURE_OPENAI_REGION")
-if region is None:
-    raise ValueError("AZURE_OPENAI_REGION environment variable is not set.")
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")  # Deployment name from environment variable
+    if deployment is None and endpoint_url:
+        deployment = "gpt-4"
+    if deployment is None:
+        raise ValueError("AZURE_OPENAI_DEPLOYMENT environment variable is not set.")
 
-# Initialize the Azure OpenAI client
-client = AzureOpenAI(
-    api_key=api_key,
-    api_version="2024-12-01-preview",
-    azure_endpoint=endpoint
-)
+    # Get region/location from environment variable instead of parsing endpoint
+    region = os.getenv("AZURE_OPENAI_REGION")
+    if region is None and endpoint_url:
+        region = "local"
+    if region is None:
+        raise ValueError("AZURE_OPENAI_REGION environment variable is not set.")
+
+    return {
+        "api_key": os.getenv("AZURE_OPENAI_API_KEY") or ("local" if endpoint_url else None),
+        "endpoint": endpoint,
+        "endpoint_url": endpoint_url,
+        "deployment": deployment,
+        "model": "gpt-4",
+        "region": region,
+        "system": "Hello.",
+        "max_tokens": 4096,
+        "temperature": 1.0,
+        "top_p": 1.0,
+        # Pricing for GPT-4.1 (June 2025), USD per 1K tokens
+        "input_token_price": 2.0 / 1000,
+        "output_token_price": 8.0 / 1000,
+        # Cached input is discounted; writing to the (automatic) prompt cache costs nothing extra
+        "cached_input_token_price": 0.5 / 1000,
+        # Batch jobs need a Global Batch deployment (AZURE_OPENAI_BATCH_DEPLOYMENT, default the
+        # deployment above), whose tokens are billed at half the standard price
+        "batch_deployment": os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT") or deployment,
+        "batch_price_factor": 0.5,
+        # Client-side quota from AZURE_OPENAI_RPM / AZURE_OPENAI_TPM (unset = unlimited)
+        **quota_from_env("AZURE_OPENAI"),
+    }
+
+
+def region_config(config, region):
+    """
+    Return a copy of `config` for the Azure OpenAI resource in another region. `region` is
+    either "name=endpoint" or a region name whose endpoint, and optionally API key and
+    deployment, are read from AZURE_OPENAI_ENDPOINT_<NAME>, AZURE_OPENAI_API_KEY_<NAME> and
+    AZURE_OPENAI_DEPLOYMENT_<NAME> (e.g. AZURE_OPENAI_ENDPOINT_SWEDENCENTRAL). With an
+    `endpoint_url` override every region is sent to that endpoint.
+    """
+    region, _, endpoint = region.partition("=")
+    suffix = region.upper().replace("-", "_")
+    endpoint = config["endpoint_url"] or endpoint or os.getenv(f"AZURE_OPENAI_ENDPOINT_{suffix}")
+    if not endpoint:
+        raise ValueError(f"AZURE_OPENAI_ENDPOINT_{suffix} environment variable is not set.")
+    return dict(
+        config,
+        region=region,
+        endpoint=endpoint,
+        api_key=os.getenv(f"AZURE_OPENAI_API_KEY_{suffix}") or config["api_key"],
+        deployment=os.getenv(f"AZURE_OPENAI_DEPLOYMENT_{suffix}") or config["deployment"],
+    )
 
-# Pricing for GPT-4.1 (June 2025)
-input_token_price = 2.0 / 1000 
-output_token_price = 8.0 / 1000
-
-num_runs = 5  # Number of times to call the API for benchmarking
-
-# Lists to store metrics for each run
-response_times = []
-prompt_tokens_list = []
-completion_tokens_list = []
-total_tokens_list = []
-responses = []
-timestamps = []
-costs = []  # New list to store cost per run
-
-# Run the API call multiple times to gather statistics
-for i in range(num_runs):
-    start_time = time.time()
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": "Hello."},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=4096,
-        temperature=1.0,
-        top_p=1.0,
-        model=deployment
+
+def authenticate(config):
+    """API key authentication needs no token exchange, so there is nothing to acquire up front."""
+    return None
+
+
+def create_client(config):
+    """Initialize the async Azure OpenAI client."""
+    from openai import DEFAULT_TIMEOUT, AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncAzureOpenAI(
+        api_key=config["api_key"],
+        api_version=API_VERSION,
+        azure_endpoint=config["endpoint"],
+        # Retries are handled (and counted) by the shared retry loop in benchmark_common
+        max_retries=0,
+        # With --deadline the SDK gives up on a stalled connection too, not just the harness
+        timeout=config.get("deadline") or DEFAULT_TIMEOUT,
+        # The SDK's default httpx client, with hooks that record connection reuse and latency phases
+        http_client=trace_dns(DefaultAsyncHttpxClient(event_hooks=httpx_event_hooks())),
     )
-    end_time = time.time()
-    elapsed = end_time - start_time
-    response_times.append(elapsed)
+
+
+async def close_client(client):
+    await client.close()
+
+
+def cached_tokens(usage):
+    """Prompt tokens served from Azure's automatic prompt cache (included in prompt_tokens)."""
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def build_messages(config, prompt):
+    messages = []
+    if config.get("system"):
+        messages.append({"role": "system", "content": config["system"]})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+async def send_request(client, config, prompt):
+    """Send one chat completion request and return its result record."""
+    if config.get("stream"):
+        return await send_streaming_request(client, config, prompt)
+
+    start_time = time.perf_counter()
+    response = await client.chat.completions.create(
+        messages=build_messages(config, prompt),
+        max_tokens=config["max_tokens"],
+        temperature=config["temperature"],
+        top_p=config["top_p"],
+        model=config["deployment"]
+    )
+    elapsed = time.perf_counter() - start_time
+    # The SDK decodes the JSON body into a response model between reading it and returning
+    mark("decode.complete")
 
     usage = getattr(response, "usage", None)
     prompt_tokens = getattr(usage, "prompt_tokens", 0) if usage else 0
     completion_tokens = getattr(usage, "completion_tokens", 0) if usage else 0
     total_tokens = getattr(usage, "total_tokens", 0) if usage else 0
 
-    # Calculate cost for this run (divide tokens by 1000)
-    input_cost = (prompt_tokens / 1000) * input_token_price
-    output_cost = (completion_tokens / 1000) * output_token_price
-    total_cost = input_cost + output_cost  # Total cost is the sum of input and output costs
-
-    # Store token usage and cost for this run
-    prompt_tokens_list.append(prompt_tokens)
-    completion_tokens_list.append(completion_tokens)
-    total_tokens_list.append(total_tokens)
-    costs.append(total_cost)
-
     # Get the response text
     resp_text = response.choices[0].message.content or ""
-    responses.append(resp_text)
-
-    # Add timestamp for when the model completes
-    completion_time = datetime.datetime.now().isoformat()
-    timestamps.append(completion_time)
-
-    # Count characters and words in the response
-    char_count = len(resp_text)
-    word_count = len(resp_text.split())
-
-    # Print metrics for this run
-    print(f"Run {i+1}:")
-    print(resp_text)
-    print(f"Response time: {elapsed:.2f} seconds")
-    print(f"Prompt tokens: {prompt_tokens}")
-    print(f"Completion tokens: {completion_tokens}")
-    print(f"Total tokens: {total_tokens}")
-    print(f"Characters: {char_count}")
-    print(f"Words: {word_count}")
-    print(f"Cost (USD): {total_cost:.4f}")
-    print(f"Region: {region}")
-    print(f"Timestamp: {completion_time}")
-    print("-" * 40)
-
-# Write all results to a CSV file for later analysis
-with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
-    writer = csv.writer(csvfile)
-    # Write header row
-    writer.writerow([
-        "Run", "Response Time (s)", "Prompt Tokens", "Completion Tokens", "Total Tokens",
-        "Characters", "Words", "Cost (USD)", "Region", "Timestamp", "Response"
-    ])
-    # Write each run's data
-    for i in range(num_runs):
-        resp_text = responses[i] or ""
-        char_count = len(resp_text)
-        word_count = len(resp_text.split())
-        writer.writerow([
-            i + 1,
-            f"{response_times[i]:.2f}",
-            prompt_tokens_list[i],
-            completion_tokens_list[i],
-            total_tokens_list[i],
-            char_count,
-            word_count,
-            f"{costs[i]:.6f}",
-            region,
-            timestamps[i],
-            resp_text.replace('\n', ' ')
-        ])
-    # Write averages row
-    writer.writerow([])
-    writer.writerow([
-        "Average",
-        f"{sum(response_times)/num_runs:.2f}",
-        f"{sum(prompt_tokens_list)/num_runs:.2f}",
-        f"{sum(completion_tokens_list)/num_runs:.2f}",
-        f"{sum(total_tokens_list)/num_runs:.2f}",
-        f"{sum(len(r) for r in responses)/num_runs:.2f}",
-        f"{sum(len(r.split()) for r in responses)/num_runs:.2f}",
-        f"{sum(costs)/num_runs:.6f}",
-        region,
-        timestamps[i],
-        ""
-    ])
-
-print(f"Results written to {csv_filename}")
-
-# Print averages to the console for quick reference
-print("Averages over", num_runs, "runs:")
-print(f"Average response time: {sum(response_times)/num_runs:.2f} seconds")
-print(f"Average prompt tokens: {sum(prompt_tokens_list)/num_runs:.2f}")
-print(f"Average completion tokens: {sum(completion_tokens_list)/num_runs:.2f}")
-print(f"Average total tokens: {sum(total_tokens_list)/num_runs:.2f}")
-print(f"Average characters: {sum(len(r) for r in responses)/num_runs:.2f}")
-print(f"Average words: {sum(len(r.split()) for r in responses)/num_runs:.2f}")
-print(f"Average cost: {sum(costs)/num_runs:.4f} USD")
-print(f"Average region: {region}")
-print(f"Average timestamp: {timestamps[i]}")
\ No newline at end of file
+    result = make_result(
+        config, elapsed, prompt_tokens, completion_tokens, total_tokens, resp_text, cached_tokens=cached_tokens(usage)
+    )
+    if config.get("keep_raw"):
+        result["raw"] = response.model_dump()
+    return result
+
+
+async def send_streaming_request(client, config, prompt):
+    """Stream one chat completion, timestamping every content chunk as it arrives."""
+    start_time = time.perf_counter()
+    stream = await client.chat.completions.create(
+        messages=build_messages(config, prompt),
+        max_tokens=config["max_tokens"],
+        temperature=config["temperature"],
+        top_p=config["top_p"],
+        model=config["deployment"],
+        stream=True,
+        # Ask for a final chunk carrying token usage
+        stream_options={"include_usage": True},
+    )
+    chunk_times = []
+    parts = []
+    raw_chunks = []
+    usage = None
+    async for chunk in stream:
+        if config.get("keep_raw"):
+            raw_chunks.append(chunk.model_dump())
+        if chunk.choices and chunk.choices[0].delta.content:
+            chunk_times.append(time.perf_counter())
+            parts.append(chunk.choices[0].delta.content)
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    # The SDK stops reading at the [DONE] event and closes the response before httpcore
+    # sees the end of the chunked body, so the connection is dropped rather than returned
+    # to the pool. Streamed Azure runs therefore always show a new connection.
+    mark("response.body.complete")
+    end_time = time.perf_counter()
+
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) if usage else 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) if usage else 0
+    total_tokens = getattr(usage, "total_tokens", 0) if usage else 0
+
+    timing = stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+    result = make_result(
+        config, end_time - start_time, prompt_tokens, completion_tokens, total_tokens, "".join(parts), timing,
+        cached_tokens=cached_tokens(usage)
+    )
+    if config.get("keep_raw"):
+        result["raw"] = raw_chunks
+    return result
+
+
+def batch_record(config, prompt, record_id):
+    """One line of a Batch input file: a chat completion request for the batch deployment."""
+    return {
+        "custom_id": record_id,
+        "method": "POST",
+        "url": "/chat/completions",
+        "body": {
+            "model": config["batch_deployment"],
+            "messages": build_messages(config, prompt),
+            "max_tokens": config["max_tokens"],
+            "temperature": config["temperature"],
+            "top_p": config["top_p"],
+        },
+    }
+
+
+def create_batch_client(config):
+    """The Files and Batch APIs are on the same client as chat completions."""
+    return create_client(config)
+
+
+async def close_batch_client(client):
+    await client.close()
+
+
+async def submit_batch(client, config, records, name):
+    """Upload the records as a Batch input file and create the batch job; returns the job."""
+    input_file = await client.files.create(file=(f"{name}.jsonl", to_jsonl(records)), purpose="batch")
+    # Azure imports the file before a batch may use it
+    while getattr(input_file, "status", "processed") not in ("processed", "error"):
+        await asyncio.sleep(1)
+        input_file = await client.files.retrieve(input_file.id)
+    batch = await client.batches.create(
+        input_file_id=input_file.id, endpoint="/chat/completions", completion_window="24h"
+    )
+    return {"id": batch.id, "batch": batch}
+
+
+async def batch_status(client, config, job):
+    """Poll the batch job; returns its status (see BATCH_STATES)."""
+    job["batch"] = await client.batches.retrieve(job["id"])
+    return job["batch"].status
+
+
+def batch_line_result(config, line):
+    """The result record for one line of a Batch output or error file."""
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        error = line.get("error") or body.get("error") or {}
+        return error_result(config, RuntimeError(error.get("message") or f"HTTP {response.get('status_code')}"))
+    usage = body.get("usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return make_result(
+        config, None, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), usage.get("total_tokens", 0),
+        body["choices"][0]["message"].get("content") or "", cached_tokens=cached
+    )
+
+
+async def batch_results(client, config, job):
+    """Download the finished job's output and error files; returns {record id: result record}."""
+    batch = job["batch"]
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = await client.files.content(file_id)
+        for line in parse_jsonl(content.text):
+            results[line["custom_id"]] = batch_line_result(config, line)
+    return results
+
+
+def parse_args(argv=None):
+    # Parse command-line arguments for the question and CSV filename
+    parser = argparse.ArgumentParser(description="Benchmark Azure OpenAI model responses.")
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send to the Azure OpenAI model."
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        default=DEFAULT_CSV,
+        help="The CSV filename to write results to."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to send instead of repeating --question (see workload.py)."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send requests to this endpoint instead, e.g. a simulated_provider.py server."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use the streaming API and record TTFT, inter-chunk gaps and output tokens/sec."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent before measuring, left out of the results (default 0; the first times the cold start)."
+    )
+    add_cache_arguments(parser)
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_sampling_arguments(parser)
+    add_prompt_cache_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Adaptive sampling decides itself when to stop, so it gets an endless request stream
+    requests = load_requests(args.workload, args.question, NUM_RUNS if args.target_ci is None else None)
+    config = apply_retry_args(load_config(args.endpoint_url), args)
+    apply_hedge_args(config, args)
+    requests, stream = apply_prompt_cache(requests, config, args)
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    run_id = store.start_run(args.run_id, args.resume)
+    print(f"Appending results to {args.results_db} as run {run_id}")
+    try:
+        asyncio.run(run_benchmark(
+            sys.modules[__name__], requests, args.csv, config=config, stream=stream,
+            cache=cache_from_args(args), store=store, run_id=run_id, target=target_from_args(args),
+            warmup=args.warmup, quiet=args.quiet
+        ))
+    finally:
+        stop_trace()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+# batch_inference.py
+# Offline batch inference mode, for bulk jobs where per-request latency does not matter but
+# the cost and the time to finish the whole job do. The workload is converted into each
+# provider's batch input format (an Azure OpenAI Batch input file, Bedrock batch inference
+# records in S3, Vertex AI batch prediction instances in Cloud Storage), submitted as one
+# job, polled until it finishes, and its output parsed back into per-request results:
+#
+#   python batch_inference.py --workload workloads/example.jsonl --providers azure aws
+#   python batch_inference.py --workload workloads/example.jsonl --simulate
+#
+# Each job's wall time is split into submitting (upload and create), queued, running and
+# downloading the results, and is reported with its throughput and its cost at batch
+# prices, next to the realtime results the demo scripts last wrote (openai_results.csv etc.):
+# what the same tokens cost at realtime prices, the realtime cost per 1K output tokens, and
+# how long the same requests would take fanned out as realtime calls at --realtime-concurrency.
+# Queued and running times are only as precise as --poll-interval.
+
+import os
+import csv
+import math
+import time
+import argparse
+import asyncio
+import datetime
+
+import simulated_provider
+from run_all_benchmarks import provider_keys
+from workload import load_requests, request_config
+from benchmark_common import DEFAULT_QUESTION, NUM_RUNS, calculate_cost, error_result, format_optional
+
+batch_csv = "batch_summary.csv"
+batch_requests_csv = "batch_requests.csv"
+
+DEFAULT_POLL_INTERVAL = 60.0  # Seconds between status checks against the real services
+SIMULATED_POLL_INTERVAL = 1.0  # ... and against a simulated provider
+DEFAULT_TIMEOUT_HOURS = 24.0  # Every provider's batch completion window
+
+# Config token prices scaled by the provider's batch_price_factor
+PRICE_FIELDS = ["input_token_price", "output_token_price", "cached_input_token_price", "cache_write_token_price"]
+
+SUMMARY_HEADER = [
+    "Provider", "Batch Job", "Status", "Requests", "Succeeded", "Failed",
+    "Submit Time (s)", "Queued Time (s)", "Running Time (s)", "Results Time (s)", "Wall Time (s)",
+    "Requests/min", "Output Tokens/s", "Prompt Tokens", "Completion Tokens",
+    "Batch Cost (USD)", "Realtime Price (USD)", "Batch Savings (USD)",
+    "Batch Cost per 1K Output Tokens (USD)", "Realtime Cost per 1K Output Tokens (USD)",
+    "Realtime Response Time (s)", "Realtime Concurrency", "Projected Realtime Wall Time (s)",
+    "Realtime Requests/min", "Realtime Results", "Error"
+]
+
+REQUESTS_HEADER = [
+    "Provider", "Record", "Prompt Tokens", "Completion Tokens", "Cached Tokens", "Cost (USD)",
+    "Realtime Price (USD)", "Error", "Tags", "Response"
+]
+
+
+def batch_name():
+    """A job name every provider accepts, unique per second."""
+    return f"llm-benchmark-{datetime.datetime.now():%Y%m%d-%H%M%S}"
+
+
+def record_id(index):
+    """Record ids are 11 lowercase alphanumerics, which Bedrock record ids and Vertex labels both allow."""
+    return f"req{index:08d}"
+
+
+def batch_pricing(config):
+    """Return the config with its token prices scaled to the provider's batch prices."""
+    priced = dict(config)
+    for field in PRICE_FIELDS:
+        if field in config:
+            priced[field] = config[field] * config["batch_price_factor"]
+    return priced
+
+
+def realtime_price(config, result):
+    """What a batch result's tokens would have cost as a realtime call."""
+    return calculate_cost(
+        result["prompt_tokens"], result["completion_tokens"], config, result["cached_tokens"],
+        result["cache_write_tokens"]
+    )
+
+
+def realtime_averages(csv_file):
+    """
+    Return the averages row of a demo script's results CSV as {"response_time",
+    "completion_tokens", "cost"}, or None if there is no usable averages row.
+    """
+    if not os.path.exists(csv_file):
+        return None
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        for row in reader:
+            if row and row[0].strip().lower() == "average":
+                values = dict(zip(header, row))
+                try:
+                    return {
+                        "response_time": float(values["Response Time (s)"]),
+                        "completion_tokens": float(values["Completion Tokens"]),
+                        "cost": float(values["Cost (USD)"]),
+                    }
+                except (KeyError, ValueError):
+                    return None
+    return None
+
+
+async def poll_until_done(provider, client, config, job, started, poll_interval, timeout):
+    """
+    Poll the job until it completes or fails. Returns (final state, {phase: time first seen}),
+    with phases "queued", "running", "completed" and "failed" from the provider's BATCH_STATES.
+    """
+    seen = {}
+    while True:
+        state = await provider.batch_status(client, config, job)
+        phase = provider.BATCH_STATES.get(state, "running")
+        now = time.perf_counter()
+        if phase not in seen:
+            seen[phase] = now
+            print(f"{provider.PROVIDER_NAME}: batch {state} after {now - started:.1f} s")
+        if phase in ("completed", "failed"):
+            return state, seen
+        if now - started > timeout:
+            raise TimeoutError(f"Batch {job['id']} still {state} after {timeout / 3600:.1f} hours")
+        await asyncio.sleep(poll_interval)
+
+
+async def run_batch(provider, requests, endpoint_url=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                    timeout=DEFAULT_TIMEOUT_HOURS * 3600):
+    """
+    Run the requests as one batch job on `provider`, reporting (rather than raising) any
+    failure. Returns the summary dict, with the per-request results under "results".
+    """
+    name = provider.PROVIDER_NAME
+    summary = {"provider": name, "job": "", "state": "", "requests": len(requests), "results": [], "error": None,
+               "realtime": None}
+    print(f"\n=== Running {name} Batch ===\n")
+    try:
+        config = provider.load_config(endpoint_url)
+        records = [
+            provider.batch_record(request_config(config, request), request["prompt"], record_id(i))
+            for i, request in enumerate(requests)
+        ]
+        # Off the event loop, so one provider's SDK import or credential chain does not stall the others
+        config["auth"] = await asyncio.to_thread(provider.authenticate, config)
+        client = await asyncio.to_thread(provider.create_batch_client, config)
+        try:
+            started = time.perf_counter()
+            job = await provider.submit_batch(client, config, records, batch_name())
+            submitted = time.perf_counter()
+            summary["job"] = job["id"]
+            print(f"{name}: submitted batch {job['id']} with {len(records)} requests in {submitted - started:.1f} s")
+            state, seen = await poll_until_done(provider, client, config, job, started, poll_interval, timeout)
+            finished = time.perf_counter()
+            summary["state"] = state
+            results = {}
+            if "completed" in seen:
+                results = await provider.batch_results(client, batch_pricing(config), job)
+            ended = time.perf_counter()
+        finally:
+            await provider.close_batch_client(client)
+    except Exception as e:
+        print(f"Error running {name} batch: {e}")
+        summary["error"] = str(e)
+        return summary
+
+    running = seen.get("running", finished)
+    summary.update({
+        "submit_time": submitted - started,
+        "queued_time": running - submitted,
+        "running_time": finished - running,
+        "results_time": ended - finished,
+        "wall_time": ended - started,
+    })
+    # Requests the output does not account for failed with the job
+    for i, request in enumerate(requests):
+        result = results.get(record_id(i)) or error_result(config, RuntimeError(f"No output (batch {state})"))
+        result["record"] = record_id(i)
+        result["tags"] = request["tags"]
+        result["realtime_price"] = realtime_price(config, result)
+        summary["results"].append(result)
+    return summarize_batch(summary)
+
+
+def summarize_batch(summary):
+    """Add the totals, throughput and batch cost per 1K output tokens to a batch summary."""
+    ok = [r for r in summary["results"] if r["error"] is None]
+    wall_time = summary["wall_time"]
+    completion_tokens = sum(r["completion_tokens"] for r in ok)
+    cost = sum(r["cost"] for r in ok)
+    price = sum(r["realtime_price"] for r in ok)
+    summary.update({
+        "succeeded": len(ok),
+        "failed": len(summary["results"]) - len(ok),
+        "requests_per_min": len(ok) / wall_time * 60 if wall_time > 0 else 0,
+        "output_tokens_per_sec": completion_tokens / wall_time if wall_time > 0 else 0,
+        "prompt_tokens": sum(r["prompt_tokens"] for r in ok),
+        "completion_tokens": completion_tokens,
+        "cost": cost,
+        "realtime_price": price,
+        "savings": price - cost,
+        "cost_per_1k": cost / completion_tokens * 1000 if completion_tokens else None,
+    })
+    return summary
+
+
+def add_realtime_comparison(summary, realtime, concurrency):
+    """
+    Attach a demo script's realtime averages (see realtime_averages) to a batch summary, with
+    the wall time and throughput of sending the batch's requests realtime at `concurrency`.
+    """
+    summary["realtime"] = realtime
+    if not realtime or not realtime["response_time"]:
+        return
+    realtime["cost_per_1k"] = (
+        realtime["cost"] / realtime["completion_tokens"] * 1000 if realtime["completion_tokens"] else None
+    )
+    realtime["wall_time"] = math.ceil(summary["requests"] / concurrency) * realtime["response_time"]
+    realtime["requests_per_min"] = concurrency * 60 / realtime["response_time"]
+
+
+def print_batch(summary, concurrency):
+    name = summary["provider"]
+    if summary["error"]:
+        print(f"{name} batch failed: {summary['error']}")
+        return
+    print(f"{name} batch {summary['job']} ({summary['state']}): "
+          f"{summary['succeeded']} of {summary['requests']} requests succeeded")
+    print(f"Wall time: {summary['wall_time']:.1f} seconds (submit {summary['submit_time']:.1f}, "
+          f"queued {summary['queued_time']:.1f}, running {summary['running_time']:.1f}, "
+          f"results {summary['results_time']:.1f})")
+    print(f"Throughput: {summary['requests_per_min']:.1f} requests/min, "
+          f"{summary['output_tokens_per_sec']:.1f} output tokens/s")
+    print(f"Cost: {summary['cost']:.6f} USD at batch prices, {summary['realtime_price']:.6f} USD at realtime prices "
+          f"(saving {summary['savings']:.6f} USD)")
+    realtime = summary["realtime"]
+    if realtime and "wall_time" in realtime:
+        print(f"Realtime ({realtime['response_time']:.2f} s per request): "
+              f"{realtime['wall_time']:.1f} s for {summary['requests']} requests at concurrency {concurrency}, "
+              f"{realtime['requests_per_min']:.1f} requests/min")
+        print(f"Cost per 1K output tokens: {format_optional(summary['cost_per_1k'], '.6f')} USD batch, "
+              f"{format_optional(realtime['cost_per_1k'], '.6f')} USD realtime")
+    print("-" * 40)
+
+
+def write_batch_csvs(summaries, concurrency, realtime_files):
+    with open(batch_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_HEADER)
+        for summary in summaries:
+            if summary["error"]:
+                writer.writerow(
+                    [summary["provider"], summary["job"], summary["state"], summary["requests"]]
+                    + [""] * (len(SUMMARY_HEADER) - 5) + [summary["error"]]
+                )
+                continue
+            realtime = summary["realtime"] or {}
+            writer.writerow([
+                summary["provider"],
+                summary["job"],
+                summary["state"],
+                summary["requests"],
+                summary["succeeded"],
+                summary["failed"],
+                f"{summary['submit_time']:.2f}",
+                f"{summary['queued_time']:.2f}",
+                f"{summary['running_time']:.2f}",
+                f"{summary['results_time']:.2f}",
+                f"{summary['wall_time']:.2f}",
+                f"{summary['requests_per_min']:.2f}",
+                f"{summary['output_tokens_per_sec']:.1f}",
+                summary["prompt_tokens"],
+                summary["completion_tokens"],
+                f"{summary['cost']:.6f}",
+                f"{summary['realtime_price']:.6f}",
+                f"{summary['savings']:.6f}",
+                format_optional(summary["cost_per_1k"], ".6f"),
+                format_optional(realtime.get("cost_per_1k"), ".6f"),
+                format_optional(realtime.get("response_time"), ".2f"),
+                concurrency if realtime else "",
+                format_optional(realtime.get("wall_time"), ".2f"),
+                format_optional(realtime.get("requests_per_min"), ".2f"),
+                realtime_files[summary["provider"]] if realtime else "",
+                "",
+            ])
+    print(f"\nBatch summary written to {batch_csv}")
+
+    with open(batch_requests_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUESTS_HEADER)
+        for summary in summaries:
+            for r in summary["results"]:
+                writer.writerow([
+                    summary["provider"],
+                    r["record"],
+                    r["prompt_tokens"],
+                    r["completion_tokens"],
+                    r["cached_tokens"],
+                    f"{r['cost']:.6f}",
+                    f"{r['realtime_price']:.6f}",
+                    r["error"] or "",
+                    " ".join(r["tags"]),
+                    r["response"].replace("\n", " "),
+                ])
+    print(f"Per-request batch results written to {batch_requests_csv}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a workload through the providers' batch inference APIs.")
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        choices=sorted(provider_keys),
+        default=list(provider_keys),
+        help="Providers to submit the batch to (default: all)."
+    )
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to batch --runs times when no --workload is given."
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=NUM_RUNS,
+        help="Copies of --question in the batch."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to batch instead of repeating --question (see workload.py)."
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=None,
+        help=f"Seconds between job status checks (default: {DEFAULT_POLL_INTERVAL:g}, "
+             f"or {SIMULATED_POLL_INTERVAL:g} against --endpoint-url or --simulate)."
+    )
+    parser.add_argument(
+        "--timeout-hours",
+        type=float,
+        default=DEFAULT_TIMEOUT_HOURS,
+        help="Give up on a job that has not finished after this many hours."
+    )
+    parser.add_argument(
+        "--realtime-concurrency",
+        type=int,
+        default=1,
+        help="Concurrency the realtime wall time is projected at (the demo scripts send one request at a time)."
+    )
+    parser.add_argument(
+        "--realtime-dir",
+        type=str,
+        default=".",
+        help="Folder with the demo scripts' results CSVs to compare against, e.g. \"Results 20062025\"."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send every provider's batch to this endpoint instead, e.g. a simulated_provider.py server."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and batch against it (offline, no cost)."
+    )
+    return parser.parse_args(argv)
+
+
+async def run_batches(providers, requests, endpoint_url, poll_interval, timeout):
+    """Run the batch on every provider at the same time."""
+    return await asyncio.gather(*(
+        run_batch(provider, requests, endpoint_url, poll_interval, timeout) for provider in providers
+    ))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # A batch job is submitted whole, so the workload is read up front
+    requests = list(load_requests(args.workload, args.question, args.runs))
+    if not requests:
+        raise ValueError("The workload has no requests.")
+    endpoint_url = args.endpoint_url
+    server = None
+    if args.simulate:
+        server = simulated_provider.start_server()
+        endpoint_url = server.url
+        print(f"Using simulated provider at {endpoint_url}")
+    poll_interval = args.poll_interval
+    if poll_interval is None:
+        poll_interval = SIMULATED_POLL_INTERVAL if endpoint_url else DEFAULT_POLL_INTERVAL
+    providers = [provider_keys[key] for key in args.providers]
+
+    try:
+        summaries = asyncio.run(run_batches(
+            providers, requests, endpoint_url, poll_interval, args.timeout_hours * 3600
+        ))
+    finally:
+        if server:
+            server.shutdown()
+
+    realtime_files = {}
+    for provider, summary in zip(providers, summaries):
+        realtime_files[provider.PROVIDER_NAME] = os.path.join(args.realtime_dir, provider.DEFAULT_CSV)
+        if not summary["error"]:
+            add_realtime_comparison(
+                summary, realtime_averages(realtime_files[provider.PROVIDER_NAME]), args.realtime_concurrency
+            )
+    print()
+    for summary in summaries:
+        print_batch(summary, args.realtime_concurrency)
+    write_batch_csvs(summaries, args.realtime_concurrency, realtime_files)
+
+
+if __name__ == "__main__":
+    main()
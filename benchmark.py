@@ -0,0 +1,62 @@
+# benchmark.py
+# Single entry point for the suite, with one subcommand per script:
+#
+#   python benchmark.py all --stream              # run_all_benchmarks.py
+#   python benchmark.py aws --workload workloads/example.jsonl
+#   python benchmark.py load --provider gcp --simulate --concurrency 1 4 16
+#   python benchmark.py azure --help
+#
+# A subcommand's module is imported only once it is selected, and the provider SDKs
+# (openai, google-genai, boto3) only once a provider actually builds its client, so
+# listing the commands or asking a subcommand for --help never pays for an SDK import.
+# startup_time.py (`python benchmark.py startup`) measures this, so regressions show up.
+#
+# The subcommands are the scripts' own main(argv) functions, which can also be called
+# from Python: benchmark.run("gcp", ["--endpoint-url", "http://127.0.0.1:8700"]).
+
+import os
+import sys
+import argparse
+import importlib
+
+# Subcommand -> (module, description)
+COMMANDS = {
+    "all": ("run_all_benchmarks", "Benchmark every provider concurrently and write the summaries."),
+    "azure": ("azure_openai_demo", "Benchmark Azure OpenAI."),
+    "gcp": ("gcp_vertexai_demo", "Benchmark Google Vertex AI Gemini."),
+    "aws": ("aws_bedrock_claude_demo", "Benchmark AWS Bedrock Claude."),
+    "load": ("load_test", "Closed-loop concurrency sweep or open-loop arrival rate load test."),
+    "matrix": ("model_matrix", "Benchmark a matrix of provider, model and region variants."),
+    "latency-model": ("latency_model", "Fit each provider's overhead, prefill and decode cost per token."),
+    "soak": ("soak", "Sample providers on a schedule for hours or days."),
+    "batch": ("batch_inference", "Run a workload through the providers' batch APIs and compare with realtime."),
+    "compare": ("compare_runs", "Regression gate: compare a run against a baseline."),
+    "sketch": ("latency_sketch", "Merge stored latency sketches across runs."),
+    "simulate": ("simulated_provider", "Serve the offline simulated provider APIs."),
+    "worker": ("distributed", "Run as a worker for `all --workers ... --listen`."),
+    "startup": ("startup_time", "Measure the startup and import time of each subcommand."),
+}
+
+
+def run(command, argv=None):
+    """Import `command`'s module and call its main(argv); returns what main returns (an exit code or None)."""
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(argv)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark LLM providers. Run `benchmark.py COMMAND --help` for a command's options.",
+        epilog="commands:\n" + "\n".join(f"  {name:<15}{description}" for name, (_, description) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="COMMAND", help="The command to run (see below).")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="The command's own options.")
+    args = parser.parse_args(argv)
+    # The command's parser names itself after argv[0], so its usage line reads "benchmark.py aws ..."
+    sys.argv[0] = f"{os.path.basename(sys.argv[0])} {args.command}"
+    return run(args.command, args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,782 @@
+# benchmark_common.py
+# Shared helpers for the provider benchmark scripts: the run loop, cost calculation,
+# console output and CSV writing. Each provider script supplies its own client and
+# a single `send_request` coroutine; everything else lives here so that the
+# providers can be driven one at a time or concurrently from run_all_benchmarks.py.
+
+import csv
+import math
+import time
+import asyncio
+import datetime
+import itertools
+
+import metrics_server
+import timeline_trace
+from workload import request_config
+from results_store import ResultsStore
+from latency_sketch import DISTRIBUTION_STATS, LatencySketch
+from adaptive_sampling import DEFAULT_CONFIDENCE, confidence_half_width
+from connection_trace import PHASES, RequestTrace, current_trace, record_chunks
+from hedging import HedgeStats, send_attempt
+from rate_limiter import DEFAULT_MAX_RETRIES, backoff_delay, estimate_tokens, limiter_from_config, retry_after_seconds
+
+# The question used when none is given on the command line
+DEFAULT_QUESTION = "I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?"
+
+NUM_RUNS = 5  # Number of times to call the API for benchmarking
+
+# Runs sent (and left out of the stats) before measuring, so the first measured run is not
+# paying for the TLS handshake and connection pool setup. Off by default because each one
+# is a paid call; --warmup N opts in
+DEFAULT_WARMUP_RUNS = 0
+
+# Column layout shared by every per-provider results CSV
+CSV_HEADER = [
+    "Run", "Response Time (s)", "Prompt Tokens", "Completion Tokens", "Total Tokens",
+    "Characters", "Words", "Cost (USD)", "Cached Tokens", "Cache Write Tokens", "Cache Savings (USD)",
+    "Region", "Timestamp",
+    "TTFT (s)", "Mean Inter-Chunk Gap (ms)", "P95 Inter-Chunk Gap (ms)", "Output Tokens/s",
+    "Connection Reused", "Connection Setup (ms)",
+    "DNS (ms)", "Connect (ms)", "TLS (ms)", "Send (ms)", "Server Wait (ms)", "Body (ms)", "Decode (ms)", "Retries", "Throttle Wait (s)", "Total Time (s)",
+    "Hedge", "Unhedged Time (s)", "Hedge Cost (USD)", "Error", "Tags", "Response"
+]
+
+# Tag used in per-tag summaries for requests without tags
+UNTAGGED = "(untagged)"
+
+# Per-run metrics averaged into the averages row
+AVERAGED_FIELDS = [
+    "response_time", "prompt_tokens", "completion_tokens", "total_tokens", "characters", "words", "cost"
+]
+
+# Streaming metrics recorded per run (None when the run was not streamed)
+STREAM_FIELDS = ["ttft", "mean_gap", "p95_gap", "tokens_per_sec"]
+
+# Metrics with a latency sketch per provider, mapped to their CSV column and number format
+SKETCH_METRICS = {
+    "response_time": ("Response Time (s)", ".3f"),
+    "ttft": ("TTFT (s)", ".3f"),
+    "tokens_per_sec": ("Output Tokens/s", ".1f"),
+}
+
+# Latency phase (connection_trace.PHASES) -> CSV column, in milliseconds
+PHASE_COLUMNS = {
+    "dns": "DNS (ms)",
+    "connect": "Connect (ms)",
+    "tls": "TLS (ms)",
+    "send": "Send (ms)",
+    "server_wait": "Server Wait (ms)",
+    "body": "Body (ms)",
+    "decode": "Decode (ms)",
+}
+
+# Time lost to rate limiting and retries, kept apart from the service latency in response_time
+RETRY_FIELDS = ["retries", "throttle_wait", "total_time"]
+
+# Prompt caching (see prompt_cache.py): input tokens read from and written to the provider's
+# cache, both included in prompt_tokens, and the USD saved against uncached input pricing
+CACHE_FIELDS = ["cached_tokens", "cache_write_tokens", "cache_savings"]
+
+# Provider error codes that mean "slow down" rather than "this request is broken"
+THROTTLE_ERROR_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException",
+    "RESOURCE_EXHAUSTED",
+}
+
+# Exception class names (from any SDK) for failures worth retrying: dropped connections and timeouts
+RETRYABLE_EXCEPTION_NAMES = {
+    "ConnectionError", "TimeoutError", "TransportError", "APIConnectionError", "APITimeoutError",
+    "EndpointConnectionError", "ConnectionClosedError", "ReadTimeoutError", "ConnectTimeoutError",
+}
+
+
+def calculate_cost(prompt_tokens, completion_tokens, config, cached_tokens=0, cache_write_tokens=0):
+    """
+    Return the USD cost of one call using the per-1K token prices in the provider config.
+    Prompt tokens read from or written to a prompt cache are priced at the config's
+    cached_input_token_price and cache_write_token_price (default: the input price).
+    """
+    uncached_tokens = prompt_tokens - cached_tokens - cache_write_tokens
+    input_cost = (
+        uncached_tokens * config["input_token_price"]
+        + cached_tokens * config.get("cached_input_token_price", config["input_token_price"])
+        + cache_write_tokens * config.get("cache_write_token_price", config["input_token_price"])
+    ) / 1000
+    output_cost = (completion_tokens / 1000) * config["output_token_price"]
+    return input_cost + output_cost
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of values using linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def stream_metrics(start_time, chunk_times, end_time, completion_tokens):
+    """
+    Derive streaming metrics from perf_counter timestamps: time to first token,
+    mean and p95 gap between content chunks (ms) and output tokens/sec measured
+    from the first token to the end of the stream.
+    """
+    record_chunks(chunk_times)
+    if not chunk_times:
+        return {field: None for field in STREAM_FIELDS}
+    gaps = [(b - a) * 1000 for a, b in zip(chunk_times, chunk_times[1:])]
+    decode_time = end_time - chunk_times[0]
+    return {
+        "ttft": chunk_times[0] - start_time,
+        "mean_gap": sum(gaps) / len(gaps) if gaps else None,
+        "p95_gap": percentile(gaps, 95),
+        "tokens_per_sec": completion_tokens / decode_time if decode_time > 0 else None,
+    }
+
+
+def make_result(config, elapsed, prompt_tokens, completion_tokens, total_tokens, text, timing=None,
+                cached_tokens=0, cache_write_tokens=0):
+    """
+    Build the per-run result record that is printed, averaged and written to CSV.
+    `timing` is the dict returned by stream_metrics for streamed runs. `cached_tokens` and
+    `cache_write_tokens` are the parts of `prompt_tokens` read from and written to the
+    provider's prompt cache.
+    """
+    cost = calculate_cost(prompt_tokens, completion_tokens, config, cached_tokens, cache_write_tokens)
+    result = {
+        "response_time": elapsed,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": total_tokens,
+        "response": text or "",
+        "characters": len(text or ""),
+        "words": len((text or "").split()),
+        "cost": cost,
+        "cached_tokens": cached_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        "cache_savings": calculate_cost(prompt_tokens, completion_tokens, config) - cost,
+        "region": config["region"],
+        # Timestamp for when the model completes
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+    result.update(timing or {field: None for field in STREAM_FIELDS})
+    result["error"] = None
+    result["throttled"] = False
+    result["tags"] = []
+    return result
+
+
+def is_throttle_error(exc):
+    """Return True if an SDK exception is a rate-limit / quota rejection (HTTP 429 or equivalent)."""
+    # openai uses status_code, google-genai uses code/status
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return True
+    # botocore ClientError carries the AWS error code in its response dict
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and response.get("Error", {}).get("Code") in THROTTLE_ERROR_CODES:
+        return True
+    return getattr(exc, "status", None) in THROTTLE_ERROR_CODES
+
+
+def is_retryable_error(exc):
+    """Return True for throttling, server-side (5xx) errors and connection failures."""
+    if is_throttle_error(exc):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    if isinstance(status, int) and status >= 500:
+        return True
+    return any(cls.__name__ in RETRYABLE_EXCEPTION_NAMES for cls in type(exc).__mro__)
+
+
+def error_result(config, exc):
+    """Build a zero-valued result record for a failed call, keeping the error for reporting."""
+    result = make_result(config, 0, 0, 0, 0, "")
+    result["timestamp"] = ""
+    result["error"] = str(exc)
+    result["throttled"] = is_throttle_error(exc)
+    return result
+
+
+async def traced_send(provider, client, config, prompt):
+    """
+    Make one provider call with its own RequestTrace, which the SDK hooks in
+    connection_trace.py fill in, and record its connection reuse and latency phases.
+    With --trace-file the call is also written to the request timeline (timeline_trace.py).
+    """
+    trace = RequestTrace()
+    token = current_trace.set(trace)
+    call = timeline_trace.call_started()
+    try:
+        result = await provider.send_request(client, config, prompt)
+    except BaseException as e:
+        # Including the cancellation of a hedge's losing call
+        timeline_trace.call_done(call, trace, error=e)
+        raise
+    finally:
+        current_trace.reset(token)
+    timeline_trace.call_done(call, trace, result)
+    result["connection_reused"] = trace.connection_reused()
+    result["connection_setup"] = trace.connection_setup()
+    result["phases"] = trace.phases()
+    return result
+
+
+async def send_with_retries(provider, client, config, prompt):
+    """
+    Send one request through the provider's rate limiter (config["rate_limiter"]), retrying
+    throttled and transient failures with jittered exponential backoff that honours
+    Retry-After. Always returns a result record: `response_time` is the service time of
+    the attempt that succeeded, while `retries`, `throttle_wait` (limiter waits plus
+    backoff sleeps) and `total_time` record what it took to get there. Once retries are
+    exhausted, or the error is not retryable, it is an error result. An attempt that
+    runs past config["deadline"] fails with a retryable timeout.
+    """
+    limiter = config.get("rate_limiter")
+    max_retries = config.get("max_retries", DEFAULT_MAX_RETRIES)
+    estimated = estimate_tokens(config, prompt)
+    throttle_wait = 0.0
+    start_time = time.perf_counter()
+    span = timeline_trace.request_started(provider)
+    try:
+        attempt = 0
+        while True:
+            if limiter:
+                queued_at = time.perf_counter()
+                throttle_wait += await limiter.acquire(estimated)
+                timeline_trace.waited(span, "queued", queued_at)
+            try:
+                used = 0
+                try:
+                    # Bounded by config["deadline"] and hedged per config["hedge"] (see hedging.py)
+                    with metrics_server.in_flight(provider, config):
+                        result = await send_attempt(provider, client, config, prompt, send=traced_send)
+                    # A hedge's duplicate tokens count against the quota too
+                    used = result["total_tokens"] + (result.get("hedge_tokens") or 0)
+                finally:
+                    # Also when the attempt fails or is cancelled, so it does not keep its reservation
+                    if limiter:
+                        limiter.settle(estimated, used)
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable_error(e):
+                    print(f"ERROR: {provider.PROVIDER_NAME} request failed after {attempt + 1} attempt(s): {e}")
+                    result = error_result(config, e)
+                    break
+                delay = backoff_delay(attempt, config, retry_after_seconds(e))
+                kind = "throttled" if is_throttle_error(e) else "failed"
+                metrics_server.record_retry(provider, config, is_throttle_error(e))
+                timeline_trace.retried(span, e, is_throttle_error(e))
+                print(f"{provider.PROVIDER_NAME} request {kind}, retrying in {delay:.1f}s: {e}")
+                backoff_at = time.perf_counter()
+                await asyncio.sleep(delay)
+                timeline_trace.waited(span, "throttle wait", backoff_at)
+                throttle_wait += delay
+                attempt += 1
+                continue
+            break
+    except BaseException as e:
+        # Cancelled or interrupted before there was a result: close the request's track
+        # instead of leaving it open in the trace
+        timeline_trace.request_aborted(span, e)
+        raise
+
+    result["retries"] = attempt
+    result["throttle_wait"] = throttle_wait
+    result["total_time"] = time.perf_counter() - start_time
+    metrics_server.record_result(provider, config, result)
+    timeline_trace.request_done(span, result)
+    return result
+
+
+def format_optional(value, fmt):
+    """Format a metric that may be missing (e.g. streaming metrics on a non-streamed run)."""
+    return "" if value is None else format(value, fmt)
+
+
+def ms(seconds):
+    """Convert an optional duration in seconds to milliseconds."""
+    return None if seconds is None else seconds * 1000
+
+
+def print_run(provider_name, run_number, result, quiet=False):
+    """
+    Print the metrics for a single run. `quiet` prints a single line without the response
+    text, since console output of large responses slows the loop on large workloads.
+    """
+    if quiet:
+        status = f"error: {result['error']}" if result["error"] else (
+            f"{result['response_time']:.2f} s, {result['completion_tokens']} completion tokens"
+        )
+        print(f"{provider_name} run {run_number}: {status}")
+        return
+    text = result["response"]
+    print(f"{provider_name} run {run_number}:")
+    print(text)
+    print(f"Response time: {result['response_time']:.2f} seconds")
+    print(f"Prompt tokens: {result['prompt_tokens']}")
+    print(f"Completion tokens: {result['completion_tokens']}")
+    print(f"Total tokens: {result['total_tokens']}")
+    print(f"Characters: {result['characters']}")
+    print(f"Words: {result['words']}")
+    print(f"Cost (USD): {result['cost']:.6f}")
+    print(f"Region: {result['region']}")
+    print(f"Timestamp: {result['timestamp']}")
+    if result["tags"]:
+        print(f"Tags: {', '.join(result['tags'])}")
+    if result.get("cached_tokens") or result.get("cache_write_tokens"):
+        print(f"Cached tokens: {result['cached_tokens']} read, {result['cache_write_tokens']} written "
+              f"(saved {result['cache_savings']:.6f} USD)")
+    if result.get("retries"):
+        print(f"Retries: {result['retries']} (throttle wait {result['throttle_wait']:.2f} seconds)")
+    if result["error"]:
+        print(f"Error: {result['error']}")
+    if result["ttft"] is not None:
+        print(f"TTFT: {result['ttft']:.3f} seconds")
+        print(f"Mean inter-chunk gap: {format_optional(result['mean_gap'], '.1f')} ms")
+        print(f"P95 inter-chunk gap: {format_optional(result['p95_gap'], '.1f')} ms")
+        print(f"Output tokens/sec: {format_optional(result['tokens_per_sec'], '.1f')}")
+    print("-" * 40)
+
+
+def average_results(results):
+    """
+    Average the per-run metrics in a single pass over any iterable of results, so rows
+    streamed from the results store never have to be held in memory together.
+    Failed runs are counted in `failed` but left out of the averages, rather than
+    dragging them towards zero. The 95% confidence interval half-width of each averaged
+    metric is returned under "<field>_ci", and a LatencySketch of each SKETCH_METRICS
+    field under "sketches", and the mean of each latency phase (over the runs where it
+    was traced) under "phases". With hedging, a hedging.HedgeStats is under "hedging"
+    (None for runs without hedging).
+    """
+    count = 0
+    failed = 0
+    sums = {field: 0 for field in AVERAGED_FIELDS + RETRY_FIELDS + CACHE_FIELDS}
+    sum_squares = {field: 0 for field in AVERAGED_FIELDS}
+    optional = {field: [] for field in STREAM_FIELDS}
+    sketches = {field: LatencySketch() for field in SKETCH_METRICS}
+    reused = []
+    setups = []
+    phase_sums = {phase: 0.0 for phase in PHASES}
+    phase_counts = {phase: 0 for phase in PHASES}
+    hedging = HedgeStats()
+    last = None
+    for r in results:
+        if r.get("error"):
+            failed += 1
+            continue
+        count += 1
+        for field in AVERAGED_FIELDS:
+            sums[field] += r[field]
+            sum_squares[field] += r[field] * r[field]
+        for field in RETRY_FIELDS + CACHE_FIELDS:
+            sums[field] += r.get(field) or 0
+        for field, sketch in sketches.items():
+            sketch.add(r.get(field))
+        if r.get("connection_reused") is not None:
+            reused.append(r["connection_reused"])
+            setups.append(r["connection_setup"])
+        for phase, value in (r.get("phases") or {}).items():
+            if value is not None:
+                phase_sums[phase] += value
+                phase_counts[phase] += 1
+        hedging.add(r)
+        for field in STREAM_FIELDS:
+            if r.get(field) is not None:
+                optional[field].append(r[field])
+        last = r
+    averages = {
+        field: sums[field] / count if count else 0 for field in AVERAGED_FIELDS + RETRY_FIELDS + CACHE_FIELDS
+    }
+    averages.update({
+        field: sum(values) / len(values) if values else None for field, values in optional.items()
+    })
+    averages.update({
+        f"{field}_ci": confidence_half_width(count, sums[field], sum_squares[field]) for field in AVERAGED_FIELDS
+    })
+    averages["sketches"] = sketches
+    averages["connection_reuse_rate"] = sum(reused) / len(reused) if reused else None
+    averages["connection_setup"] = sum(setups) / len(setups) if setups else None
+    averages["phases"] = {
+        phase: phase_sums[phase] / phase_counts[phase] if phase_counts[phase] else None for phase in PHASES
+    }
+    averages["hedging"] = hedging if hedging.runs else None
+    averages["runs"] = count
+    averages["failed"] = failed
+    averages["region"] = last["region"] if last else ""
+    averages["timestamp"] = last["timestamp"] if last else ""
+    return averages
+
+
+def output_throughput(averages):
+    """Average streamed output tokens/s, or completion tokens per second of response time when not streamed."""
+    if averages["tokens_per_sec"] is not None:
+        return averages["tokens_per_sec"]
+    if averages["response_time"]:
+        return averages["completion_tokens"] / averages["response_time"]
+    return None
+
+
+def average_row(averages):
+    """Return the averages row written at the bottom of each results CSV."""
+    hedging = averages.get("hedging")
+    return [
+        "Average",
+        f"{averages['response_time']:.2f}",
+        f"{averages['prompt_tokens']:.2f}",
+        f"{averages['completion_tokens']:.2f}",
+        f"{averages['total_tokens']:.2f}",
+        f"{averages['characters']:.2f}",
+        f"{averages['words']:.2f}",
+        f"{averages['cost']:.6f}",
+        f"{averages['cached_tokens']:.2f}",
+        f"{averages['cache_write_tokens']:.2f}",
+        f"{averages['cache_savings']:.6f}",
+        averages["region"],
+        averages["timestamp"],
+        format_optional(averages["ttft"], ".3f"),
+        format_optional(averages["mean_gap"], ".1f"),
+        format_optional(averages["p95_gap"], ".1f"),
+        format_optional(averages["tokens_per_sec"], ".1f"),
+        format_optional(averages["connection_reuse_rate"], ".0%"),
+        format_optional(ms(averages["connection_setup"]), ".1f"),
+    ] + [
+        format_optional(ms(averages["phases"][phase]), ".1f") for phase in PHASE_COLUMNS
+    ] + [
+        f"{averages['retries']:.2f}",
+        f"{averages['throttle_wait']:.2f}",
+        f"{averages['total_time']:.2f}",
+        f"{hedging.hedged}/{hedging.runs} hedged" if hedging else "",
+        format_optional(hedging.without_hedging.mean() if hedging else None, ".2f"),
+        f"{hedging.hedge_cost / hedging.runs:.6f}" if hedging else "",
+        f"{averages['failed']} failed",
+        "",
+        ""
+    ]
+
+
+def relative_ci(averages):
+    """Return the response time CI half-width as a fraction of the mean, or None."""
+    if averages["response_time_ci"] is None or not averages["response_time"]:
+        return None
+    return averages["response_time_ci"] / averages["response_time"]
+
+
+def ci_row(averages):
+    """
+    Return the confidence interval row (± half-widths) written under the averages row.
+    Like the averages row's failed count, the response time CI relative to the mean
+    goes in the Error column.
+    """
+    row = [
+        f"{DEFAULT_CONFIDENCE:.0%} CI (±)",
+        format_optional(averages["response_time_ci"], ".2f"),
+        format_optional(averages["prompt_tokens_ci"], ".2f"),
+        format_optional(averages["completion_tokens_ci"], ".2f"),
+        format_optional(averages["total_tokens_ci"], ".2f"),
+        format_optional(averages["characters_ci"], ".2f"),
+        format_optional(averages["words_ci"], ".2f"),
+        format_optional(averages["cost_ci"], ".6f"),
+    ] + [""] * (len(CSV_HEADER) - 8)
+    ci = relative_ci(averages)
+    if ci is not None:
+        row[CSV_HEADER.index("Error")] = f"±{ci:.1%} of mean"
+    return row
+
+
+def distribution_rows(averages):
+    """Return one row per DISTRIBUTION_STATS entry (Min, P50, ... Stddev) for the sketched metrics."""
+    rows = []
+    stats = {field: sketch.stats() for field, sketch in averages["sketches"].items()}
+    for name, _ in DISTRIBUTION_STATS:
+        row = [name] + [""] * (len(CSV_HEADER) - 1)
+        for field, (column, fmt) in SKETCH_METRICS.items():
+            row[CSV_HEADER.index(column)] = format_optional(stats[field][name], fmt)
+        rows.append(row)
+    return rows
+
+
+def hedge_label(r):
+    """Hedge column: "won"/"lost" when a hedge was sent, "no" when not, blank without hedging."""
+    if "hedged" not in r:
+        return ""
+    if not r["hedged"]:
+        return "no"
+    return "won" if r["hedge_won"] else "lost"
+
+
+def result_row(run_number, r):
+    """Return the CSV row for one run."""
+    return [
+        run_number,
+        f"{r['response_time']:.2f}",
+        r["prompt_tokens"],
+        r["completion_tokens"],
+        r["total_tokens"],
+        r["characters"],
+        r["words"],
+        f"{r['cost']:.6f}",
+        r.get("cached_tokens", 0),
+        r.get("cache_write_tokens", 0),
+        f"{r.get('cache_savings') or 0:.6f}",
+        r["region"],
+        r["timestamp"],
+        format_optional(r["ttft"], ".3f"),
+        format_optional(r["mean_gap"], ".1f"),
+        format_optional(r["p95_gap"], ".1f"),
+        format_optional(r["tokens_per_sec"], ".1f"),
+        {True: "yes", False: "no"}.get(r.get("connection_reused"), ""),
+        format_optional(ms(r.get("connection_setup")), ".1f"),
+    ] + [
+        format_optional(ms((r.get("phases") or {}).get(phase)), ".1f") for phase in PHASE_COLUMNS
+    ] + [
+        r.get("retries", 0),
+        f"{r.get('throttle_wait') or 0:.2f}",
+        format_optional(r.get("total_time"), ".2f"),
+        hedge_label(r),
+        format_optional(r.get("unhedged_time"), ".2f"),
+        format_optional(r.get("hedge_cost"), ".6f"),
+        r["error"] or "",
+        ";".join(r["tags"]),
+        r["response"].replace('\n', ' ')
+    ]
+
+
+def write_results_csv(csv_filename, results):
+    """
+    Write every run plus an averages row to a CSV file for later analysis. `results` may be
+    any iterable (e.g. rows streamed from the results store); returns the averages.
+    """
+    with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+
+        def written():
+            for i, r in enumerate(results):
+                writer.writerow(result_row(r.get("run_index", i) + 1, r))
+                yield r
+
+        averages = average_results(written())
+        writer.writerow([])
+        writer.writerow(average_row(averages))
+        writer.writerow(ci_row(averages))
+        writer.writerows(distribution_rows(averages))
+    print(f"Results written to {csv_filename}")
+    return averages
+
+
+def print_averages(provider_name, averages):
+    """Print averages to the console for quick reference."""
+    row = dict(zip(CSV_HEADER, average_row(averages)))
+    print(f"{provider_name} averages over {averages['runs']} successful runs ({averages['failed']} failed):")
+    ci = relative_ci(averages)
+    if ci is not None:
+        print(f"Average response time: {row['Response Time (s)']} ± {averages['response_time_ci']:.2f} seconds "
+              f"({DEFAULT_CONFIDENCE:.0%} CI, ±{ci:.1%})")
+    else:
+        print(f"Average response time: {row['Response Time (s)']} seconds")
+    stats = averages["sketches"]["response_time"].stats()
+    if stats["P50"] is not None:
+        print(f"Response time p50/p95/p99: {stats['P50']:.2f} / {stats['P95']:.2f} / {stats['P99']:.2f} seconds")
+    print(f"Average prompt tokens: {row['Prompt Tokens']}")
+    print(f"Average completion tokens: {row['Completion Tokens']}")
+    print(f"Average total tokens: {row['Total Tokens']}")
+    print(f"Average characters: {row['Characters']}")
+    print(f"Average words: {row['Words']}")
+    print(f"Average cost: {row['Cost (USD)']} USD")
+    if averages["cached_tokens"] or averages["cache_write_tokens"]:
+        print(f"Average cached tokens: {row['Cached Tokens']} read, {row['Cache Write Tokens']} written "
+              f"(average saving {row['Cache Savings (USD)']} USD)")
+    print(f"Region: {row['Region']}")
+    print(f"Timestamp: {row['Timestamp']}")
+    if row["TTFT (s)"]:
+        print(f"Average TTFT: {row['TTFT (s)']} seconds")
+        print(f"Average mean inter-chunk gap: {row['Mean Inter-Chunk Gap (ms)']} ms")
+        print(f"Average p95 inter-chunk gap: {row['P95 Inter-Chunk Gap (ms)']} ms")
+        print(f"Average output tokens/sec: {row['Output Tokens/s']}")
+    if row["Connection Reused"]:
+        print(f"Connection reuse: {row['Connection Reused']} of runs "
+              f"(average setup {row['Connection Setup (ms)']} ms)")
+    breakdown = [f"{phase} {row[column]}" for phase, column in PHASE_COLUMNS.items() if row[column]]
+    if breakdown:
+        print(f"Average latency phases (ms): {', '.join(breakdown)}")
+    print(f"Average retries: {row['Retries']}")
+    print(f"Average throttle wait: {row['Throttle Wait (s)']} seconds")
+    hedging = averages.get("hedging")
+    if hedging:
+        print(f"Hedging: {hedging.hedged} of {hedging.runs} runs hedged, {hedging.won} won by the hedge")
+        for label, q in (("p95", 0.95), ("p99", 0.99)):
+            reduction = format_optional(hedging.reduction(q), ".1%")
+            print(f"{label} response time: {hedging.without_hedging.quantile(q):.2f} s without hedging, "
+                  f"{hedging.with_hedging.quantile(q):.2f} s with ({reduction} lower)")
+        print(f"Hedge spend: {hedging.hedge_tokens} extra tokens, {hedging.hedge_cost:.6f} USD "
+              f"({format_optional(hedging.extra_spend(), '.1%')} of cost)")
+
+
+def group_by_tag(results):
+    """Return {tag: [results]}; a run with several tags counts towards each of them."""
+    groups = {}
+    for r in results:
+        for tag in r["tags"] or [UNTAGGED]:
+            groups.setdefault(tag, []).append(r)
+    return groups
+
+
+async def send_workload_request(provider, client, config, request):
+    """
+    Send one workload request with its per-request overrides applied, tagging the result.
+    Goes through the record/replay cache when config["response_cache"] is set, and
+    through the rate limiter and retry loop whenever the provider is actually called.
+    """
+    config = request_config(config, request)
+    cache = config.get("response_cache")
+    if cache is not None:
+        result = await cache.send(provider, client, config, request["prompt"], send=send_with_retries)
+    else:
+        result = await send_with_retries(provider, client, config, request["prompt"])
+    result["tags"] = request["tags"]
+    return result
+
+
+def needs_client(config):
+    """Replaying from the cache never calls the provider, so no client (or credentials) is needed."""
+    cache = config.get("response_cache")
+    return cache is None or cache.mode != "replay"
+
+
+async def start_client(provider, config):
+    """
+    Authenticate and construct a provider's client, timing each step separately from the
+    requests. Both run on a worker thread: the SDK import, credential chain or token refresh
+    would otherwise block the event loop and delay the other providers' requests in flight.
+    Returns (client, cold start dict).
+    """
+    start_time = time.perf_counter()
+    config["auth"] = await asyncio.to_thread(provider.authenticate, config)
+    auth_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    client = await asyncio.to_thread(provider.create_client, config)
+    cold_start = {"auth_time": auth_time, "client_time": time.perf_counter() - start_time}
+    return client, cold_start
+
+
+async def warm_up(provider, client, config, request, warmup_runs, cold_start):
+    """
+    Send `warmup_runs` requests that are left out of the results. The first one pays for
+    the new connection, so its timings complete the cold start record.
+    """
+    for n in range(warmup_runs):
+        result = await send_with_retries(provider, client, request_config(config, request), request["prompt"])
+        if n == 0:
+            cold_start.update({
+                "first_request_time": result["response_time"],
+                "first_connection_setup": result["connection_setup"],
+                "first_connection_reused": result["connection_reused"],
+                "first_request_error": result["error"],
+            })
+    cold_start["warmup_runs"] = warmup_runs
+
+
+def print_cold_start(provider_name, cold_start):
+    """Print the cold start costs measured before the benchmark runs."""
+    print(f"{provider_name} cold start:")
+    print(f"Auth / credential resolution: {cold_start['auth_time']:.3f} seconds")
+    print(f"Client construction: {cold_start['client_time']:.3f} seconds")
+    if cold_start.get("first_request_time") is not None:
+        print(f"First request: {cold_start['first_request_time']:.3f} seconds "
+              f"(connection setup {format_optional(ms(cold_start['first_connection_setup']), '.1f')} ms)")
+    print("-" * 40)
+
+
+async def run_benchmark(provider, requests, csv_filename, config=None, stream=False, cache=None,
+                        store=None, run_id=None, target=None, warmup=0, name=None, client=None, quiet=False):
+    """
+    Benchmark one provider module: create its async client, send each workload request
+    (see workload.py) one after another, appending every completed run to the results
+    store, then write the per-run CSV and print the averages from the store.
+    With `stream=True` each provider uses its streaming API and records TTFT,
+    inter-chunk gaps and output tokens/sec. `cache` is an optional ResponseCache
+    (see response_cache.py) for record/replay. Requests that already completed
+    successfully under `run_id` are skipped, which is how an interrupted run resumes.
+    `target` is an optional adaptive_sampling.SampleTarget: requests are then sent until it
+    says to stop (give it an endless request iterator) rather than until `requests` runs out.
+    Before measuring, the client's authentication and construction are timed and `warmup`
+    runs of the first request are sent and discarded (the first of them measures the new
+    connection); this cold start is saved to the store and returned under "cold_start".
+    `name` is what the results are stored and printed under (default provider.PROVIDER_NAME),
+    so that several regions of one provider can be benchmarked side by side.
+    `client` is an already started client shared with other benchmarks (see model_matrix.py):
+    it is used as is, not closed here, and no cold start is measured for it.
+    `quiet` prints one line per run instead of the response and its metrics.
+    Returns the averages dict.
+    """
+    if config is None:
+        config = provider.load_config()
+    if store is None:
+        store = ResultsStore(":memory:")
+    if run_id is None:
+        run_id = store.start_run()
+    config["stream"] = stream
+    config["response_cache"] = cache
+    config.setdefault("rate_limiter", limiter_from_config(config))
+    name = name or provider.PROVIDER_NAME
+
+    completed = store.completed_runs(run_id, name)
+    if completed:
+        print(f"Resuming {name} run {run_id}: skipping {len(completed)} completed runs")
+    if target is not None:
+        # Runs already in the store count towards the target when resuming
+        for result in store.iter_results(run_id, name, include_response=False):
+            if result["run_index"] in completed:
+                target.add(result)
+
+    stop_reason = None
+
+    shared_client = client is not None
+    cold_start = None
+    if not shared_client and needs_client(config):
+        client, cold_start = await start_client(provider, config)
+    try:
+        if client is not None and warmup:
+            # Warm up with the first request without taking it out of the run
+            requests = iter(requests)
+            first = next(requests, None)
+            if first is not None:
+                timeline_trace.set_run(name, "warmup")
+                await warm_up(provider, client, config, first, warmup, cold_start if cold_start is not None else {})
+                requests = itertools.chain([first], requests)
+        if cold_start is not None:
+            store.save_cold_start(run_id, name, cold_start)
+            print_cold_start(name, cold_start)
+        for i, request in enumerate(requests):
+            if i in completed:
+                continue
+            if target is not None:
+                stop_reason = target.stop_reason()
+                if stop_reason:
+                    break
+            timeline_trace.set_run(name, i)
+            result = await send_workload_request(provider, client, config, request)
+            store.append(run_id, name, i, result)
+            print_run(name, i + 1, result, quiet)
+            if target is not None:
+                target.add(result)
+    finally:
+        if client is not None and not shared_client:
+            await provider.close_client(client)
+
+    averages = write_results_csv(csv_filename, store.iter_results(run_id, name))
+    # Keep the sketches so this run's distributions can be merged with other runs later
+    for field, sketch in averages["sketches"].items():
+        store.save_sketch(run_id, name, field, sketch.to_dict())
+    averages["stop_reason"] = stop_reason
+    averages["cold_start"] = cold_start
+    if stop_reason:
+        print(f"{name} stopped sampling: {stop_reason}")
+    print_averages(name, averages)
+    return averages
@@ -0,0 +1,361 @@
+# compare_runs.py
+# Regression gate: compare a candidate benchmark run against a baseline, per provider
+# (and per model or region, which run under their own names), and exit non-zero when a
+# metric got significantly worse by more than a threshold, so scheduled runs can alert.
+#
+# Each side is either a run id in the results store or a folder of per-provider CSVs,
+# such as an archived "Results 20062025/" directory. Response time, TTFT and output
+# tokens/s are compared with a two-sided Mann-Whitney U test (no assumption that latency
+# is normally distributed) or a bootstrap confidence interval of the change in median:
+#
+#   python compare_runs.py --baseline nightly-1 --candidate nightly-2 --max-regression 10
+#   python compare_runs.py --baseline "Results 20062025" --candidate nightly-2 --test bootstrap
+
+import os
+import csv
+import sys
+import math
+import random
+import argparse
+from statistics import NormalDist, median
+
+from results_store import DEFAULT_RESULTS_DB, ResultsStore
+
+compare_csv = "benchmark_compare.csv"
+
+DEFAULT_ALPHA = 0.05
+DEFAULT_MAX_REGRESSION = 10.0  # Percent change in the median that fails the gate
+DEFAULT_MIN_SAMPLES = 5
+DEFAULT_RESAMPLES = 2000
+
+# Compared metrics: result field -> (per-provider CSV column, True if higher is better)
+METRICS = {
+    "response_time": ("Response Time (s)", False),
+    "ttft": ("TTFT (s)", False),
+    "tokens_per_sec": ("Output Tokens/s", True),
+}
+
+
+def csv_benchmark_name(filename):
+    """
+    The benchmark name a per-provider CSV was written for: "openai_results.csv" is
+    "Azure OpenAI" and "bedrock_claude_results_us-west-2.csv" is "AWS Bedrock Claude
+    (us-west-2)", as in run_all_benchmarks.benchmark_targets. Others keep their file name.
+    """
+    # Imported here: run_all_benchmarks pulls in every provider and the simulator, which
+    # only CSV folder comparisons need
+    from run_all_benchmarks import providers
+
+    stem = os.path.splitext(filename)[0]
+    for name, _, csv_file in providers:
+        base = os.path.splitext(csv_file)[0]
+        if stem == base:
+            return name
+        if stem.startswith(base + "_"):
+            return f"{name} ({stem[len(base) + 1:]})"
+    return stem
+
+
+def legacy_failure(values):
+    """CSVs written before the Error column recorded a failed run as a zero response time or an empty response."""
+    return not float(values.get("Response Time (s)") or 0) or not values.get("Response")
+
+
+def load_csv_folder(path):
+    """Return {benchmark name: {metric: [values]}} from the successful runs in a folder of per-provider CSVs."""
+    samples = {}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".csv"):
+            continue
+        with open(os.path.join(path, filename), newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            # Summaries and other reports are not per-run results
+            if header[:2] != ["Run", "Response Time (s)"]:
+                continue
+            metrics = {field: [] for field in METRICS}
+            for row in reader:
+                # The per-run rows end at the blank line before the averages
+                if not row or not row[0].isdigit():
+                    break
+                values = dict(zip(header, row))
+                if values.get("Error"):
+                    continue
+                if "Error" not in header and legacy_failure(values):
+                    continue
+                for field, (column, _) in METRICS.items():
+                    if values.get(column):
+                        metrics[field].append(float(values[column]))
+        samples[csv_benchmark_name(filename)] = metrics
+    return samples
+
+
+def load_run(store, run_id):
+    """Return {benchmark name: {metric: [values]}} from the successful runs stored under `run_id`."""
+    samples = {}
+    for name in store.providers(run_id):
+        metrics = {field: [] for field in METRICS}
+        for result in store.iter_results(run_id, name, include_response=False):
+            if result.get("error"):
+                continue
+            for field in METRICS:
+                if result.get(field) is not None:
+                    metrics[field].append(result[field])
+        samples[name] = metrics
+    return samples
+
+
+def load_samples(source, results_db):
+    """Load a folder of CSVs if `source` is a directory, otherwise the run `source` from the results store."""
+    if os.path.isdir(source):
+        return load_csv_folder(source)
+    # Opening the store would create (or migrate) it, so check it exists first
+    if not os.path.exists(results_db):
+        raise ValueError(f"{source}: not a folder of results CSVs, and there is no results store at {results_db}")
+    store = ResultsStore(results_db)
+    try:
+        if not store.providers(source):
+            raise ValueError(f"{source}: not a folder of results CSVs or a run in {results_db}")
+        return load_run(store, source)
+    finally:
+        store.close()
+
+
+def mann_whitney(baseline, candidate):
+    """
+    Two-sided p-value of the Mann-Whitney U test that the two samples come from the same
+    distribution, using the normal approximation with tie and continuity corrections
+    (reasonable from about 8 samples a side).
+    """
+    n1, n2 = len(baseline), len(candidate)
+    n = n1 + n2
+    values = sorted([(value, 0) for value in baseline] + [(value, 1) for value in candidate])
+    baseline_rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        # Tied values share the average of their ranks (1-based)
+        rank = (i + j) / 2 + 1
+        baseline_rank_sum += rank * sum(1 for _, group in values[i:j + 1] if group == 0)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    u = baseline_rank_sum - n1 * (n1 + 1) / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = max(0.0, abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return 2 * (1 - NormalDist().cdf(z))
+
+
+def bootstrap_change(baseline, candidate, confidence, resamples=DEFAULT_RESAMPLES, rng=None):
+    """
+    Percentile bootstrap confidence interval (low, high) of the relative change in the
+    median, candidate / baseline - 1. Returns None if a resampled baseline median is 0.
+    """
+    rng = rng or random.Random(0)
+    changes = []
+    for _ in range(resamples):
+        base = median(rng.choices(baseline, k=len(baseline)))
+        if not base:
+            return None
+        changes.append(median(rng.choices(candidate, k=len(candidate))) / base - 1)
+    changes.sort()
+    tail = (1 - confidence) / 2
+    return changes[int(tail * (resamples - 1))], changes[int(math.ceil((1 - tail) * (resamples - 1)))]
+
+
+def compare_metric(baseline, candidate, higher_is_better, args):
+    """
+    Compare one metric's samples. Returns a dict with the medians, the relative change in
+    the median ("change"), the test's p-value or bootstrap interval, and a verdict:
+    "regression", "improvement", "no change" or "insufficient data".
+    """
+    comparison = {
+        "baseline_runs": len(baseline), "candidate_runs": len(candidate),
+        "baseline_median": median(baseline) if baseline else None,
+        "candidate_median": median(candidate) if candidate else None,
+        "change": None, "p_value": None, "interval": None,
+    }
+    if min(len(baseline), len(candidate)) < args.min_samples or not comparison["baseline_median"]:
+        comparison["verdict"] = "insufficient data"
+        return comparison
+    comparison["change"] = comparison["candidate_median"] / comparison["baseline_median"] - 1
+    if args.test == "bootstrap":
+        comparison["interval"] = bootstrap_change(baseline, candidate, 1 - args.alpha, args.resamples)
+        low, high = comparison["interval"] or (0, 0)
+        significant = low > 0 or high < 0
+    else:
+        comparison["p_value"] = mann_whitney(baseline, candidate)
+        significant = comparison["p_value"] < args.alpha
+    worse = comparison["change"] < 0 if higher_is_better else comparison["change"] > 0
+    if not significant or comparison["change"] == 0:
+        comparison["verdict"] = "no change"
+    else:
+        comparison["verdict"] = "regression" if worse else "improvement"
+    # Only a significant regression larger than the threshold fails the gate
+    comparison["fails"] = (
+        comparison["verdict"] == "regression" and abs(comparison["change"]) * 100 > args.max_regression
+    )
+    return comparison
+
+
+def compare_runs(baseline, candidate, args):
+    """Compare every benchmark and metric present in both runs. Returns [(name, metric, comparison)]."""
+    comparisons = []
+    for name in sorted(set(baseline) & set(candidate)):
+        for field in args.metrics:
+            comparison = compare_metric(baseline[name][field], candidate[name][field], METRICS[field][1], args)
+            if comparison["baseline_runs"] or comparison["candidate_runs"]:
+                comparisons.append((name, field, comparison))
+    return comparisons
+
+
+def describe(comparison):
+    """The test statistic behind a verdict, e.g. "p=0.003" or "95% CI +12.1% to +30.4%"."""
+    if comparison["p_value"] is not None:
+        return f"p={comparison['p_value']:.3g}"
+    if comparison["interval"] is not None:
+        low, high = comparison["interval"]
+        return f"CI {low:+.1%} to {high:+.1%}"
+    return ""
+
+
+def print_comparisons(comparisons):
+    """Print every comparison, with regressions and improvements called out."""
+    for name, field, c in comparisons:
+        if c["change"] is None:
+            print(f"{name} {field}: {c['verdict']} ({c['baseline_runs']} baseline, "
+                  f"{c['candidate_runs']} candidate runs)")
+            continue
+        marker = {"regression": "REGRESSION", "improvement": "improvement"}.get(c["verdict"], "no change")
+        if c.get("fails"):
+            marker += " (over threshold)"
+        print(f"{name} {field}: median {c['baseline_median']:.3f} -> {c['candidate_median']:.3f} "
+              f"({c['change']:+.1%}, {describe(c)}, {c['baseline_runs']} vs {c['candidate_runs']} runs): {marker}")
+
+
+def write_compare_csv(comparisons, args):
+    """Write every comparison to benchmark_compare.csv."""
+    header = [
+        "Benchmark", "Metric", "Baseline Runs", "Candidate Runs", "Baseline Median", "Candidate Median",
+        "Change (%)", "Test", "P-Value", f"{1 - args.alpha:.0%} CI Low (%)", f"{1 - args.alpha:.0%} CI High (%)",
+        "Verdict", "Fails Gate"
+    ]
+    with open(compare_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, field, c in comparisons:
+            low, high = c["interval"] or (None, None)
+            writer.writerow([
+                name,
+                field,
+                c["baseline_runs"],
+                c["candidate_runs"],
+                "" if c["baseline_median"] is None else f"{c['baseline_median']:.4f}",
+                "" if c["candidate_median"] is None else f"{c['candidate_median']:.4f}",
+                "" if c["change"] is None else f"{c['change'] * 100:.1f}",
+                args.test,
+                "" if c["p_value"] is None else f"{c['p_value']:.4g}",
+                "" if low is None else f"{low * 100:.1f}",
+                "" if high is None else f"{high * 100:.1f}",
+                c["verdict"],
+                "yes" if c.get("fails") else "no",
+            ])
+    print(f"\nComparison written to {compare_csv}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare a benchmark run against a baseline and exit 1 on significant regressions."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        required=True,
+        help="Baseline run id in the results store, or a folder of per-provider results CSVs."
+    )
+    parser.add_argument(
+        "--candidate",
+        type=str,
+        required=True,
+        help="Candidate run id in the results store, or a folder of per-provider results CSVs."
+    )
+    parser.add_argument(
+        "--results-db",
+        type=str,
+        default=DEFAULT_RESULTS_DB,
+        help="SQLite results store holding the runs."
+    )
+    parser.add_argument(
+        "--baseline-db",
+        type=str,
+        default=None,
+        help="Read the baseline run from this results store instead (default: --results-db)."
+    )
+    parser.add_argument(
+        "--test",
+        choices=["mannwhitney", "bootstrap"],
+        default="mannwhitney",
+        help="Mann-Whitney U test, or a bootstrap confidence interval of the change in median."
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=list(METRICS),
+        default=list(METRICS),
+        help="Metrics to compare (default: all)."
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=DEFAULT_ALPHA,
+        help="Significance level: p-value cut-off, or 1 - the bootstrap confidence level."
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=DEFAULT_MAX_REGRESSION,
+        help="Exit 1 when a significant regression changes a median by more than this percentage."
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=DEFAULT_MIN_SAMPLES,
+        help="Successful runs each side needs before a metric is tested."
+    )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=DEFAULT_RESAMPLES,
+        help="With --test bootstrap, the number of bootstrap resamples."
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        baseline = load_samples(args.baseline, args.baseline_db or args.results_db)
+        candidate = load_samples(args.candidate, args.results_db)
+    except ValueError as e:
+        parser.error(str(e))
+    for name in sorted(set(baseline) ^ set(candidate)):
+        side = "baseline" if name in baseline else "candidate"
+        print(f"{name}: only in the {side}, not compared")
+
+    comparisons = compare_runs(baseline, candidate, args)
+    print_comparisons(comparisons)
+    write_compare_csv(comparisons, args)
+
+    failures = [(name, field) for name, field, c in comparisons if c.get("fails")]
+    if failures:
+        print(f"\n{len(failures)} regression(s) over {args.max_regression:g}%: "
+              + ", ".join(f"{name} {field}" for name, field in failures))
+        return 1
+    print(f"\nNo significant regressions over {args.max_regression:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
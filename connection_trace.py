@@ -0,0 +1,252 @@
+# connection_trace.py
+# Per-request connection and latency phase instrumentation for the provider SDKs.
+#
+# Each attempt in the retry loop sets a RequestTrace in the `current_trace` context
+# variable. The SDK hooks below record timestamped events on whichever trace is current,
+# so concurrent requests on one shared client never mix up their events:
+#
+#   Azure OpenAI / Gemini  httpx request hook that attaches an httpcore "trace" callback
+#                          (connection.connect_tcp, connection.start_tls, http11.* events),
+#                          plus a network backend that times name resolution (dns.*)
+#   Bedrock                wrappers around botocore's connection classes and urllib3's
+#                          create_connection for the connection, request write and
+#                          response header events (botocore has no connection-level events)
+#
+# The provider scripts mark response.body.complete and decode.* themselves where they
+# read and parse the body. RequestTrace.phases() turns the events into a breakdown:
+#
+#   dns  connect  tls  send  server_wait  body  decode
+#
+# Bedrock calls run on executor threads, so they must be submitted with
+# contextvars.copy_context().run to see the caller's trace.
+
+import time
+import socket
+import asyncio
+import functools
+import contextvars
+
+# Latency phases, in the order they happen
+PHASES = ["dns", "connect", "tls", "send", "server_wait", "body", "decode"]
+
+# Events that end the request write, the wait for response headers and the body, from
+# httpcore (http11.*) or from the Bedrock hooks
+REQUEST_STARTED = ["http11.send_request_headers.started", "request.write.started"]
+REQUEST_SENT = ["http11.send_request_body.complete", "request.write.complete"]
+HEADERS_RECEIVED = ["http11.receive_response_headers.complete", "response.headers.complete"]
+BODY_RECEIVED = ["http11.receive_response_body.complete", "response.body.complete"]
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Timestamped (perf_counter) connection and HTTP events for one request attempt."""
+
+    def __init__(self):
+        self.events = {}  # Event name -> first perf_counter timestamp
+        self.chunk_times = None  # Streamed content chunk timestamps, for timeline_trace.py
+
+    def mark(self, name):
+        self.events.setdefault(name, time.perf_counter())
+
+    def new_connection(self):
+        return any(name.startswith("connection.") and name.endswith(".started") for name in self.events)
+
+    def connection_reused(self):
+        """True/False once an HTTP request has been seen, None when nothing was traced (e.g. a cached run)."""
+        if not self.events:
+            return None
+        return not self.new_connection()
+
+    def connection_setup(self):
+        """Seconds spent opening a new connection (DNS, TCP and TLS), 0 on a reused one, None if untraced."""
+        if not self.events:
+            return None
+        started = [t for name, t in self.events.items() if name.startswith("connection.") and name.endswith(".started")]
+        completed = [t for name, t in self.events.items() if name.startswith("connection.") and name.endswith(".complete")]
+        if not started or not completed:
+            return 0.0
+        return max(completed) - min(started)
+
+    def first(self, names):
+        return next((self.events[name] for name in names if name in self.events), None)
+
+    def span(self, start, end):
+        """Seconds between two events (names or lists of alternative names), or None if either is missing."""
+        start = self.first([start] if isinstance(start, str) else start)
+        end = self.first([end] if isinstance(end, str) else end)
+        if start is None or end is None:
+            return None
+        return max(0.0, end - start)
+
+    def phases(self):
+        """
+        Return {phase: seconds} for PHASES. Connection phases are 0 on a reused connection;
+        a phase is None when its events were not seen (e.g. a cached run).
+        """
+        if not self.events:
+            return {phase: None for phase in PHASES}
+        new_connection = self.new_connection()
+        dns = self.span("dns.started", "dns.complete") or 0.0
+        # Name resolution happens inside connect_tcp for both httpcore and the Bedrock wrapper
+        connect = self.span("connection.connect_tcp.started", "connection.connect_tcp.complete")
+        tls = self.span("connection.start_tls.started", "connection.start_tls.complete")
+        if tls is None:
+            # Bedrock: the rest of botocore's connect() after the TCP connection is the TLS handshake
+            tls = self.span("connection.connect_tcp.complete", "connection.connect.complete")
+        body_received = self.first(BODY_RECEIVED)
+        decode = self.span("decode.started", "decode.complete")
+        if decode is None and body_received is not None and "decode.complete" in self.events:
+            # The SDK parsed the body itself, between reading it and returning
+            decode = max(0.0, self.events["decode.complete"] - body_received)
+        return {
+            "dns": dns if new_connection else 0.0,
+            "connect": max(0.0, connect - dns) if connect is not None else (None if new_connection else 0.0),
+            "tls": (tls or 0.0) if new_connection else 0.0,
+            "send": self.span(REQUEST_STARTED, REQUEST_SENT),
+            "server_wait": self.span(REQUEST_SENT, HEADERS_RECEIVED),
+            "body": self.span(HEADERS_RECEIVED, BODY_RECEIVED),
+            "decode": decode,
+        }
+
+
+def mark(name):
+    """Record an event on the current request's trace, if there is one."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def record_chunks(chunk_times):
+    """Keep a streamed response's content chunk timestamps on the current request's trace."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.chunk_times = chunk_times
+
+
+async def attach_httpcore_trace(request):
+    """httpx request hook: route httpcore's trace events for this request to the current RequestTrace."""
+    trace = current_trace.get()
+    if trace is None:
+        return
+
+    async def on_event(name, info):
+        trace.mark(name)
+
+    request.extensions["trace"] = on_event
+
+
+def httpx_event_hooks():
+    """Event hooks for the httpx.AsyncClient used by the OpenAI and google-genai SDKs."""
+    return {"request": [attach_httpcore_trace]}
+
+
+class TracingNetworkBackend:
+    """
+    httpcore network backend that resolves the host itself, timing the lookup as dns.*,
+    before handing the address to the wrapped backend (which would otherwise resolve it
+    inside connect_tcp, where httpcore cannot time it separately).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        mark("dns.started")
+        try:
+            addresses = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            # Let the wrapped backend resolve it and raise its own connect error
+            addresses = [(None, None, None, None, (host, port))]
+        mark("dns.complete")
+        error = None
+        for *_, address in addresses:
+            try:
+                return await self.backend.connect_tcp(address[0], port, timeout, local_address, socket_options)
+            except Exception as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+def trace_dns(http_client):
+    """
+    Time name resolution on an httpx client's connection pool. httpx does not expose
+    httpcore's network_backend option, so the pool's backend is wrapped in place; if the
+    layout differs (e.g. a proxied client) DNS is simply reported inside connect.
+    """
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    backend = getattr(pool, "_network_backend", None)
+    if backend is not None and not isinstance(backend, TracingNetworkBackend):
+        pool._network_backend = TracingNetworkBackend(backend)
+    return http_client
+
+
+def traced(function, event):
+    """Wrap a function so each call marks `event`.started and `event`.complete on the current trace."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        mark(f"{event}.started")
+        try:
+            return function(*args, **kwargs)
+        finally:
+            mark(f"{event}.complete")
+    wrapper.traced = True
+    return wrapper
+
+
+def traced_create_connection(create_connection):
+    """
+    Wrap urllib3's create_connection to time name resolution (dns.*) inside connect_tcp.
+    Like urllib3, it resolves with allowed_gai_family() and tries each address in turn,
+    raising the last error only when none of them connects.
+    """
+    from urllib3.util.connection import allowed_gai_family
+
+    @functools.wraps(create_connection)
+    def wrapper(address, *args, **kwargs):
+        if current_trace.get() is None:
+            return create_connection(address, *args, **kwargs)
+        host, port = address
+        mark("connection.connect_tcp.started")
+        try:
+            mark("dns.started")
+            try:
+                addresses = socket.getaddrinfo(host.strip("[]"), port, allowed_gai_family(), socket.SOCK_STREAM)
+            except OSError:
+                addresses = [(None, None, None, None, (host, port))]  # Let urllib3 raise its own error
+            mark("dns.complete")
+            error = None
+            for *_, resolved in addresses:
+                try:
+                    return create_connection((resolved[0], port), *args, **kwargs)
+                except OSError as e:
+                    error = e
+            raise error
+        finally:
+            mark("connection.connect_tcp.complete")
+    wrapper.traced = True
+    return wrapper
+
+
+def instrument_botocore(client):
+    """Trace a boto3 client's requests, and the connections and HTTP exchanges of any botocore client."""
+    from urllib3.util import connection
+    from botocore.awsrequest import AWSHTTPConnection, AWSHTTPSConnection
+
+    if not getattr(connection.create_connection, "traced", False):
+        connection.create_connection = traced_create_connection(connection.create_connection)
+    for cls in (AWSHTTPConnection, AWSHTTPSConnection):
+        if not getattr(cls.connect, "traced", False):
+            cls.connect = traced(cls.connect, "connection.connect")
+            # request() writes the request line, headers and body; getresponse() waits for the headers
+            cls.request = traced(cls.request, "request.write")
+            cls.getresponse = traced(cls.getresponse, "response.headers")
+    return client
@@ -0,0 +1,392 @@
+# distributed.py
+# Coordinator / worker mode for run_all_benchmarks.py. One Python process cannot keep
+# enough streams in flight to saturate a provisioned-throughput deployment, and under
+# load the GIL shows up in its TTFT numbers, so --workers N splits the workload across N
+# worker processes, each with its own event loop, clients and connection pools:
+#
+#   python run_all_benchmarks.py --workers 4 --worker-concurrency 8 --runs 400 --stream
+#
+# Workers on other hosts connect to a listening coordinator instead of being spawned:
+#
+#   python run_all_benchmarks.py --workers 3 --listen 0.0.0.0:8750 --runs 600 --stream
+#   python distributed.py --coordinator coordinator-host:8750     # on each worker host
+#
+# The protocol is newline-delimited JSON over TCP. The coordinator measures each worker's
+# round trip, sends it a job (the benchmarks, options and its share of the request
+# indexes), waits until every worker has built its clients and sent its warmup runs, then
+# starts them all at the same moment (each start message is sent early by half the
+# worker's round trip). Workers stream every run record back as it completes; the
+# coordinator stores the runs under one run id and writes the usual per-provider CSVs,
+# sketches and summaries from the stored runs.
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import asyncio
+import importlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from workload import load_requests
+from prompt_cache import apply_prompt_cache
+from hedging import apply_hedge_args
+from timeline_trace import set_run, start_trace, stop_trace
+from rate_limiter import apply_retry_args, limiter_from_config
+from benchmark_common import (
+    print_averages, print_cold_start, print_run, send_workload_request, start_client, warm_up,
+    write_results_csv
+)
+
+DEFAULT_PORT = 8750
+
+# Seconds between the last worker becoming ready and the synchronized start
+START_LEAD = 1.0
+
+# Round trips measured per worker; the fastest is used to time its start message
+PINGS = 5
+
+# Seconds a listening coordinator waits for its remote workers to connect
+CONNECT_TIMEOUT = 300
+
+# Options that stay with the coordinator (they are not JSON and the workers do not need them)
+COORDINATOR_OPTIONS = ["regions"]
+
+
+def address(value):
+    """argparse type for HOST:PORT (or HOST, on DEFAULT_PORT) -> (host, port)."""
+    host, _, port = value.rpartition(":") if ":" in value else (value, ":", str(DEFAULT_PORT))
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected HOST:PORT, not {value!r}")
+
+
+class Connection:
+    """Newline-delimited JSON messages over an asyncio stream."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()  # Concurrent senders on a worker share the stream
+
+    async def send(self, message):
+        async with self.lock:
+            self.writer.write((json.dumps(message, default=str) + "\n").encode("utf-8"))
+            await self.writer.drain()
+
+    async def receive(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        return json.loads(line)
+
+    def close(self):
+        self.writer.close()
+
+
+def share(requests, worker, workers, completed):
+    """Yield the (index, request) pairs that belong to `worker`: every workers-th request, minus completed ones."""
+    for index, request in enumerate(requests):
+        if index % workers == worker and index not in completed:
+            yield index, request
+
+
+def worker_options(args, endpoint_url, workers):
+    """
+    The coordinator's options as a JSON-able dict for the workers. Client-side rate
+    limits are divided between the workers so that together they keep to the quota.
+    """
+    options = {key: value for key, value in vars(args).items() if key not in COORDINATOR_OPTIONS}
+    options["endpoint_url"] = endpoint_url
+    for key in ("rpm", "tpm"):
+        if options.get(key):
+            options[key] /= workers
+    return options
+
+
+# Worker side
+
+class TargetShare:
+    """One benchmark's client, config and request share on a worker."""
+
+    def __init__(self, name, provider, region, options, worker, workers, completed):
+        self.name = name
+        self.provider = provider
+        config = provider.load_config(options.endpoint_url)
+        if region is not None:
+            config = provider.region_config(config, region)
+        apply_retry_args(config, options)
+        apply_hedge_args(config, options)
+        requests = load_requests(options.workload, options.question, options.runs)
+        requests, config["stream"] = apply_prompt_cache(requests, config, options)
+        config["response_cache"] = None
+        config["rate_limiter"] = limiter_from_config(config)
+        self.config = config
+        self.requests = share(requests, worker, workers, completed)
+        self.client = None
+        self.cold_start = None
+
+    async def prepare(self, warmup):
+        """Build the client and send the warmup runs, before the synchronized start."""
+        self.client, self.cold_start = await start_client(self.provider, self.config)
+        try:
+            first = next(self.requests, None)
+            if first is None:
+                return
+            if warmup:
+                set_run(self.name, "warmup")
+                await warm_up(self.provider, self.client, self.config, first[1], warmup, self.cold_start)
+            self.requests = itertools.chain([first], self.requests)
+        except BaseException:
+            # The share is dropped, so run() will never close the client
+            await self.provider.close_client(self.client)
+            raise
+
+    async def run(self, connection, concurrency):
+        """Send the share with `concurrency` requests in flight, streaming each record to the coordinator."""
+
+        async def sender():
+            for index, request in self.requests:
+                set_run(self.name, index)
+                result = await send_workload_request(self.provider, self.client, self.config, request)
+                await connection.send({"type": "result", "name": self.name, "run_index": index, "result": result})
+
+        try:
+            await asyncio.gather(*(sender() for _ in range(concurrency)))
+        finally:
+            await self.provider.close_client(self.client)
+
+
+async def run_worker(host, port):
+    """Connect to a coordinator, run the job it sends, and stream the results back."""
+    reader, writer = await asyncio.open_connection(host, port)
+    connection = Connection(reader, writer)
+    await connection.send({"type": "hello", "host": socket.gethostname(), "pid": os.getpid()})
+    while True:
+        message = await connection.receive()
+        if message["type"] == "ping":
+            await connection.send({"type": "pong"})
+        elif message["type"] == "job":
+            break
+
+    worker, workers = message["worker"], message["workers"]
+    options = argparse.Namespace(**message["options"])
+    # Bedrock calls run on executor threads, so make room for every request in flight
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(8, options.worker_concurrency * len(message["targets"])))
+    )
+    if options.trace_file:
+        base, extension = os.path.splitext(options.trace_file)
+        start_trace(f"{base}_worker{worker}{extension}")
+    shares = []
+    for name, module, region in message["targets"]:
+        try:
+            target = TargetShare(
+                name, importlib.import_module(module), region, options, worker, workers,
+                set(message["completed"].get(name, []))
+            )
+            await target.prepare(options.warmup)
+            await connection.send({"type": "cold_start", "name": name, "cold_start": target.cold_start})
+            shares.append(target)
+        except Exception as e:
+            await connection.send({"type": "error", "name": name, "error": str(e)})
+
+    await connection.send({"type": "ready"})
+    message = await connection.receive()
+    await asyncio.sleep(max(0.0, message["start_in"]))
+    try:
+        results = await asyncio.gather(
+            *(target.run(connection, options.worker_concurrency) for target in shares), return_exceptions=True
+        )
+        for target, result in zip(shares, results):
+            if isinstance(result, Exception):
+                await connection.send({"type": "error", "name": target.name, "error": str(result)})
+        await connection.send({"type": "done"})
+    finally:
+        stop_trace()
+        connection.close()
+
+
+# Coordinator side
+
+async def round_trip(connection):
+    """The fastest of PINGS round trips to a worker, in seconds."""
+    fastest = None
+    for _ in range(PINGS):
+        start_time = time.perf_counter()
+        await connection.send({"type": "ping"})
+        await connection.receive()
+        elapsed = time.perf_counter() - start_time
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest
+
+
+async def collect(worker, connection, store, run_id, cold_starts, quiet):
+    """Store one worker's run records until it is done."""
+    while True:
+        try:
+            message = await connection.receive()
+        except ConnectionError:
+            print(f"Worker {worker} disconnected before finishing")
+            return
+        kind = message["type"]
+        if kind == "result":
+            store.append(run_id, message["name"], message["run_index"], message["result"])
+            print_run(f"{message['name']} (worker {worker})", message["run_index"] + 1, message["result"], quiet)
+        elif kind == "cold_start":
+            cold_starts.setdefault(message["name"], []).append(message["cold_start"])
+        elif kind == "error":
+            print(f"Error running {message['name']} benchmark on worker {worker}: {message['error']}")
+        elif kind == "done":
+            return
+
+
+def merge_cold_starts(cold_starts):
+    """Each worker pays its own cold start; report the slowest, which is what held up the start."""
+    return max(cold_starts, key=lambda cold_start: cold_start.get("first_request_time") or 0)
+
+
+async def run_coordinator(targets, store, run_id, args, endpoint_url):
+    """
+    Split the benchmarks in `targets` (see run_all_benchmarks.benchmark_targets) across
+    args.workers workers, spawned locally or (with --listen) connecting from other hosts,
+    and write the merged per-provider CSVs. Returns {benchmark name: averages}.
+    """
+    workers = args.workers
+    connections = asyncio.Queue()
+
+    async def connected(reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            hello = await connection.receive()
+            print(f"Worker connected from {hello['host']} (pid {hello['pid']})")
+        except (ConnectionError, ValueError, KeyError, TypeError) as e:
+            # Not a worker (or one that dropped before saying hello); keep waiting for the others
+            print(f"Ignoring connection that did not say hello: {e!r}")
+            connection.close()
+            return
+        await connections.put(connection)
+
+    host, port = args.listen or ("127.0.0.1", 0)
+    server = await asyncio.start_server(connected, host, port)
+    port = server.sockets[0].getsockname()[1]
+    processes = []
+    pool = []
+    if args.listen:
+        print(f"Waiting for {workers} workers: run `python distributed.py --coordinator <this host>:{port}` on each")
+    else:
+        for _ in range(workers):
+            processes.append(await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "--coordinator", f"127.0.0.1:{port}"
+            ))
+
+    try:
+        while len(pool) < workers:
+            pool.append(await asyncio.wait_for(connections.get(), CONNECT_TIMEOUT))
+        round_trips = [await round_trip(connection) for connection in pool]
+        options = worker_options(args, endpoint_url, workers)
+        completed = {name: sorted(store.completed_runs(run_id, name)) for name, _, _, _ in targets}
+        job_targets = [[name, provider.__name__, region] for name, provider, _, region in targets]
+        for worker, connection in enumerate(pool):
+            await connection.send({
+                "type": "job", "worker": worker, "workers": workers, "options": options, "targets": job_targets,
+                "completed": completed,
+            })
+
+        # Every worker builds its clients and warms up first, so the measured runs start together
+        cold_starts = {}
+        for worker, connection in enumerate(pool):
+            while True:
+                message = await connection.receive()
+                if message["type"] == "ready":
+                    break
+                if message["type"] == "cold_start":
+                    cold_starts.setdefault(message["name"], []).append(message["cold_start"])
+                elif message["type"] == "error":
+                    print(f"Error starting {message['name']} benchmark on worker {worker}: {message['error']}")
+        print(f"\n=== Starting {workers} workers ===\n")
+        for connection, rtt in zip(pool, round_trips):
+            await connection.send({"type": "start", "start_in": START_LEAD - rtt / 2})
+        await asyncio.gather(*(
+            collect(worker, connection, store, run_id, cold_starts, args.quiet)
+            for worker, connection in enumerate(pool)
+        ))
+    finally:
+        server.close()
+        for connection in pool:
+            connection.close()
+        for process in processes:
+            await process.wait()
+
+    results = {}
+    for name, _, csv_file, _ in targets:
+        if name in cold_starts:
+            cold_start = merge_cold_starts(cold_starts[name])
+            store.save_cold_start(run_id, name, cold_start)
+            print_cold_start(name, cold_start)
+        averages = write_results_csv(csv_file, store.iter_results(run_id, name))
+        # Built from every stored run, so a resumed run's sketches cover its earlier runs too
+        for field, sketch in averages["sketches"].items():
+            store.save_sketch(run_id, name, field, sketch.to_dict())
+        print_averages(name, averages)
+        results[name] = averages
+    return results
+
+
+def add_worker_arguments(parser):
+    """Add the coordinator options to run_all_benchmarks.py's argument parser."""
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Split the workload across this many worker processes (spawned locally unless --listen is given)."
+    )
+    parser.add_argument(
+        "--listen",
+        type=address,
+        default=None,
+        metavar="HOST:PORT",
+        help="With --workers, wait for that many workers to connect here (from distributed.py --coordinator)."
+    )
+    parser.add_argument(
+        "--worker-concurrency",
+        type=int,
+        default=1,
+        help="With --workers, requests each worker keeps in flight per provider."
+    )
+
+
+def check_worker_args(parser, args):
+    """Reject options that cannot be split across workers."""
+    if args.workers is None:
+        if args.listen:
+            parser.error("--listen needs --workers")
+        return
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.target_ci is not None:
+        parser.error("--target-ci decides when to stop per process, so it cannot be combined with --workers")
+    if args.cache_mode != "passthrough":
+        parser.error("--cache-mode cannot be combined with --workers")
+    if args.metrics_port is not None:
+        parser.error("--metrics-port serves one process's metrics, so it cannot be combined with --workers")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run as a benchmark worker for run_all_benchmarks.py --workers.")
+    parser.add_argument(
+        "--coordinator",
+        type=address,
+        required=True,
+        metavar="HOST:PORT",
+        help=f"The coordinator to connect to (run_all_benchmarks.py --listen, default port {DEFAULT_PORT})."
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(run_worker(*args.coordinator))
+
+
+if __name__ == "__main__":
+    main()
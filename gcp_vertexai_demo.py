@@ -1,66 +1,187 @@
 # gcp_vertexai_demo.py
 # This script benchmarks Google Vertex AI Gemini model responses, including timing, token usage, and output statistics.
+# google-genai and google-auth are imported in the functions that use them, so importing this
+# module (or --help) stays fast.
+# The batch_* functions run a workload as a Vertex AI batch prediction job (see
+# batch_inference.py) through the Vertex AI and Cloud Storage REST APIs.
 
 import os
+import sys
 import time
-import csv
+import weakref
 import argparse
-import datetime
-from google import genai
-from google.genai import types
-
-# Parse command-line arguments for the question and CSV filename
-parser = argparse.ArgumentParser(description="Benchmark GCP Vertex AI Gemini model responses.")
-parser.add_argument(
-    "--question",
-    type=str,
-    default="I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?",
-    help="The question to send to the Gemini model."
-)
-parser.add_argument(
-    "--csv",
-    type=str,
-    default="vertexai_results.csv",
-    help="The CSV filename to write results to."
+import asyncio
+from urllib.parse import quote
+
+from workload import load_requests, parse_jsonl, to_jsonl
+from response_cache import add_cache_arguments, cache_from_args
+from results_store import ResultsStore, add_store_arguments
+from adaptive_sampling import add_sampling_arguments, target_from_args
+from prompt_cache import add_prompt_cache_arguments, apply_prompt_cache
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from rate_limiter import add_retry_arguments, apply_retry_args, quota_from_env
+from connection_trace import current_trace, httpx_event_hooks, trace_dns
+from benchmark_common import (
+    DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, NUM_RUNS, error_result, make_result, stream_metrics, run_benchmark
 )
-args = parser.parse_args()
-prompt = args.question
-csv_filename = args.csv
 
-def generate():
+PROVIDER_NAME = "GCP Vertex AI"
+DEFAULT_CSV = "vertexai_results.csv"
+
+# Batch prediction job state -> batch_inference.py's "queued", "running", "completed" or "failed"
+BATCH_STATES = {
+    "JOB_STATE_QUEUED": "queued",
+    "JOB_STATE_PENDING": "queued",
+    "JOB_STATE_RUNNING": "running",
+    "JOB_STATE_SUCCEEDED": "completed",
+    "JOB_STATE_PARTIALLY_SUCCEEDED": "completed",
+    "JOB_STATE_FAILED": "failed",
+    "JOB_STATE_CANCELLING": "failed",
+    "JOB_STATE_CANCELLED": "failed",
+    "JOB_STATE_EXPIRED": "failed",
+}
+
+# Context caches created for --prompt-cache, per client: {(model, system prompt): task -> cache name}
+context_caches = weakref.WeakKeyDictionary()
+
+
+def load_config(endpoint_url=None):
+    """
+    Read the GCP project from the environment and return the Gemini benchmark settings.
+    `endpoint_url` (e.g. a simulated_provider.py server) sends requests there instead of
+    Vertex AI and makes GOOGLE_CLOUD_PROJECT optional.
+    """
     # Get the GCP project ID from environment variable
     project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-    if not project_id:
+    if not project_id and not endpoint_url:
         raise ValueError("GOOGLE_CLOUD_PROJECT environment variable is not set.")
 
-    # Set the location as a variable (can be changed as needed)
-    location = "global"
+    return {
+        "project": project_id,
+        "endpoint_url": endpoint_url,
+        "model": "gemini-2.5-pro",  # Model name to use
+        "region": "local" if endpoint_url else "global",  # Vertex AI location (can be changed as needed)
+        "system": None,  # Optional system instruction
+        "max_tokens": 3000,  # Allow enough tokens for 600+ words
+        "temperature": 1,
+        "top_p": 1,
+        "seed": 0,
+        # Pricing for Gemini 2.5 Pro (June 2025), USD per 1K tokens
+        "input_token_price": 0.00125,
+        "output_token_price": 0.01,
+        # Tokens read from a context cache (cache storage, billed per hour, is not included)
+        "cached_input_token_price": 0.00031,
+        "context_cache_ttl": "600s",  # How long a --prompt-cache context cache lives at most
+        # Batch prediction reads and writes Cloud Storage under VERTEX_AI_BATCH_GCS_URI (e.g.
+        # gs://bucket/prefix), runs in a regional location and is billed at a 50% discount
+        "batch_gcs_uri": os.getenv("VERTEX_AI_BATCH_GCS_URI") or ("gs://local-batch/vertex" if endpoint_url else None),
+        "batch_region": os.getenv("VERTEX_AI_BATCH_REGION") or "us-central1",
+        "batch_price_factor": 0.5,
+        # Client-side quota from VERTEX_AI_RPM / VERTEX_AI_TPM (unset = unlimited)
+        **quota_from_env("VERTEX_AI"),
+    }
+
+
+def region_config(config, region):
+    """Return a copy of `config` that targets another Vertex AI location, e.g. "europe-west4"."""
+    return dict(config, region=region)
+
+
+def authenticate(config):
+    """
+    Resolve Application Default Credentials and fetch an access token now, so the token
+    exchange is timed as part of the cold start rather than hidden in the first request.
+    """
+    if config.get("endpoint_url"):
+        return None
+    import google.auth
+    import google.auth.transport.requests
+
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    credentials.refresh(google.auth.transport.requests.Request())
+    return credentials
 
-    # Initialize the Vertex AI client for Gemini models
-    client = genai.Client(
-        vertexai=True,
-        project=project_id,
-        location=location,
+
+def create_client(config):
+    """Initialize the Vertex AI client for Gemini models."""
+    from google import genai
+    from google.genai import types
+
+    # Hooks on the SDK's httpx client record connection reuse and latency phases per request
+    client_args = {"event_hooks": httpx_event_hooks()}
+    # With --deadline the SDK gives up on a stalled connection too (HttpOptions takes milliseconds)
+    timeout = int(config["deadline"] * 1000) if config.get("deadline") else None
+    if config.get("endpoint_url"):
+        # Gemini API-style client (no Google credentials needed) against the overridden endpoint
+        client = genai.Client(
+            api_key="local",
+            http_options=types.HttpOptions(
+                base_url=config["endpoint_url"], timeout=timeout, async_client_args=client_args
+            ),
+        )
+    else:
+        client = genai.Client(
+            vertexai=True,
+            project=config["project"],
+            location=config["region"],
+            credentials=config.get("auth"),
+            http_options=types.HttpOptions(timeout=timeout, async_client_args=client_args),
+        )
+    # The SDK builds its httpx client internally, so DNS timing is added to it afterwards
+    trace_dns(getattr(client._api_client, "_async_httpx_client", None))
+    return client
+
+
+async def close_client(client):
+    # Delete the context caches now rather than paying for their storage until the TTL runs out
+    for task in context_caches.pop(client, {}).values():
+        if task.done() and not task.cancelled() and task.exception() is None:
+            await client.aio.caches.delete(name=task.result())
+    await client.aio.aclose()
+
+
+async def create_context_cache(client, config):
+    """Create a context cache holding the system prompt and return its name."""
+    from google.genai import types
+
+    # This runs as its own task: keep its HTTP call out of the first request's phase trace
+    current_trace.set(None)
+    cache = await client.aio.caches.create(
+        model=config["model"],
+        config=types.CreateCachedContentConfig(system_instruction=config["system"], ttl=config["context_cache_ttl"]),
     )
+    return cache.name
 
-    model = "gemini-2.5-pro"  # Model name to use
 
-    # Use the prompt from the command line
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt)
-            ]
-        ),
-    ]
+async def context_cache(client, config):
+    """Return the name of the context cache for config["system"], creating it on first use."""
+    caches = context_caches.setdefault(client, {})
+    key = (config["model"], config["system"])
+    if key not in caches:
+        # Concurrent first requests wait on the same creation
+        caches[key] = asyncio.ensure_future(create_context_cache(client, config))
+    try:
+        return await caches[key]
+    except Exception:
+        # Let the retry loop try to create it again
+        caches.pop(key, None)
+        raise
+
+
+def build_generate_content_config(config, cached_content=None):
+    from google.genai import types
 
-    # Configure generation parameters and safety settings
-    generate_content_config = types.GenerateContentConfig(
-        temperature=1,
-        top_p=1,
-        seed=0,
-        max_output_tokens=3000,  # Allow enough tokens for 600+ words
+    # Configure generation parameters and safety settings. A context cache already holds
+    # the system instruction, which may then not be sent again.
+    return types.GenerateContentConfig(
+        temperature=config["temperature"],
+        top_p=config["top_p"],
+        seed=config["seed"],
+        max_output_tokens=config["max_tokens"],
+        system_instruction=None if cached_content else config.get("system"),
+        cached_content=cached_content,
         safety_settings=[
             types.SafetySetting(
                 category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
@@ -81,135 +202,268 @@ def generate():
         ],
     )
 
-    num_runs = 5  # Number of times to call the API for benchmarking
-
-    # Lists to store metrics for each run
-    response_times = []
-    prompt_tokens_list = []
-    completion_tokens_list = []
-    total_tokens_list = []
-    responses = []
-    timestamps = []  # New list to store timestamps
-
-    # Pricing for Gemini 2.5 Pro (June 2025)
-    input_token_price = 0.00125  # USD per 1K input tokens
-    output_token_price = 0.01  # USD per 1K output tokens
-
-    costs = []
-
-    # Run the API call multiple times to gather statistics
-    for i in range(num_runs):
-        start_time = time.time()  # Start timing
-        # Generate content using the Gemini model (streaming)
-        response_chunks = list(client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
+
+async def send_request(client, config, prompt):
+    """Send one streaming generate-content request and return its result record."""
+    from google.genai import types
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt)
+            ]
+        ),
+    ]
+
+    cached_content = None
+    if config.get("prompt_cache") and config.get("system"):
+        # The cache is created once per client and prefix, before the timer starts
+        cached_content = await context_cache(client, config)
+
+    start_time = time.perf_counter()  # Start timing
+    # Generate content using the Gemini model (streaming), timestamping chunks as they arrive
+    stream = await client.aio.models.generate_content_stream(
+        model=config["model"],
+        contents=contents,
+        config=build_generate_content_config(config, cached_content),
+    )
+    chunk_times = []
+    parts = []
+    raw_chunks = []
+    last_chunk = None
+    async for chunk in stream:
+        if config.get("keep_raw"):
+            raw_chunks.append(chunk.model_dump(mode="json", exclude_none=True))
+        text = getattr(chunk, "text", None)
+        if isinstance(text, str) and text:
+            chunk_times.append(time.perf_counter())
+            parts.append(text)
+        last_chunk = chunk
+    end_time = time.perf_counter()  # End timing
+
+    # Concatenate all chunk texts into a single response string
+    full_response = "".join(parts)
+
+    # Extract token usage information from the last chunk (if available)
+    usage = getattr(last_chunk, "usage_metadata", None) if last_chunk else None
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
+    completion_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
+    total_tokens = getattr(usage, "total_token_count", 0) if usage else 0
+    # Part of prompt_token_count, served from the context cache
+    cached_tokens = (getattr(usage, "cached_content_token_count", None) or 0) if usage else 0
+
+    # Gemini is always called through the streaming API, so streaming metrics are always recorded
+    timing = stream_metrics(start_time, chunk_times, end_time, completion_tokens)
+    result = make_result(
+        config, end_time - start_time, prompt_tokens, completion_tokens, total_tokens, full_response, timing,
+        cached_tokens=cached_tokens
+    )
+    if config.get("keep_raw"):
+        result["raw"] = raw_chunks
+    return result
+
+
+def batch_record(config, prompt, record_id):
+    """
+    One instance of a batch prediction input file: a generateContent request, labelled with
+    its record id because the output lines echo the request rather than keep the input order.
+    """
+    request = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": config["temperature"],
+            "topP": config["top_p"],
+            "seed": config["seed"],
+            "maxOutputTokens": config["max_tokens"],
+        },
+        "labels": {"record_id": record_id},
+    }
+    if config.get("system"):
+        request["systemInstruction"] = {"parts": [{"text": config["system"]}]}
+    return {"request": request}
+
+
+def create_batch_client(config):
+    """An httpx client for the Vertex AI and Cloud Storage REST APIs (see batch_urls)."""
+    import httpx
+
+    return httpx.AsyncClient(timeout=60)
+
+
+async def close_batch_client(client):
+    await client.aclose()
+
+
+def batch_urls(config):
+    """(Vertex AI API base URL, Cloud Storage API base URL) for the batch location."""
+    if config.get("endpoint_url"):
+        return config["endpoint_url"], config["endpoint_url"]
+    region = config["batch_region"]
+    host = "aiplatform.googleapis.com" if region == "global" else f"{region}-aiplatform.googleapis.com"
+    return f"https://{host}", "https://storage.googleapis.com"
+
+
+def gcs_location(uri):
+    """(bucket, object name) of a gs:// URI."""
+    bucket, _, name = uri[len("gs://"):].partition("/")
+    return bucket, name
+
+
+async def batch_headers(config):
+    """Authorization for the REST calls, refreshing the access token when it has expired."""
+    credentials = config.get("auth")
+    if credentials is None:
+        return {}
+    if not credentials.valid:
+        import google.auth.transport.requests
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, credentials.refresh, google.auth.transport.requests.Request())
+    return {"Authorization": f"Bearer {credentials.token}"}
+
+
+async def submit_batch(client, config, records, name):
+    """Upload the records to Cloud Storage and create the batch prediction job; returns the job."""
+    if not config.get("batch_gcs_uri"):
+        raise ValueError("VERTEX_AI_BATCH_GCS_URI environment variable is not set.")
+    api_url, storage_url = batch_urls(config)
+    prefix = f"{config['batch_gcs_uri'].rstrip('/')}/{name}"
+    bucket, object_name = gcs_location(f"{prefix}/input.jsonl")
+    response = await client.post(
+        f"{storage_url}/upload/storage/v1/b/{bucket}/o",
+        params={"uploadType": "media", "name": object_name},
+        content=to_jsonl(records),
+        headers=dict(await batch_headers(config), **{"Content-Type": "application/jsonl"}),
+    )
+    response.raise_for_status()
+    parent = f"projects/{config['project'] or 'local'}/locations/{config['batch_region']}"
+    response = await client.post(
+        f"{api_url}/v1/{parent}/batchPredictionJobs",
+        headers=await batch_headers(config),
+        json={
+            "displayName": name,
+            "model": f"publishers/google/models/{config['model']}",
+            "inputConfig": {"instancesFormat": "jsonl", "gcsSource": {"uris": [f"{prefix}/input.jsonl"]}},
+            "outputConfig": {"predictionsFormat": "jsonl", "gcsDestination": {"outputUriPrefix": f"{prefix}/output"}},
+        },
+    )
+    response.raise_for_status()
+    job = response.json()
+    return {"id": job["name"], "job": job}
+
+
+async def batch_status(client, config, job):
+    """Poll the job; returns its state (see BATCH_STATES)."""
+    api_url, _ = batch_urls(config)
+    response = await client.get(f"{api_url}/v1/{job['id']}", headers=await batch_headers(config))
+    response.raise_for_status()
+    job["job"] = response.json()
+    return job["job"]["state"]
+
+
+def batch_line_result(config, line):
+    """The result record for one line of the job's predictions file."""
+    if line.get("status") or "response" not in line:
+        return error_result(config, RuntimeError(line.get("status") or "No response"))
+    response = line["response"]
+    usage = response.get("usageMetadata", {})
+    candidates = response.get("candidates") or [{}]
+    text = "".join(part.get("text", "") for part in (candidates[0].get("content") or {}).get("parts", []))
+    return make_result(
+        config, None, usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0),
+        usage.get("totalTokenCount", 0), text, cached_tokens=usage.get("cachedContentTokenCount", 0)
+    )
+
+
+async def batch_results(client, config, job):
+    """Download the finished job's predictions file; returns {record id: result record}."""
+    _, storage_url = batch_urls(config)
+    bucket, object_name = gcs_location(f"{job['job']['outputInfo']['gcsOutputDirectory']}/predictions.jsonl")
+    response = await client.get(
+        f"{storage_url}/storage/v1/b/{bucket}/o/{quote(object_name, safe='')}",
+        params={"alt": "media"},
+        headers=await batch_headers(config),
+    )
+    response.raise_for_status()
+    return {
+        line["request"]["labels"]["record_id"]: batch_line_result(config, line)
+        for line in parse_jsonl(response.text)
+    }
+
+
+def parse_args(argv=None):
+    # Parse command-line arguments for the question and CSV filename
+    parser = argparse.ArgumentParser(description="Benchmark GCP Vertex AI Gemini model responses.")
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send to the Gemini model."
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        default=DEFAULT_CSV,
+        help="The CSV filename to write results to."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to send instead of repeating --question (see workload.py)."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send requests to this endpoint instead, e.g. a simulated_provider.py server."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Accepted for consistency with the other providers; Gemini is always streamed."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent before measuring, left out of the results (default 0; the first times the cold start)."
+    )
+    add_cache_arguments(parser)
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_sampling_arguments(parser)
+    add_prompt_cache_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Adaptive sampling decides itself when to stop, so it gets an endless request stream
+    requests = load_requests(args.workload, args.question, NUM_RUNS if args.target_ci is None else None)
+    config = apply_retry_args(load_config(args.endpoint_url), args)
+    apply_hedge_args(config, args)
+    requests, stream = apply_prompt_cache(requests, config, args)
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    run_id = store.start_run(args.run_id, args.resume)
+    print(f"Appending results to {args.results_db} as run {run_id}")
+    try:
+        asyncio.run(run_benchmark(
+            sys.modules[__name__], requests, args.csv, config=config, stream=stream,
+            cache=cache_from_args(args), store=store, run_id=run_id, target=target_from_args(args),
+            warmup=args.warmup, quiet=args.quiet
         ))
-        end_time = time.time()  # End timing
-        elapsed = end_time - start_time
-        response_times.append(elapsed)
-
-        # Concatenate all chunk texts into a single response string
-        full_response = "".join(
-            chunk.text for chunk in response_chunks
-            if hasattr(chunk, "text") and isinstance(chunk.text, str) and chunk.text is not None
-        )
-        responses.append(full_response)
-
-        # Extract token usage information from the last chunk (if available)
-        usage = getattr(response_chunks[-1], "usage_metadata", None) if response_chunks else None
-        prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
-        completion_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
-        total_tokens = getattr(usage, "total_token_count", 0) if usage else 0
-
-        # Store token usage for this run
-        prompt_tokens_list.append(prompt_tokens)
-        completion_tokens_list.append(completion_tokens)
-        total_tokens_list.append(total_tokens)
-
-        # Calculate cost for this run
-        input_cost = (prompt_tokens / 1000) * input_token_price
-        output_cost = (completion_tokens / 1000) * output_token_price
-        total_cost = input_cost + output_cost
-        costs.append(total_cost)
-
-        # Count characters and words in the response
-        char_count = len(full_response)
-        word_count = len(full_response.split())
-
-        # Add timestamp for when the model completes
-        completion_time = datetime.datetime.now().isoformat()
-        timestamps.append(completion_time)
-
-        # Print metrics for this run
-        print(f"Run {i+1}:")
-        print(full_response)
-        print(f"Response time: {elapsed:.2f} seconds")
-        print(f"Prompt tokens: {prompt_tokens}")
-        print(f"Completion tokens: {completion_tokens}")
-        print(f"Total tokens: {total_tokens}")
-        print(f"Total cost: ${total_cost:.6f}")
-        print(f"Characters: {char_count}")
-        print(f"Words: {word_count}")
-        print(f"Region: {location}")
-        print(f"Timestamp: {completion_time}")
-        print("-" * 40)
-
-    # Print averages for all runs
-    print("Averages over", num_runs, "runs:")
-    print(f"Average response time: {sum(response_times)/num_runs:.2f} seconds")
-    print(f"Average prompt tokens: {sum(prompt_tokens_list)/num_runs:.2f}")
-    print(f"Average completion tokens: {sum(completion_tokens_list)/num_runs:.2f}")
-    print(f"Average total tokens: {sum(total_tokens_list)/num_runs:.2f}")
-    print(f"Average total cost: ${sum(costs)/num_runs:.6f}")
-    print(f"Region: {location}")
-    print(f"Timestamp: {completion_time}")
-
-    # Write all results to a CSV file for later analysis
-    with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        # Write header row
-        writer.writerow([
-            "Run", "Response Time (s)", "Prompt Tokens", "Completion Tokens", "Total Tokens",
-            "Characters", "Words", "Cost (USD)", "Region", "Timestamp", "Response"
-        ])
-        # Write each run's data
-        for i in range(num_runs):
-            resp_text = responses[i]
-            char_count = len(resp_text)
-            word_count = len(resp_text.split())
-            writer.writerow([
-                i + 1,
-                f"{response_times[i]:.2f}",
-                prompt_tokens_list[i],
-                completion_tokens_list[i],
-                total_tokens_list[i],
-                char_count,
-                word_count,
-                f"{costs[i]:.6f}",
-                location,
-                timestamps[i],
-                resp_text.replace('\n', ' ')
-            ])
-        # Write averages row
-        writer.writerow([])
-        writer.writerow([
-            "Average",
-            f"{sum(response_times)/num_runs:.2f}",
-            f"{sum(prompt_tokens_list)/num_runs:.2f}",
-            f"{sum(completion_tokens_list)/num_runs:.2f}",
-            f"{sum(total_tokens_list)/num_runs:.2f}",
-            f"{sum(len(r) for r in responses)/num_runs:.2f}",
-            f"{sum(len(r.split()) for r in responses)/num_runs:.2f}",
-            f"{sum(costs)/num_runs:.6f}",
-            location,
-            timestamps[i],
-            ""
-        ])
-
-    print(f"Results written to {csv_filename}")
+    finally:
+        stop_trace()
+        store.close()
+
 
 # Run the benchmarking function
 if __name__ == "__main__":
-    generate()
\ No newline at end of file
+    main()
@@ -0,0 +1,230 @@
+# hedging.py
+# Per-request deadlines and request hedging, applied to every provider in the shared
+# request path (benchmark_common.send_with_retries).
+#
+# --deadline bounds each attempt: a call that has not answered in time is abandoned and
+# retried like any other timeout, so one hung request can no longer stall the suite.
+# --hedge-percentile P sends a duplicate of any request still unanswered after the
+# provider's observed P-th percentile latency and takes whichever answers first. The
+# losing request is left to finish (within the deadline, and for at most LOSER_WAIT_FACTOR
+# times the winner's latency) so that its latency and token spend are measured rather than
+# estimated: each run records the latency it would have had without the hedge, and the
+# summaries compare the tails with and without hedging against the extra tokens the
+# duplicates cost.
+#
+#   python run_all_benchmarks.py --simulate --deadline 30 --hedge-percentile 95
+
+import time
+import asyncio
+
+from latency_sketch import LatencySketch
+
+# Responses observed before the first hedge is sent; until then the percentile is a guess
+DEFAULT_HEDGE_MIN_SAMPLES = 10
+
+# A losing call is waited for at most this many times the winner's latency, so a hung call
+# cannot hold up the request when there is no --deadline
+LOSER_WAIT_FACTOR = 4.0
+
+# Per-run hedging fields, present only when hedging is enabled
+HEDGE_FIELDS = ["hedged", "hedge_won", "unhedged_time", "hedge_tokens", "hedge_cost"]
+
+
+class DeadlineExceeded(TimeoutError):
+    """An attempt ran past config["deadline"]. A TimeoutError, so the retry loop retries it."""
+
+
+class HedgePolicy:
+    """
+    When to hedge: after the `percentile` latency of the responses seen so far, once
+    `min_samples` of them have completed. Every completed call is observed, hedges and
+    losers included, so the percentile tracks the provider's unhedged service time.
+    """
+
+    def __init__(self, percentile, min_samples=DEFAULT_HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.sketch = LatencySketch()
+
+    def delay(self):
+        """Seconds to wait before sending a hedge, or None while there are too few samples."""
+        if self.sketch.count < self.min_samples:
+            return None
+        return self.sketch.quantile(self.percentile / 100)
+
+    def observe(self, result):
+        self.sketch.add(result["response_time"])
+
+
+class HedgeStats:
+    """
+    Accumulates the hedging fields of successful runs: how often a hedge was sent and
+    won, the latency distribution with and without hedging over the same runs, and the
+    extra tokens and cost of the duplicates.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.hedged = 0
+        self.won = 0
+        self.hedge_tokens = 0
+        self.hedge_cost = 0.0
+        self.cost = 0.0
+        self.with_hedging = LatencySketch()
+        self.without_hedging = LatencySketch()
+
+    def add(self, result):
+        # Runs where the primary failed have no unhedged latency to compare against
+        if result.get("unhedged_time") is None:
+            return
+        self.runs += 1
+        self.hedged += bool(result["hedged"])
+        self.won += bool(result["hedge_won"])
+        self.hedge_tokens += result["hedge_tokens"]
+        self.hedge_cost += result["hedge_cost"]
+        self.cost += result["cost"]
+        self.with_hedging.add(result["response_time"])
+        self.without_hedging.add(result["unhedged_time"])
+
+    def reduction(self, q):
+        """Fractional cut in the q-quantile response time from hedging (negative if it got worse)."""
+        before = self.without_hedging.quantile(q)
+        after = self.with_hedging.quantile(q)
+        if not before:
+            return None
+        return (before - after) / before
+
+    def extra_spend(self):
+        """Duplicate cost as a fraction of the winning requests' cost."""
+        return self.hedge_cost / self.cost if self.cost else None
+
+
+def hedge_fields(result, unhedged_time, hedged=False, hedge_won=False, loser=None):
+    """Set the hedging fields on a winning result; `loser` is the other call's result, if it succeeded."""
+    result["hedged"] = hedged
+    result["hedge_won"] = hedge_won
+    result["unhedged_time"] = unhedged_time
+    result["hedge_tokens"] = loser["total_tokens"] if loser else 0
+    result["hedge_cost"] = loser["cost"] if loser else 0.0
+    return result
+
+
+def succeeded(task):
+    return task.done() and not task.cancelled() and task.exception() is None
+
+
+async def send_attempt(provider, client, config, prompt, send):
+    """
+    Make one attempt with `send(provider, client, config, prompt)`, bounded by
+    config["deadline"] and hedged by config["hedge"] (a HedgePolicy). Returns the first
+    successful result; raises DeadlineExceeded if none arrives in time, or the primary
+    call's error if every call failed. A hedge winner's response_time and ttft are
+    measured from when the primary was sent, which is the latency the caller saw.
+    """
+    deadline = config.get("deadline")
+    policy = config.get("hedge")
+    if deadline is None and policy is None:
+        return await send(provider, client, config, prompt)
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - (time.perf_counter() - start_time))
+
+    start_time = time.perf_counter()
+    primary = asyncio.ensure_future(send(provider, client, config, prompt))
+    hedge = None
+    hedge_offset = 0.0
+    try:
+        delay = policy.delay() if policy else None
+        pending = {primary}
+        if delay is not None and (deadline is None or delay < deadline):
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                hedge_offset = time.perf_counter() - start_time
+                hedge = asyncio.ensure_future(send(provider, client, config, prompt))
+                pending.add(hedge)
+
+        winner = primary if succeeded(primary) else None
+        while pending and winner is None:
+            _, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in (primary, hedge) if task and succeeded(task)), None)
+            if winner is None and pending and remaining() == 0:
+                break
+        if winner is None:
+            if primary.done() and not primary.cancelled() and primary.exception() is not None:
+                if hedge is None or hedge.done():
+                    raise primary.exception()
+            raise DeadlineExceeded(f"no response within the {deadline:g}s deadline")
+
+        # Let the other call finish, within the deadline and LOSER_WAIT_FACTOR times the
+        # winner's latency, to measure its latency and cost
+        if pending:
+            elapsed = time.perf_counter() - start_time
+            limit = elapsed * (LOSER_WAIT_FACTOR - 1)
+            if deadline is not None:
+                limit = min(limit, remaining())
+            await asyncio.wait(pending, timeout=limit)
+        abandoned_at = time.perf_counter() - start_time
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+    for task in (primary, hedge):
+        if task is not None and succeeded(task) and policy:
+            policy.observe(task.result())
+
+    result = winner.result()
+    if hedge is None:
+        return hedge_fields(result, result["response_time"]) if policy else result
+
+    loser = primary if winner is hedge else hedge
+    loser_result = loser.result() if succeeded(loser) else None
+    if winner is primary:
+        return hedge_fields(result, result["response_time"], hedged=True, loser=loser_result)
+
+    # The hedge won: report the latency from the primary's start
+    result["response_time"] += hedge_offset
+    if result.get("ttft") is not None:
+        result["ttft"] += hedge_offset
+    if loser_result is not None:
+        unhedged_time = loser_result["response_time"]
+    elif loser.cancelled() or not loser.done():
+        # Still running when abandoned: without the hedge this request would have timed out at
+        # the deadline, or (with no deadline) taken at least as long as it was waited for
+        unhedged_time = deadline if deadline is not None else abandoned_at
+    else:
+        # The primary failed outright, so there is no unhedged latency to compare
+        unhedged_time = None
+    return hedge_fields(result, unhedged_time, hedged=True, hedge_won=True, loser=loser_result)
+
+
+def add_hedge_arguments(parser):
+    """Add the shared deadline and hedging options to a script's argument parser."""
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Seconds each request attempt may take before it is abandoned and retried (default: no deadline)."
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=None,
+        help="Send a duplicate of any request still unanswered after this percentile (e.g. 95) of the "
+             "provider's observed latency and take the first response."
+    )
+    parser.add_argument(
+        "--hedge-min-samples",
+        type=int,
+        default=DEFAULT_HEDGE_MIN_SAMPLES,
+        help="With --hedge-percentile, responses to observe before the first hedge is sent."
+    )
+
+
+def apply_hedge_args(config, args):
+    """Copy the deadline and hedging options into a provider config, with a fresh HedgePolicy per provider."""
+    if args.deadline:
+        config["deadline"] = args.deadline
+    if args.hedge_percentile:
+        config["hedge"] = HedgePolicy(args.hedge_percentile, args.hedge_min_samples)
+    return config
@@ -0,0 +1,280 @@
+# latency_model.py
+# Separate each provider's fixed overhead from its per-token prefill and decode costs.
+# Average response times compare different amounts of work (one provider may write twice
+# as many tokens as another), so this sweeps prompt lengths and max_tokens caps and fits
+#
+#   response_time ≈ a + b·prompt_tokens + c·completion_tokens
+#
+# by least squares over every collected sample: a is the fixed overhead (connection,
+# queueing, first-token floor), b the prefill cost per prompt token and c the decode cost
+# per output token. Standard errors, R² and RMSE show how far to trust each fit.
+#
+#   python latency_model.py --simulate --prompt-tokens 50 500 2000 --max-tokens 64 256 1024
+
+import csv
+import math
+import argparse
+import asyncio
+
+import simulated_provider
+from workload import make_request
+from results_store import ResultsStore, add_store_arguments
+from rate_limiter import add_retry_arguments, apply_retry_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from run_all_benchmarks import provider_keys
+from benchmark_common import DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, format_optional, ms, run_benchmark
+
+model_csv = "latency_model.csv"
+
+DEFAULT_PROMPT_TOKENS = [50, 500, 2000]
+DEFAULT_MAX_TOKENS = [64, 256, 1024]
+DEFAULT_REPEATS = 2
+
+# Words used to pad prompts to a target length
+FILLER = (
+    "The enterprise runs regulated workloads across several regions and needs predictable latency, "
+    "clear pricing, strong identity controls and a support model that scales with the platform."
+).split()
+
+# Coefficients of the fitted model, in column order of the design matrix
+COEFFICIENTS = ["overhead", "prefill", "decode"]
+
+
+def padded_prompt(question, prompt_tokens):
+    """Return `question` preceded by filler text, for a prompt of roughly `prompt_tokens` tokens."""
+    # About 0.75 words per token, less the question itself
+    words = max(0, round(prompt_tokens * 0.75) - len(question.split()))
+    filler = " ".join(FILLER[i % len(FILLER)] for i in range(words))
+    return f"Background: {filler}\n\n{question}" if filler else question
+
+
+def sweep_requests(question, prompt_tokens, max_tokens, repeats):
+    """
+    Build the sweep: every prompt length with every max_tokens cap, `repeats` times. Whole
+    grids are repeated rather than each cell, so slow drift in a provider's latency is
+    spread across the grid instead of landing on one cell.
+    """
+    requests = []
+    for _ in range(repeats):
+        for length in prompt_tokens:
+            for cap in max_tokens:
+                requests.append(make_request(
+                    padded_prompt(question, length), max_tokens=cap, tags=[f"prompt={length}", f"max_tokens={cap}"]
+                ))
+    return requests
+
+
+def fit_latency_model(results):
+    """
+    Least squares fit of response_time = a + b·prompt_tokens + c·completion_tokens over the
+    successful results. Returns a dict with the coefficients (seconds and seconds per token),
+    their standard errors ("<name>_se", None when the fit is underdetermined), r2, rmse and
+    samples, or None with fewer samples than coefficients.
+    """
+    # numpy is only needed for the fit, so --help and the sweep do not wait for its import
+    import numpy as np
+
+    samples = np.array(
+        [(r["prompt_tokens"], r["completion_tokens"], r["response_time"]) for r in results if not r.get("error")],
+        dtype=float,
+    ).reshape(-1, 3)
+    count = len(samples)
+    if count < len(COEFFICIENTS):
+        return None
+    design = np.column_stack([np.ones(count), samples[:, 0], samples[:, 1]])
+    observed = samples[:, 2]
+    coefficients, _, rank, _ = np.linalg.lstsq(design, observed, rcond=None)
+    residuals = observed - design @ coefficients
+    residual_sum = float(residuals @ residuals)
+    total_sum = float(((observed - observed.mean()) ** 2).sum())
+
+    fit = dict(zip(COEFFICIENTS, coefficients.tolist()))
+    fit.update({f"{name}_se": None for name in COEFFICIENTS})
+    degrees_of_freedom = count - len(COEFFICIENTS)
+    if rank == len(COEFFICIENTS) and degrees_of_freedom > 0:
+        # Coefficient covariance is sigma² (XᵀX)⁻¹, with sigma² from the residuals
+        covariance = residual_sum / degrees_of_freedom * np.linalg.inv(design.T @ design)
+        fit.update({f"{name}_se": float(se) for name, se in zip(COEFFICIENTS, np.sqrt(np.diag(covariance)))})
+    fit["rank"] = int(rank)
+    fit["samples"] = count
+    fit["r2"] = 1 - residual_sum / total_sum if total_sum > 0 else None
+    fit["rmse"] = math.sqrt(residual_sum / count)
+    return fit
+
+
+def print_fit(name, fit):
+    """Print one provider's fitted model."""
+    if fit is None:
+        print(f"{name}: not enough successful samples to fit")
+        return
+    if fit["rank"] < len(COEFFICIENTS):
+        print(f"{name}: prompt and completion lengths did not vary independently, so the fit is underdetermined")
+
+    def term(coefficient, unit):
+        se = fit[f"{coefficient}_se"]
+        spread = f" ± {ms(se):.3f}" if se is not None else ""
+        return f"{ms(fit[coefficient]):.3f}{spread} {unit}"
+
+    speed = f" ({1 / fit['decode']:.1f} tokens/s)" if fit["decode"] > 0 else ""
+    print(f"{name}: overhead {term('overhead', 'ms')}, prefill {term('prefill', 'ms/token')}, "
+          f"decode {term('decode', 'ms/token')}{speed}; R² {format_optional(fit['r2'], '.3f')}, "
+          f"RMSE {ms(fit['rmse']):.1f} ms over {fit['samples']} samples")
+
+
+def write_model_csv(fits):
+    """Write each provider's fitted coefficients and fit quality to latency_model.csv."""
+    header = [
+        "Provider", "Samples", "Fixed Overhead (ms)", "Fixed Overhead SE (ms)", "Prefill (ms/token)",
+        "Prefill SE (ms/token)", "Decode (ms/token)", "Decode SE (ms/token)", "Decode Tokens/s", "R²", "RMSE (ms)"
+    ]
+    with open(model_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, fit in fits.items():
+            if fit is None:
+                writer.writerow([name, 0] + [""] * (len(header) - 2))
+                continue
+            writer.writerow([
+                name,
+                fit["samples"],
+                format_optional(ms(fit["overhead"]), ".1f"),
+                format_optional(ms(fit["overhead_se"]), ".1f"),
+                format_optional(ms(fit["prefill"]), ".4f"),
+                format_optional(ms(fit["prefill_se"]), ".4f"),
+                format_optional(ms(fit["decode"]), ".3f"),
+                format_optional(ms(fit["decode_se"]), ".3f"),
+                format_optional(1 / fit["decode"] if fit["decode"] > 0 else None, ".1f"),
+                format_optional(fit["r2"], ".4f"),
+                format_optional(ms(fit["rmse"]), ".1f"),
+            ])
+    print(f"\nLatency model written to {model_csv}")
+
+
+async def run_sweep(providers, requests, endpoint_url, stream, store, run_id, args):
+    """
+    Send the sweep to every provider ({key: provider module}) concurrently, each provider's
+    requests one at a time so that they do not queue behind each other.
+    """
+
+    async def sweep(key, provider):
+        try:
+            config = apply_retry_args(provider.load_config(endpoint_url), args)
+            await run_benchmark(
+                provider, requests, f"latency_model_{key}.csv", config=config, stream=stream,
+                store=store, run_id=run_id, warmup=args.warmup, quiet=args.quiet
+            )
+        except Exception as e:
+            print(f"Error running {provider.PROVIDER_NAME} sweep: {e}")
+
+    await asyncio.gather(*(sweep(key, provider) for key, provider in providers.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sweep prompt and output lengths and fit each provider's overhead, prefill and decode costs."
+    )
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        choices=sorted(provider_keys),
+        default=list(provider_keys),
+        help="Providers to sweep (default: all)."
+    )
+    parser.add_argument(
+        "--prompt-tokens",
+        nargs="+",
+        type=int,
+        default=DEFAULT_PROMPT_TOKENS,
+        help="Approximate prompt lengths to send, in tokens."
+    )
+    parser.add_argument(
+        "--max-tokens",
+        nargs="+",
+        type=int,
+        default=DEFAULT_MAX_TOKENS,
+        help="max_tokens caps to send, so that completion lengths vary."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=DEFAULT_REPEATS,
+        help="How many times to send the whole prompt-length x max_tokens grid."
+    )
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question at the end of every padded prompt."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use each provider's streaming API."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send every provider's requests to this endpoint, e.g. a running simulated_provider.py."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and sweep it (offline, no cost)."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent to each provider before the sweep and left out of the fit (default 0)."
+    )
+    parser.add_argument(
+        "--fit-only",
+        action="store_true",
+        help="Send nothing; refit the samples already stored under --run-id."
+    )
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.fit_only and not args.run_id:
+        parser.error("--fit-only needs --run-id")
+
+    providers = {key: provider_keys[key] for key in args.providers}
+    store = ResultsStore(args.results_db)
+    server = None
+    try:
+        if args.fit_only:
+            run_id = args.run_id
+        else:
+            endpoint_url = args.endpoint_url
+            if args.simulate:
+                server = simulated_provider.start_server()
+                endpoint_url = server.url
+                print(f"Using simulated providers at {endpoint_url}")
+            run_id = store.start_run(args.run_id, args.resume)
+            print(f"Appending results to {args.results_db} as run {run_id}")
+            metrics_from_args(args)
+            trace_from_args(args)
+            requests = sweep_requests(args.question, args.prompt_tokens, args.max_tokens, args.repeats)
+            asyncio.run(run_sweep(providers, requests, endpoint_url, args.stream, store, run_id, args))
+
+        print()
+        fits = {}
+        for provider in providers.values():
+            fits[provider.PROVIDER_NAME] = fit_latency_model(
+                store.iter_results(run_id, provider.PROVIDER_NAME, include_response=False)
+            )
+            print_fit(provider.PROVIDER_NAME, fits[provider.PROVIDER_NAME])
+        write_model_csv(fits)
+    finally:
+        stop_trace()
+        if server:
+            server.shutdown()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# latency_sketch.py
+# Compact, mergeable latency histograms. Values go into logarithmically sized buckets
+# (the HDR histogram / DDSketch layout), so every quantile is reported within a fixed
+# relative error (1% by default) using a few hundred counters, however many runs are
+# added. Two sketches merge by adding their bucket counts, so results from separate runs
+# or processes combine exactly as if every sample had gone into one sketch, without
+# keeping the raw samples.
+#
+# Sketches are saved to the results store per run, provider and metric, and can be merged
+# across runs from the command line:
+#
+#   python latency_sketch.py --run-id nightly-1 --run-id nightly-2
+
+import math
+import argparse
+
+from results_store import DEFAULT_RESULTS_DB, ResultsStore
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Values at or below this go in a single zero bucket (log buckets cannot hold zero)
+MIN_INDEXABLE_VALUE = 1e-9
+
+# Statistics reported from each sketch, in report order, with the quantile for percentiles
+DISTRIBUTION_STATS = [
+    ("Min", None), ("P50", 0.50), ("P90", 0.90), ("P95", 0.95), ("P99", 0.99), ("Max", None), ("Stddev", None),
+]
+
+
+class LatencySketch:
+    """A log-bucketed histogram with relative-accuracy quantiles and exact count/min/max/mean/stddev."""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}  # Bucket index -> count
+        self.zeros = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.sum_squares = 0.0
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        """Add another sketch's samples into this one. Both must use the same relative accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def value_at_rank(self, rank):
+        """Return the approximate value of the rank-th smallest sample (0-based)."""
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+        seen = self.zeros
+        if rank < seen:
+            return self.min
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # The bucket midpoint that keeps the relative error within the accuracy
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def quantile(self, q):
+        """
+        Return the q-th quantile (0-1) within the relative accuracy, interpolating between
+        neighbouring ranks like benchmark_common.percentile, or None when empty.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        low = self.value_at_rank(math.floor(rank))
+        high = self.value_at_rank(math.ceil(rank))
+        return low + (high - low) * (rank - math.floor(rank))
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def stddev(self):
+        """Sample standard deviation, or None with fewer than two samples."""
+        if self.count < 2:
+            return None
+        mean = self.sum / self.count
+        return math.sqrt(max(0.0, (self.sum_squares - self.count * mean * mean) / (self.count - 1)))
+
+    def stats(self):
+        """Return {stat name: value} for DISTRIBUTION_STATS."""
+        exact = {"Min": self.min, "Max": self.max, "Stddev": self.stddev()}
+        return {name: exact[name] if q is None else self.quantile(q) for name, q in DISTRIBUTION_STATS}
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(index): count for index, count in self.buckets.items()},
+            "zeros": self.zeros,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "sum": self.sum,
+            "sum_squares": self.sum_squares,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+        sketch.zeros = data["zeros"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.sum = data["sum"]
+        sketch.sum_squares = data["sum_squares"]
+        return sketch
+
+
+def merge_sketches(sketches):
+    """Merge an iterable of sketches into a new one."""
+    merged = None
+    for sketch in sketches:
+        if merged is None:
+            merged = LatencySketch(sketch.relative_accuracy)
+        merged.merge(sketch)
+    return merged if merged is not None else LatencySketch()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge the latency sketches saved for one or more runs and print their distributions."
+    )
+    parser.add_argument(
+        "--results-db",
+        type=str,
+        default=DEFAULT_RESULTS_DB,
+        help="SQLite results store holding the sketches."
+    )
+    parser.add_argument(
+        "--run-id",
+        action="append",
+        required=True,
+        help="A run to merge; repeat for several runs."
+    )
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.results_db)
+    try:
+        merged = {}
+        for run_id in args.run_id:
+            for (provider_name, metric), data in store.load_sketches(run_id).items():
+                sketch = LatencySketch.from_dict(data)
+                merged.setdefault((provider_name, metric), LatencySketch(sketch.relative_accuracy)).merge(sketch)
+    finally:
+        store.close()
+
+    for (provider_name, metric), sketch in sorted(merged.items()):
+        stats = sketch.stats()
+        summary = ", ".join(
+            f"{name} {'' if stats[name] is None else format(stats[name], '.3f')}" for name, _ in DISTRIBUTION_STATS
+        )
+        print(f"{provider_name} {metric} ({sketch.count} samples): {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+# load_test.py
+# Load generator for the provider benchmark scripts.
+#
+# Closed loop (--mode closed): for each concurrency level it keeps that many requests in
+# flight against one provider, then reports requests/sec, output tokens/sec, latency
+# percentiles and error/throttle rates, and picks out the saturation knee where adding
+# concurrency stops buying throughput.
+#
+# Open loop (--mode open): requests are sent on a constant or Poisson arrival schedule
+# whether or not earlier requests have finished. Latency is measured from each request's
+# scheduled send time, so a slow client cannot hide queueing delay (coordinated omission).
+
+import os
+import csv
+import time
+import random
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import simulated_provider
+import azure_openai_demo
+import gcp_vertexai_demo
+import aws_bedrock_claude_demo
+from workload import cycle_workload, make_request
+from benchmark_common import (
+    DEFAULT_QUESTION, error_result, percentile, print_cold_start, send_workload_request, start_client
+)
+from rate_limiter import add_retry_arguments, apply_retry_args, limiter_from_config
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, set_run, stop_trace, trace_from_args
+
+# Providers selectable with --provider
+PROVIDERS = {
+    "azure": azure_openai_demo,
+    "gcp": gcp_vertexai_demo,
+    "aws": aws_bedrock_claude_demo,
+}
+
+DEFAULT_CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+# A level is past the knee when doubling concurrency adds less than this fraction of throughput
+KNEE_THRESHOLD = 0.10
+
+# Threads available to thread-offloaded providers (Bedrock) in open-loop mode
+OPEN_LOOP_MAX_WORKERS = 128
+
+SWEEP_HEADER = [
+    "Provider", "Concurrency", "Requests", "Errors", "Throttled", "Error Rate", "Throttle Rate",
+    "Wall Time (s)", "Requests/s", "Output Tokens/s", "P50 Latency (s)", "P95 Latency (s)",
+    "P99 Latency (s)", "Average TTFT (s)", "Average Cost", "Total Cost", "Saturation Knee"
+]
+
+OPEN_LOOP_HEADER = [
+    "Provider", "Arrival", "Offered QPS", "Achieved QPS", "Requests", "Errors", "Throttled",
+    "Error Rate", "P50 Latency (s)", "P95 Latency (s)", "P99 Latency (s)",
+    "P50 Service Time (s)", "P95 Service Time (s)", "P99 Service Time (s)",
+    "P99 Send Lag (ms)", "Max Send Lag (ms)", "Output Tokens/s", "Total Cost"
+]
+
+OPEN_LOOP_REQUEST_HEADER = [
+    "Provider", "Offered QPS", "Request", "Scheduled Send (s)", "Actual Send (s)", "Send Lag (ms)",
+    "Service Time (s)", "Latency (s)", "Completion Tokens", "Error"
+]
+
+
+async def send_safely(provider, client, config, request):
+    """Send one request, turning any exception into an error result so a worker keeps going."""
+    try:
+        return await send_workload_request(provider, client, config, request)
+    except Exception as e:
+        result = error_result(config, e)
+        result["tags"] = request["tags"]
+        return result
+
+
+def positive_float(value):
+    """argparse type for --rate and --duration: a number greater than zero."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number, not {value!r}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, not {value!r}")
+    return number
+
+
+def request_source(workload_path, question):
+    """Endless request iterator: the workload file on repeat, or the single question."""
+    if workload_path:
+        return cycle_workload(workload_path)
+    request = make_request(question)
+    return iter(lambda: request, None)
+
+
+async def run_level(provider, client, config, requests, concurrency, num_requests):
+    """Run `num_requests` requests with `concurrency` workers each keeping one request in flight."""
+    results = []
+    remaining = [num_requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            set_run(f"{provider.PROVIDER_NAME} c={concurrency}", num_requests - remaining[0] - 1)
+            results.append(await send_safely(provider, client, config, next(requests)))
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start_time
+    return summarize_level(provider.PROVIDER_NAME, concurrency, results, wall_time)
+
+
+def summarize_level(provider_name, concurrency, results, wall_time):
+    """Aggregate the results of one concurrency level into a sweep row."""
+    ok = [r for r in results if r["error"] is None]
+    errors = len(results) - len(ok)
+    throttled = sum(1 for r in results if r["throttled"])
+    latencies = [r["response_time"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    total_cost = sum(r["cost"] for r in ok)
+    return {
+        "provider": provider_name,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "throttled": throttled,
+        "error_rate": errors / len(results) if results else 0,
+        "throttle_rate": throttled / len(results) if results else 0,
+        "wall_time": wall_time,
+        "requests_per_sec": len(ok) / wall_time if wall_time > 0 else 0,
+        "output_tokens_per_sec": sum(r["completion_tokens"] for r in ok) / wall_time if wall_time > 0 else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "ttft": sum(ttfts) / len(ttfts) if ttfts else None,
+        "avg_cost": total_cost / len(ok) if ok else 0,
+        "total_cost": total_cost,
+        "knee": False,
+    }
+
+
+def find_knee(levels):
+    """
+    Return the index of the saturation knee: the last level whose successor still raised
+    throughput by at least KNEE_THRESHOLD relative to the extra concurrency. Returns the
+    last level if throughput never flattened.
+    """
+    for i in range(len(levels) - 1):
+        current, nxt = levels[i], levels[i + 1]
+        if current["requests_per_sec"] <= 0:
+            continue
+        gain = nxt["requests_per_sec"] / current["requests_per_sec"] - 1
+        scale = nxt["concurrency"] / current["concurrency"] - 1
+        if gain < KNEE_THRESHOLD * scale:
+            return i
+    return len(levels) - 1 if levels else None
+
+
+def fmt(value, spec):
+    return "" if value is None else format(value, spec)
+
+
+def print_level(level):
+    print(
+        f"{level['provider']} c={level['concurrency']:>3}: "
+        f"{level['requests_per_sec']:.2f} req/s, {level['output_tokens_per_sec']:.1f} tok/s, "
+        f"p50 {fmt(level['p50'], '.2f')}s p95 {fmt(level['p95'], '.2f')}s p99 {fmt(level['p99'], '.2f')}s, "
+        f"errors {level['error_rate']:.0%} (throttled {level['throttle_rate']:.0%})"
+    )
+
+
+def write_sweep_csv(csv_filename, levels):
+    with open(csv_filename, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_HEADER)
+        for level in levels:
+            writer.writerow([
+                level["provider"],
+                level["concurrency"],
+                level["requests"],
+                level["errors"],
+                level["throttled"],
+                f"{level['error_rate']:.4f}",
+                f"{level['throttle_rate']:.4f}",
+                f"{level['wall_time']:.2f}",
+                f"{level['requests_per_sec']:.3f}",
+                f"{level['output_tokens_per_sec']:.1f}",
+                fmt(level["p50"], ".2f"),
+                fmt(level["p95"], ".2f"),
+                fmt(level["p99"], ".2f"),
+                fmt(level["ttft"], ".3f"),
+                f"{level['avg_cost']:.6f}",
+                f"{level['total_cost']:.6f}",
+                "yes" if level["knee"] else "",
+            ])
+    print(f"Sweep results written to {csv_filename}")
+
+
+def load_test_config(provider, endpoint_url, stream, retry_args):
+    """Load the provider config with the --rpm/--tpm/--max-retries options and its rate limiter."""
+    config = provider.load_config(endpoint_url)
+    config["stream"] = stream
+    if retry_args is not None:
+        apply_retry_args(config, retry_args)
+    config["rate_limiter"] = limiter_from_config(config)
+    return config
+
+
+async def run_sweep(provider, requests, concurrency_levels, requests_per_level, stream=False, endpoint_url=None,
+                    retry_args=None):
+    """Sweep the concurrency levels against one provider with a single shared client."""
+    config = load_test_config(provider, endpoint_url, stream, retry_args)
+    # Bedrock calls run on worker threads, so make sure the pool can hold every in-flight request
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(concurrency_levels)))
+    client, cold_start = await start_client(provider, config)
+    print_cold_start(provider.PROVIDER_NAME, cold_start)
+    levels = []
+    try:
+        for concurrency in concurrency_levels:
+            num_requests = max(requests_per_level, concurrency)
+            level = await run_level(provider, client, config, requests, concurrency, num_requests)
+            print_level(level)
+            levels.append(level)
+    finally:
+        await provider.close_client(client)
+
+    knee = find_knee(levels)
+    if knee is not None:
+        levels[knee]["knee"] = True
+        print(
+            f"Saturation knee for {provider.PROVIDER_NAME}: concurrency {levels[knee]['concurrency']} "
+            f"({levels[knee]['requests_per_sec']:.2f} req/s, p95 {fmt(levels[knee]['p95'], '.2f')}s)"
+        )
+    return levels
+
+
+def arrival_schedule(rate, duration, arrival, rng):
+    """
+    Return send offsets (seconds from the start) for one rate level. "constant" spaces
+    requests exactly 1/rate apart; "poisson" draws exponential inter-arrival gaps.
+    """
+    offsets = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+        if t > duration:
+            return offsets
+        offsets.append(t)
+
+
+async def run_open_level(provider, client, config, requests, rate, duration, arrival, rng):
+    """Send requests on the arrival schedule without waiting for earlier ones to finish."""
+    schedule = arrival_schedule(rate, duration, arrival, rng)
+    records = []
+    start_time = time.perf_counter()
+
+    async def timed_send(index, scheduled, request):
+        set_run(f"{provider.PROVIDER_NAME} {rate:g} qps", index)
+        actual = time.perf_counter() - start_time
+        result = await send_safely(provider, client, config, request)
+        done = time.perf_counter() - start_time
+        result["index"] = index
+        result["scheduled_send"] = scheduled
+        result["actual_send"] = actual
+        # Latency from the scheduled send time includes any delay the client itself added
+        result["latency"] = done - scheduled
+        result["done"] = done
+        records.append(result)
+
+    tasks = []
+    for index, scheduled in enumerate(schedule):
+        delay = scheduled - (time.perf_counter() - start_time)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(timed_send(index, scheduled, next(requests))))
+    await asyncio.gather(*tasks)
+    records.sort(key=lambda r: r["index"])
+    return summarize_open_level(provider.PROVIDER_NAME, rate, arrival, duration, records), records
+
+
+def summarize_open_level(provider_name, rate, arrival, duration, records):
+    """Aggregate one open-loop rate level: latency percentiles against offered and achieved QPS."""
+    ok = [r for r in records if r["error"] is None]
+    latencies = [r["latency"] for r in ok]
+    service_times = [r["response_time"] for r in ok]
+    send_lags = [(r["actual_send"] - r["scheduled_send"]) * 1000 for r in records]
+    # Achieved QPS counts completions over the time it took to drain the whole schedule
+    span = max((r["done"] for r in records), default=0)
+    return {
+        "provider": provider_name,
+        "arrival": arrival,
+        "offered_qps": len(records) / duration if duration > 0 else 0,
+        "achieved_qps": len(ok) / span if span > 0 else 0,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "throttled": sum(1 for r in records if r["throttled"]),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "service_p50": percentile(service_times, 50),
+        "service_p95": percentile(service_times, 95),
+        "service_p99": percentile(service_times, 99),
+        "lag_p99": percentile(send_lags, 99),
+        "lag_max": max(send_lags, default=None),
+        "output_tokens_per_sec": sum(r["completion_tokens"] for r in ok) / span if span > 0 else 0,
+        "total_cost": sum(r["cost"] for r in ok),
+        "target_qps": rate,
+    }
+
+
+def print_open_level(level):
+    print(
+        f"{level['provider']} {level['arrival']} {level['target_qps']:g} qps: "
+        f"offered {level['offered_qps']:.2f} achieved {level['achieved_qps']:.2f} qps, "
+        f"p50 {fmt(level['p50'], '.2f')}s p95 {fmt(level['p95'], '.2f')}s p99 {fmt(level['p99'], '.2f')}s "
+        f"(service p99 {fmt(level['service_p99'], '.2f')}s), "
+        f"max send lag {fmt(level['lag_max'], '.1f')}ms, errors {level['error_rate']:.0%}"
+    )
+
+
+def write_open_loop_csv(csv_filename, levels, records_by_level):
+    """Write the per-rate summary and a companion file with every request's scheduled vs actual send."""
+    with open(csv_filename, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OPEN_LOOP_HEADER)
+        for level in levels:
+            writer.writerow([
+                level["provider"],
+                level["arrival"],
+                f"{level['offered_qps']:.3f}",
+                f"{level['achieved_qps']:.3f}",
+                level["requests"],
+                level["errors"],
+                level["throttled"],
+                f"{level['error_rate']:.4f}",
+                fmt(level["p50"], ".3f"),
+                fmt(level["p95"], ".3f"),
+                fmt(level["p99"], ".3f"),
+                fmt(level["service_p50"], ".3f"),
+                fmt(level["service_p95"], ".3f"),
+                fmt(level["service_p99"], ".3f"),
+                fmt(level["lag_p99"], ".1f"),
+                fmt(level["lag_max"], ".1f"),
+                f"{level['output_tokens_per_sec']:.1f}",
+                f"{level['total_cost']:.6f}",
+            ])
+    print(f"Open-loop results written to {csv_filename}")
+
+    requests_filename = os.path.splitext(csv_filename)[0] + "_requests.csv"
+    with open(requests_filename, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OPEN_LOOP_REQUEST_HEADER)
+        for level, records in zip(levels, records_by_level):
+            for r in records:
+                writer.writerow([
+                    level["provider"],
+                    f"{level['offered_qps']:.3f}",
+                    r["index"] + 1,
+                    f"{r['scheduled_send']:.4f}",
+                    f"{r['actual_send']:.4f}",
+                    f"{(r['actual_send'] - r['scheduled_send']) * 1000:.2f}",
+                    f"{r['response_time']:.3f}",
+                    f"{r['latency']:.3f}",
+                    r["completion_tokens"],
+                    r["error"] or "",
+                ])
+    print(f"Per-request send times written to {requests_filename}")
+
+
+async def run_open_loop(provider, requests, rates, duration, arrival, seed=None, stream=False, endpoint_url=None,
+                        retry_args=None):
+    """Run each target rate for `duration` seconds against one provider with a single shared client."""
+    config = load_test_config(provider, endpoint_url, stream, retry_args)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=OPEN_LOOP_MAX_WORKERS))
+    client, cold_start = await start_client(provider, config)
+    print_cold_start(provider.PROVIDER_NAME, cold_start)
+    rng = random.Random(seed)
+    levels = []
+    records_by_level = []
+    try:
+        for rate in rates:
+            level, records = await run_open_level(provider, client, config, requests, rate, duration, arrival, rng)
+            print_open_level(level)
+            levels.append(level)
+            records_by_level.append(records)
+    finally:
+        await provider.close_client(client)
+    return levels, records_by_level
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Closed- or open-loop load test against one provider.")
+    parser.add_argument(
+        "--provider",
+        choices=sorted(PROVIDERS),
+        required=True,
+        help="The provider to load test."
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["closed", "open"],
+        default="closed",
+        help="closed: sweep concurrency levels; open: send at a fixed arrival rate."
+    )
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send on every request."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to cycle through instead of repeating --question."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=DEFAULT_CONCURRENCY_LEVELS,
+        help="Concurrency levels (requests in flight) to sweep."
+    )
+    parser.add_argument(
+        "--requests-per-level",
+        type=int,
+        default=20,
+        help="Requests to send at each level (at least one per worker)."
+    )
+    parser.add_argument(
+        "--rate",
+        type=positive_float,
+        nargs="+",
+        default=[1.0],
+        help="Open loop: target arrival rates (requests/sec) to run one after another."
+    )
+    parser.add_argument(
+        "--arrival",
+        choices=["constant", "poisson"],
+        default="poisson",
+        help="Open loop: evenly spaced or Poisson-distributed arrivals."
+    )
+    parser.add_argument(
+        "--duration",
+        type=positive_float,
+        default=60.0,
+        help="Open loop: seconds of arrivals to schedule at each rate."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Open loop: random seed for reproducible Poisson schedules."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use the streaming API so TTFT is recorded."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send requests to this endpoint instead, e.g. a running simulated_provider.py."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and load test it (offline, no cost)."
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        default=None,
+        help="The CSV filename for the results (default: load_sweep_<provider>.csv or load_open_<provider>.csv)."
+    )
+    # Throttling is what a load test is looking for, so by default it is reported rather than retried
+    add_retry_arguments(parser, max_retries=0)
+    add_metrics_arguments(parser, quiet=False)
+    add_trace_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    provider = PROVIDERS[args.provider]
+    requests = request_source(args.workload, args.question)
+    endpoint_url = args.endpoint_url
+    server = None
+    if args.simulate:
+        server = simulated_provider.start_server()
+        endpoint_url = server.url
+        print(f"Using simulated provider at {endpoint_url}")
+    metrics_from_args(args)
+    trace_from_args(args)
+
+    try:
+        if args.mode == "open":
+            levels, records_by_level = asyncio.run(run_open_loop(
+                provider, requests, args.rate, args.duration, args.arrival, args.seed, args.stream, endpoint_url,
+                args
+            ))
+            write_open_loop_csv(args.csv or f"load_open_{args.provider}.csv", levels, records_by_level)
+        else:
+            levels = asyncio.run(run_sweep(
+                provider, requests, sorted(args.concurrency), args.requests_per_level, args.stream, endpoint_url,
+                args
+            ))
+            write_sweep_csv(args.csv or f"load_sweep_{args.provider}.csv", levels)
+    finally:
+        stop_trace()
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# metrics_server.py
+# Live metrics for long or concurrent runs: an optional local HTTP endpoint in the
+# Prometheus text / OpenMetrics format, updated from the shared request path
+# (benchmark_common.send_with_retries) for every provider, model and region.
+#
+#   python run_all_benchmarks.py --metrics-port 9464 --quiet
+#   curl http://127.0.0.1:9464/metrics
+#
+# Exposed, each labelled with provider, model and region:
+#
+#   llm_requests_total                  completed requests (successful or failed)
+#   llm_request_errors_total            requests that failed after their retries
+#   llm_request_throttled_total         attempts rejected with a 429 / throttling error
+#   llm_request_retries_total           retried attempts
+#   llm_requests_in_flight              attempts currently waiting on the provider
+#   llm_response_time_seconds           histogram of successful response times
+#   llm_ttft_seconds                    histogram of time to first token (streamed runs)
+#   llm_output_tokens_per_second        histogram of streamed decode speed
+#   llm_tokens_total{type=...}          prompt and completion tokens
+#   llm_cost_usd_total                  cumulative cost
+#
+# The exposition format is written here, so no Prometheus client library is needed.
+
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120]
+THROUGHPUT_BUCKETS = [5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500, 1000]
+
+# name -> (type, help, histogram buckets)
+METRIC_FAMILIES = {
+    "llm_requests": ("counter", "Completed requests, successful or failed.", None),
+    "llm_request_errors": ("counter", "Requests that failed after their retries.", None),
+    "llm_request_throttled": ("counter", "Attempts rejected with a throttling error.", None),
+    "llm_request_retries": ("counter", "Retried attempts.", None),
+    "llm_requests_in_flight": ("gauge", "Attempts currently waiting on the provider.", None),
+    "llm_response_time_seconds": ("histogram", "Response time of successful requests.", LATENCY_BUCKETS),
+    "llm_ttft_seconds": ("histogram", "Time to first token of streamed requests.", LATENCY_BUCKETS),
+    "llm_output_tokens_per_second": ("histogram", "Output tokens per second of streamed requests.", THROUGHPUT_BUCKETS),
+    "llm_tokens": ("counter", "Prompt and completion tokens.", None),
+    "llm_cost_usd": ("counter", "Cumulative cost in USD.", None),
+}
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The running registry, or None when no --metrics-port was given (every update is then a no-op)
+registry = None
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+def format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by metric family and label set."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in METRIC_FAMILIES}  # name -> {labels: value or histogram}
+
+    def add(self, name, labels, amount=1):
+        with self.lock:
+            self.values[name][labels] = self.values[name].get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRIC_FAMILIES[name][2]
+        with self.lock:
+            histogram = self.values[name].setdefault(labels, {"buckets": [0] * len(buckets), "count": 0, "sum": 0.0})
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def render(self, openmetrics=False):
+        """Return the exposition text: OpenMetrics if `openmetrics`, else the Prometheus text format."""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in METRIC_FAMILIES.items():
+                # OpenMetrics names a counter family without its _total suffix
+                family = name if openmetrics or kind != "counter" else name + "_total"
+                lines.append(f"# TYPE {family} {kind}")
+                lines.append(f"# HELP {family} {help_text}")
+                for labels, value in sorted(self.values[name].items()):
+                    if kind == "histogram":
+                        for bound, count in zip(buckets + [float("inf")], value["buckets"] + [value["count"]]):
+                            bucket_labels = labels + (("le", format_value(float(bound))),)
+                            lines.append(f"{name}_bucket{format_labels(bucket_labels)} {count}")
+                        lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {format_value(value['sum'])}")
+                    else:
+                        suffix = "_total" if kind == "counter" else ""
+                        lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.registry.render(openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, registry):
+        super().__init__(address, MetricsHandler)
+        self.registry = registry
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Start the metrics endpoint on a background thread and make the request path update it."""
+    global registry
+    registry = MetricsRegistry()
+    server = MetricsServer((host, port), registry)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def request_labels(provider, config):
+    """The provider, model (or Azure deployment) and region labels of a request."""
+    return (
+        ("provider", provider.PROVIDER_NAME),
+        ("model", config.get("deployment") or config.get("model") or ""),
+        ("region", config.get("region") or ""),
+    )
+
+
+@contextlib.contextmanager
+def in_flight(provider, config):
+    """Count an attempt in llm_requests_in_flight while it runs."""
+    if registry is None:
+        yield
+        return
+    labels = request_labels(provider, config)
+    registry.add("llm_requests_in_flight", labels, 1)
+    try:
+        yield
+    finally:
+        registry.add("llm_requests_in_flight", labels, -1)
+
+
+def record_retry(provider, config, throttled):
+    """Count one failed attempt that is about to be retried."""
+    if registry is None:
+        return
+    labels = request_labels(provider, config)
+    registry.add("llm_request_retries", labels)
+    if throttled:
+        registry.add("llm_request_throttled", labels)
+
+
+def record_result(provider, config, result):
+    """Count a finished request and add its latency, tokens and cost."""
+    if registry is None:
+        return
+    labels = request_labels(provider, config)
+    registry.add("llm_requests", labels)
+    if result["error"]:
+        registry.add("llm_request_errors", labels)
+        if result["throttled"]:
+            registry.add("llm_request_throttled", labels)
+        return
+    registry.observe("llm_response_time_seconds", labels, result["response_time"])
+    for name, field in (("llm_ttft_seconds", "ttft"), ("llm_output_tokens_per_second", "tokens_per_sec")):
+        if result.get(field) is not None:
+            registry.observe(name, labels, result[field])
+    registry.add("llm_tokens", labels + (("type", "prompt"),), result["prompt_tokens"])
+    registry.add("llm_tokens", labels + (("type", "completion"),), result["completion_tokens"])
+    registry.add("llm_cost_usd", labels, result["cost"] + (result.get("hedge_cost") or 0))
+
+
+def add_metrics_arguments(parser, quiet=True):
+    """
+    Add the shared live metrics and console output options to a script's argument parser.
+    Scripts that already print one line per request pass quiet=False to leave out --quiet.
+    """
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve live Prometheus/OpenMetrics metrics on this local port (at /metrics)."
+    )
+    if quiet:
+        parser.add_argument(
+            "--quiet",
+            action="store_true",
+            help="Print one line per run instead of the full response and its metrics."
+        )
+
+
+def metrics_from_args(args):
+    """Start the metrics endpoint if --metrics-port was given; returns the server or None."""
+    if args.metrics_port is None:
+        return None
+    server = start_metrics_server(args.metrics_port)
+    print(f"Serving live metrics at {server.url}")
+    return server
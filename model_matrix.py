@@ -0,0 +1,285 @@
+# model_matrix.py
+# Benchmark a matrix of provider/model variants, declared in one JSON file, in a single
+# process. Each entry names a provider (azure, gcp or aws) and overrides any of that
+# provider's load_config settings: model (or Azure deployment), region, generation
+# parameters and pricing. "defaults" apply to every entry whose provider has the setting.
+#
+#   {
+#     "defaults": {"max_tokens": 1000, "temperature": 1.0},
+#     "models": [
+#       {"provider": "aws", "region": "us-west-2", "model": "anthropic.claude-3-5-haiku-20241022-v1:0",
+#        "input_token_price": 0.0008, "output_token_price": 0.004},
+#       {"name": "GPT-4.1 mini", "provider": "azure", "region": "eastus", "deployment": "gpt-41-mini",
+#        "model": "gpt-4.1-mini", "input_token_price": 0.0004, "output_token_price": 0.0016}
+#     ]
+#   }
+#
+# All entries run concurrently. Entries for the same provider and region share one client
+# and one rate limiter, so variants of a provider stay within its quota together. Every
+# entry's runs go to the results store and its own CSV, and benchmark_matrix.csv compares
+# all variants side by side:
+#
+#   python model_matrix.py matrices/example.json --simulate
+
+import re
+import csv
+import json
+import argparse
+import asyncio
+
+import simulated_provider
+from workload import load_requests
+from response_cache import add_cache_arguments, cache_from_args
+from results_store import ResultsStore, add_store_arguments
+from adaptive_sampling import add_sampling_arguments, target_from_args
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from rate_limiter import add_retry_arguments, apply_retry_args, limiter_from_config
+from run_all_benchmarks import provider_keys
+from benchmark_common import (
+    DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, NUM_RUNS, average_results, format_optional, needs_client,
+    output_throughput, print_cold_start, run_benchmark, start_client
+)
+
+matrix_csv = "benchmark_matrix.csv"
+
+# Entry fields that are not provider settings
+ENTRY_FIELDS = {"name", "provider", "region"}
+
+# Provider settings a matrix file may not set: rate limits belong to the shared limiter
+# (--rpm/--tpm or <PROVIDER>_RPM/_TPM), and keys stay in the environment
+RESERVED_SETTINGS = {"endpoint_url", "requests_per_min", "tokens_per_min", "api_key"}
+
+
+def entry_name(provider, config):
+    """Default entry name, e.g. "AWS Bedrock Claude anthropic.claude-3-5-haiku-20241022-v1:0 (us-west-2)"."""
+    return f"{provider.PROVIDER_NAME} {config.get('deployment') or config['model']} ({config['region']})"
+
+
+def csv_name(name):
+    """The per-entry results CSV, e.g. matrix_aws_bedrock_claude_gpt-4.1_eastus.csv."""
+    return "matrix_" + re.sub(r"[^a-z0-9.-]+", "_", name.lower()).strip("_") + ".csv"
+
+
+def load_matrix(path, endpoint_url=None):
+    """
+    Read a matrix file and return its entries as (name, provider module, config) tuples.
+    `endpoint_url` (e.g. a simulated_provider.py server) is passed to every provider's
+    load_config. Raises ValueError for unknown providers or settings, so typos fail early.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON ({e})")
+    defaults = data.get("defaults", {})
+    entries = []
+    for number, entry in enumerate(data.get("models", []), 1):
+        provider = provider_keys.get(entry.get("provider"))
+        if provider is None:
+            raise ValueError(
+                f"{path}: model {number}: 'provider' must be one of {', '.join(sorted(provider_keys))}"
+            )
+        config = provider.load_config(endpoint_url)
+        region = entry.get("region", defaults.get("region"))
+        if region:
+            config = provider.region_config(config, region)
+        # Defaults only apply where the provider has the setting (e.g. top_p is not a Bedrock setting)
+        settings = {key: value for key, value in defaults.items() if key in config and key not in RESERVED_SETTINGS}
+        for key, value in entry.items():
+            if key in ENTRY_FIELDS:
+                continue
+            if key not in config or key in RESERVED_SETTINGS:
+                raise ValueError(f"{path}: model {number}: unknown setting {key!r} for {entry['provider']}")
+            settings[key] = value
+        config.update(settings)
+        entries.append((entry.get("name") or entry_name(provider, config), provider, config))
+    if not entries:
+        raise ValueError(f"{path}: no models listed under 'models'")
+    names = [name for name, _, _ in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate model names {', '.join(duplicates)}; give each entry a 'name'")
+    return entries
+
+
+async def run_entry(name, provider, config, client, question, stream, workload_path, cache, store, run_id, args):
+    """Run one matrix entry's benchmark on its group's client, reporting (rather than raising) any failure."""
+    print(f"\n=== Running {name} Benchmark ===\n")
+    try:
+        target = target_from_args(args)
+        requests = load_requests(workload_path, question, NUM_RUNS if target is None else None)
+        return await run_benchmark(
+            provider, requests, csv_name(name), config=config, stream=stream, cache=cache, store=store,
+            run_id=run_id, target=target, warmup=args.warmup, name=name, client=client, quiet=args.quiet
+        )
+    except Exception as e:
+        print(f"Error running {name} benchmark: {e}")
+        return None
+
+
+async def run_matrix(entries, question, stream, workload_path, cache, store, run_id, args):
+    """
+    Benchmark every entry concurrently, with one client and one rate limiter per provider
+    and region. `args` is the parsed command line, for the rate limit, retry, adaptive
+    sampling and warmup options. Returns {entry name: averages or None}.
+    """
+    groups = {}
+    for name, provider, config in entries:
+        apply_retry_args(config, args)
+        apply_hedge_args(config, args)
+        groups.setdefault((provider, config["region"]), []).append((name, config))
+
+    clients = []
+    runs = []
+    try:
+        for (provider, region), members in groups.items():
+            # The first entry's config carries the group's credentials and connection settings
+            group_config = members[0][1]
+            group_name = f"{provider.PROVIDER_NAME} ({region})"
+            client = None
+            if needs_client(dict(group_config, response_cache=cache)):
+                try:
+                    client, cold_start = await start_client(provider, group_config)
+                except Exception as e:
+                    print(f"Error starting {group_name} client, skipping its models: {e}")
+                    continue
+                clients.append((provider, client))
+                store.save_cold_start(run_id, group_name, cold_start)
+                print_cold_start(group_name, cold_start)
+            limiter = limiter_from_config(group_config)
+            for name, config in members:
+                config["rate_limiter"] = limiter
+                runs.append((name, provider, config, client))
+        results = await asyncio.gather(*(
+            run_entry(name, provider, config, client, question, stream, workload_path, cache, store, run_id, args)
+            for name, provider, config, client in runs
+        ))
+    finally:
+        for provider, client in clients:
+            await provider.close_client(client)
+    return {name: averages for (name, _, _, _), averages in zip(runs, results)}
+
+
+def write_matrix_summary(entries, store, run_id):
+    """Write one row per model variant, read back from the results store, to benchmark_matrix.csv."""
+    header = [
+        "Name", "Provider", "Model", "Region", "Runs", "Failed Runs", "Average Response Time (s)",
+        "Response Time 95% CI (±s)", "P50 Response Time (s)", "P95 Response Time (s)", "P99 Response Time (s)",
+        "Average TTFT (s)", "Output Tokens/s", "Average Prompt Tokens", "Average Completion Tokens", "Average Cost",
+        "Input Price (USD/1K)", "Output Price (USD/1K)"
+    ]
+    with open(matrix_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, provider, config in entries:
+            averages = average_results(store.iter_results(run_id, name, include_response=False))
+            stats = averages["sketches"]["response_time"].stats()
+            writer.writerow([
+                name,
+                provider.PROVIDER_NAME,
+                config.get("deployment") or config["model"],
+                config["region"],
+                averages["runs"],
+                averages["failed"],
+                f"{averages['response_time']:.2f}" if averages["runs"] else "",
+                format_optional(averages["response_time_ci"], ".2f"),
+                format_optional(stats["P50"], ".2f"),
+                format_optional(stats["P95"], ".2f"),
+                format_optional(stats["P99"], ".2f"),
+                format_optional(averages["ttft"], ".3f"),
+                format_optional(output_throughput(averages), ".1f"),
+                f"{averages['prompt_tokens']:.2f}",
+                f"{averages['completion_tokens']:.2f}",
+                f"{averages['cost']:.6f}",
+                config["input_token_price"],
+                config["output_token_price"],
+            ])
+
+    print(f"\nModel matrix summary written to {matrix_csv}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark every provider/model variant in a matrix file concurrently."
+    )
+    parser.add_argument(
+        "matrix",
+        type=str,
+        help="JSON file listing the provider/model variants to benchmark (see the top of model_matrix.py)."
+    )
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send to every model."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use each provider's streaming API and record TTFT, inter-chunk gaps and output tokens/sec."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to send to every model instead of repeating --question."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send every model's requests to this endpoint, e.g. a running simulated_provider.py."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and benchmark against it (offline, no cost)."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent to each model before measuring and left out of the results (default 0)."
+    )
+    add_cache_arguments(parser)
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_sampling_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+
+    endpoint_url = args.endpoint_url
+    server = None
+    if args.simulate:
+        server = simulated_provider.start_server()
+        endpoint_url = server.url
+        print(f"Using simulated providers at {endpoint_url}")
+
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    try:
+        entries = load_matrix(args.matrix, endpoint_url)
+        run_id = store.start_run(args.run_id, args.resume)
+        print(f"Appending results to {args.results_db} as run {run_id}")
+        try:
+            asyncio.run(run_matrix(
+                entries, args.question, args.stream, args.workload, cache_from_args(args), store, run_id, args
+            ))
+        except KeyboardInterrupt:
+            print(f"\nInterrupted. Completed runs are saved; continue with --resume --run-id {run_id}")
+            raise
+        write_matrix_summary(entries, store, run_id)
+    finally:
+        stop_trace()
+        if server:
+            server.shutdown()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# rate_limiter.py
+# Client-side rate limiting and retries shared by every provider.
+#
+# Each provider gets a ProviderRateLimiter with token buckets for requests/min and
+# tokens/min, so concurrent load stays inside the quota instead of discovering it through
+# 429s. Calls that are throttled anyway, or fail transiently, are retried with jittered
+# exponential backoff that honours the server's Retry-After. The SDKs' own retries are
+# switched off so every retry and every second spent waiting is counted by the retry loop
+# (send_with_retries in benchmark_common.py): the result records `retries` and
+# `throttle_wait` separately from the service latency of the attempt that succeeded.
+
+import os
+import time
+import random
+import asyncio
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0  # Seconds before the first retry (before jitter)
+DEFAULT_BACKOFF_CAP = 60.0  # Longest single backoff
+
+# Buckets hold ten seconds' worth of quota, matching how Azure enforces per-minute limits
+BURST_SECONDS = 10
+
+
+class TokenBucket:
+    """An asyncio token bucket refilled continuously at `per_minute` / 60 per second."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()  # Waiters are served in arrival order
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount):
+        """Wait until `amount` can be taken; returns the seconds spent waiting."""
+        waited = 0.0
+        async with self.lock:
+            # A request larger than the whole bucket goes once the bucket is full and leaves it in debt
+            needed = min(amount, self.capacity)
+            self.refill()
+            while self.tokens < needed:
+                delay = (needed - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self.refill()
+            self.tokens -= amount
+        return waited
+
+    def refund(self, amount):
+        """Return over-estimated tokens once the real usage is known."""
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ProviderRateLimiter:
+    """Requests/min and tokens/min limits for one provider (either may be None for unlimited)."""
+
+    def __init__(self, requests_per_min=None, tokens_per_min=None):
+        self.requests = TokenBucket(requests_per_min) if requests_per_min else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min else None
+
+    async def acquire(self, estimated_tokens):
+        waited = 0.0
+        if self.requests:
+            waited += await self.requests.acquire(1)
+        if self.tokens:
+            waited += await self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def settle(self, estimated_tokens, actual_tokens):
+        if self.tokens and actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+
+def quota_from_env(prefix):
+    """
+    Read a provider's client-side quota from <prefix>_RPM and <prefix>_TPM, returning the
+    requests_per_min / tokens_per_min config entries (None when unset, i.e. unlimited).
+    """
+    quota = {}
+    for suffix, field in (("RPM", "requests_per_min"), ("TPM", "tokens_per_min")):
+        value = os.getenv(f"{prefix}_{suffix}")
+        quota[field] = float(value) if value else None
+    return quota
+
+
+def limiter_from_config(config):
+    """Build the limiter for a provider config, or None when it has no limits."""
+    if not config.get("requests_per_min") and not config.get("tokens_per_min"):
+        return None
+    return ProviderRateLimiter(config.get("requests_per_min"), config.get("tokens_per_min"))
+
+
+def estimate_tokens(config, prompt):
+    """Tokens to reserve before sending: a rough prompt count plus the full output budget."""
+    return round(len(prompt.split()) / 0.75) + (config.get("max_tokens") or 0)
+
+
+def retry_after_seconds(exc):
+    """Return the server's requested delay from an SDK exception, or None."""
+    response = getattr(exc, "response", None)
+    # botocore ClientError: response is a parsed dict
+    if isinstance(response, dict):
+        headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    else:
+        # openai / google-genai: response is an httpx.Response
+        headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(attempt, config, retry_after=None):
+    """Full-jitter exponential backoff for retry `attempt` (0-based), never shorter than Retry-After."""
+    base = config.get("backoff_base", DEFAULT_BACKOFF_BASE)
+    cap = config.get("backoff_cap", DEFAULT_BACKOFF_CAP)
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def add_retry_arguments(parser, max_retries=DEFAULT_MAX_RETRIES):
+    """Add the shared rate limit and retry options to a script's argument parser."""
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="Client-side limit on requests per minute for each provider."
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=None,
+        help="Client-side limit on tokens per minute (prompt estimate plus max tokens) for each provider."
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=max_retries,
+        help="Retries for throttled (429) or transient failures before a run is recorded as failed."
+    )
+
+
+def apply_retry_args(config, args):
+    """Copy the rate limit and retry options from the command line into a provider config."""
+    if args.rpm:
+        config["requests_per_min"] = args.rpm
+    if args.tpm:
+        config["tokens_per_min"] = args.tpm
+    config["max_retries"] = args.max_retries
+    return config
@@ -0,0 +1,183 @@
+# response_cache.py
+# Record/replay cache for provider responses, shared by all the benchmark scripts.
+#
+# Entries are content-addressed by a SHA-256 of the provider, model and every generation
+# setting that affects the output (prompt, system, max tokens, temperature, ...). Each key
+# keeps every recorded sample (raw SDK response plus the measured timings) as one JSON
+# line, so five recorded runs of the same prompt replay as five distinct runs.
+#
+# Modes:
+#   passthrough  no caching (default)
+#   record       call the provider and append the response to the cache
+#   replay       serve responses from the cache without calling the provider, either
+#                instantly or after sleeping for the recorded response time
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import datetime
+
+CACHE_MODES = ["passthrough", "record", "replay"]
+REPLAY_TIMINGS = ["recorded", "instant"]
+DEFAULT_CACHE_DIR = ".benchmark_cache"
+
+# Config fields that change what a provider returns (or, for the region and endpoint, how
+# quickly), and so belong in the cache key
+KEY_FIELDS = [
+    "model", "deployment", "region", "endpoint_url", "system", "max_tokens", "temperature", "top_p", "seed", "stream"
+]
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when no recorded response exists for a request."""
+
+
+def cache_key(provider_name, config, prompt):
+    """Return the content hash identifying a request."""
+    fields = {name: config.get(name) for name in KEY_FIELDS}
+    fields["provider"] = provider_name
+    fields["prompt"] = prompt
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, mode="record", replay_timing="recorded",
+                 max_age_days=None, max_mb=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r} (expected one of {CACHE_MODES})")
+        if replay_timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unknown replay timing {replay_timing!r} (expected one of {REPLAY_TIMINGS})")
+        self.directory = directory
+        self.mode = mode
+        self.replay_timing = replay_timing
+        self.max_age_days = max_age_days
+        self.max_mb = max_mb
+        self.replay_positions = {}  # Next sample to replay for each key
+        os.makedirs(directory, exist_ok=True)
+        self.evict()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key + ".jsonl")
+
+    def load_samples(self, key):
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def store(self, key, provider_name, config, prompt, result, raw):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "provider": provider_name,
+            "request": dict({name: config.get(name) for name in KEY_FIELDS}, prompt=prompt),
+            "recorded_at": datetime.datetime.now().isoformat(),
+            "result": result,
+            "raw": raw,
+        }
+        with open(path, mode="a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+    async def replay(self, key):
+        samples = self.load_samples(key)
+        if not samples:
+            raise CacheMissError(f"No recorded response for cache key {key}")
+        position = self.replay_positions.get(key, 0)
+        self.replay_positions[key] = position + 1
+        result = dict(samples[position % len(samples)]["result"])
+        if self.replay_timing == "recorded":
+            await asyncio.sleep(result["response_time"])
+        result["cached"] = True
+        return result
+
+    async def send(self, provider, client, config, prompt, send=None):
+        """
+        Send a request through the cache according to the cache mode. `send` is the
+        coroutine used to call the provider when recording (default: provider.send_request
+        wrapped as send(provider, client, config, prompt)).
+        """
+        key = cache_key(provider.PROVIDER_NAME, config, prompt)
+        if self.mode == "replay":
+            return await self.replay(key)
+
+        if send is None:
+            async def send(provider, client, config, prompt):
+                return await provider.send_request(client, config, prompt)
+
+        # Record: ask the provider to keep its raw response so it can be stored alongside the timings
+        result = await send(provider, client, dict(config, keep_raw=True), prompt)
+        raw = result.pop("raw", None)
+        if result.get("error") is None:
+            self.store(key, provider.PROVIDER_NAME, config, prompt, result, raw)
+        return result
+
+    def evict(self):
+        """Delete entries older than max_age_days, then the oldest entries until under max_mb."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            for mtime, _, path in entries:
+                if mtime < cutoff:
+                    os.remove(path)
+            entries = [e for e in entries if e[0] >= cutoff]
+
+        if self.max_mb is not None:
+            total = sum(size for _, size, _ in entries)
+            limit = self.max_mb * 1024 * 1024
+            for _, size, path in sorted(entries):
+                if total <= limit:
+                    break
+                os.remove(path)
+                total -= size
+
+
+def add_cache_arguments(parser):
+    """Add the shared --cache-* options to a script's argument parser."""
+    parser.add_argument(
+        "--cache-mode",
+        choices=CACHE_MODES,
+        default="passthrough",
+        help="record: store responses; replay: serve stored responses without calling the API."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for cached responses."
+    )
+    parser.add_argument(
+        "--cache-replay-timing",
+        choices=REPLAY_TIMINGS,
+        default="recorded",
+        help="Replay after the recorded response time, or instantly."
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=None,
+        help="Evict cached responses older than this."
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=None,
+        help="Evict the oldest cached responses beyond this total size."
+    )
+
+
+def cache_from_args(args):
+    """Build the ResponseCache selected on the command line, or None for passthrough."""
+    if args.cache_mode == "passthrough":
+        return None
+    return ResponseCache(
+        args.cache_dir, args.cache_mode, args.cache_replay_timing, args.cache_max_age_days, args.cache_max_mb
+    )
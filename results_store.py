@@ -0,0 +1,208 @@
+# results_store.py
+# Append-only SQLite store for benchmark results. Every run is committed as soon as it
+# completes, so a crash or Ctrl-C loses at most the request in flight, and an interrupted
+# benchmark can be resumed by re-running with --resume. The per-provider CSVs and averages
+# are generated from the store rather than from lists kept in memory.
+#
+# Each row holds the full result record as JSON, so new metrics need no schema changes.
+# Each provider's latency sketches (see latency_sketch.py) and cold start timings are
+# saved alongside its runs, as are the periodic rolling-window snapshots of soak.py.
+
+import json
+import sqlite3
+import datetime
+
+DEFAULT_RESULTS_DB = "benchmark_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmarks (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    run_index INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    error TEXT,
+    record TEXT NOT NULL,
+    PRIMARY KEY (run_id, provider, run_index)
+);
+CREATE TABLE IF NOT EXISTS cold_starts (
+    run_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (run_id, provider)
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    run_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (run_id, provider, metric)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    run_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    taken_at TEXT NOT NULL,
+    window TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (run_id, provider, taken_at, window)
+);
+"""
+
+
+def new_run_id():
+    """Return a run id based on the current time, e.g. 20250620-231245."""
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_RESULTS_DB):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # WAL keeps each per-run commit cheap and lets other processes read while we write
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def start_run(self, run_id=None, resume=False):
+        """
+        Register a benchmark run and return its id. With `resume` and no id, the most
+        recent run is resumed; without `resume` a fresh id is generated when none is given.
+        """
+        if resume and run_id is None:
+            row = self.connection.execute(
+                "SELECT run_id FROM benchmarks ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"No previous run to resume in {self.path}")
+            run_id = row[0]
+        run_id = run_id or new_run_id()
+        self.connection.execute(
+            "INSERT OR IGNORE INTO benchmarks (run_id, started_at) VALUES (?, ?)",
+            (run_id, datetime.datetime.now().isoformat()),
+        )
+        self.connection.commit()
+        return run_id
+
+    def append(self, run_id, provider_name, run_index, result):
+        """Write one completed run. A failed run can be overwritten when the benchmark is resumed."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO runs (run_id, provider, run_index, completed_at, error, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                run_id,
+                provider_name,
+                run_index,
+                datetime.datetime.now().isoformat(),
+                result.get("error"),
+                json.dumps(result, default=str),
+            ),
+        )
+        self.connection.commit()
+
+    def next_run_index(self, run_id, provider_name):
+        """Return the run index after the last one stored, so a resumed soak appends rather than overwrites."""
+        row = self.connection.execute(
+            "SELECT MAX(run_index) FROM runs WHERE run_id = ? AND provider = ?", (run_id, provider_name)
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def completed_runs(self, run_id, provider_name):
+        """Return the run indexes that already succeeded, so a resumed benchmark can skip them."""
+        rows = self.connection.execute(
+            "SELECT run_index FROM runs WHERE run_id = ? AND provider = ? AND error IS NULL",
+            (run_id, provider_name),
+        )
+        return {row[0] for row in rows}
+
+    def iter_results(self, run_id, provider_name, include_response=True):
+        """Yield the stored result records for one provider in run order, one row at a time."""
+        rows = self.connection.execute(
+            "SELECT run_index, record FROM runs WHERE run_id = ? AND provider = ? ORDER BY run_index",
+            (run_id, provider_name),
+        )
+        for run_index, record in rows:
+            result = json.loads(record)
+            result["run_index"] = run_index
+            if not include_response:
+                result["response"] = ""
+            yield result
+
+    def save_cold_start(self, run_id, provider_name, cold_start):
+        """Save (replacing) a provider's cold start timings: auth, client construction and first request."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO cold_starts (run_id, provider, record) VALUES (?, ?, ?)",
+            (run_id, provider_name, json.dumps(cold_start, default=str)),
+        )
+        self.connection.commit()
+
+    def load_cold_starts(self, run_id):
+        """Return {provider: cold start dict} for a run."""
+        rows = self.connection.execute("SELECT provider, record FROM cold_starts WHERE run_id = ?", (run_id,))
+        return {provider: json.loads(record) for provider, record in rows}
+
+    def save_sketch(self, run_id, provider_name, metric, sketch):
+        """Save (replacing) a provider's latency sketch for a metric; `sketch` is LatencySketch.to_dict()."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sketches (run_id, provider, metric, sketch) VALUES (?, ?, ?, ?)",
+            (run_id, provider_name, metric, json.dumps(sketch)),
+        )
+        self.connection.commit()
+
+    def load_sketches(self, run_id):
+        """Return {(provider, metric): sketch dict} for a run."""
+        rows = self.connection.execute(
+            "SELECT provider, metric, sketch FROM sketches WHERE run_id = ?", (run_id,)
+        )
+        return {(provider, metric): json.loads(sketch) for provider, metric, sketch in rows}
+
+    def save_snapshot(self, run_id, provider_name, taken_at, window, snapshot):
+        """Save one rolling-window summary taken at `taken_at` (an ISO timestamp) for a provider."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO snapshots (run_id, provider, taken_at, window, record) VALUES (?, ?, ?, ?, ?)",
+            (run_id, provider_name, taken_at, window, json.dumps(snapshot, default=str)),
+        )
+        self.connection.commit()
+
+    def iter_snapshots(self, run_id, provider_name=None):
+        """Yield (provider, taken_at, window, snapshot) for a run in time order, one row at a time."""
+        query = "SELECT provider, taken_at, window, record FROM snapshots WHERE run_id = ?"
+        params = [run_id]
+        if provider_name is not None:
+            query += " AND provider = ?"
+            params.append(provider_name)
+        for provider, taken_at, window, record in self.connection.execute(query + " ORDER BY taken_at", params):
+            yield provider, taken_at, window, json.loads(record)
+
+    def providers(self, run_id):
+        """Return the provider names that have results for a run."""
+        rows = self.connection.execute(
+            "SELECT DISTINCT provider FROM runs WHERE run_id = ? ORDER BY provider", (run_id,)
+        )
+        return [row[0] for row in rows]
+
+
+def add_store_arguments(parser):
+    """Add the shared results store options to a script's argument parser."""
+    parser.add_argument(
+        "--results-db",
+        type=str,
+        default=DEFAULT_RESULTS_DB,
+        help="SQLite file that every run is appended to as soon as it completes."
+    )
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default=None,
+        help="Name for this benchmark run (default: a timestamp)."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run (--run-id, or the most recent one), skipping completed runs."
+    )
@@ -1,141 +1,603 @@
-import subprocess
-import sys
+# run_all_benchmarks.py
+# Runs the Azure, GCP and AWS benchmarks concurrently in a single asyncio process, so the
+# suite takes roughly as long as the slowest provider, then compiles the per-provider
+# averages into benchmark_summary.csv and benchmark_summary_transposed.csv.
+#
+# With --regions each listed provider is fanned out over several regions (or, for Azure,
+# endpoints), all benchmarked at the same time with one client per region, and
+# benchmark_regions.csv ranks each provider's regions by latency:
+#
+#   python run_all_benchmarks.py --regions aws=us-east-1,us-west-2 --regions gcp=us-central1,europe-west4
+#
+# With --workers the requests are split across several worker processes or hosts instead
+# (see distributed.py) and merged into the same summaries.
+
 import time
 import csv
 import os
+import argparse
+import asyncio
+
+import simulated_provider
+import azure_openai_demo
+import gcp_vertexai_demo
+import aws_bedrock_claude_demo
+from workload import load_requests
+from response_cache import add_cache_arguments, cache_from_args
+from results_store import ResultsStore, add_store_arguments
+from adaptive_sampling import add_sampling_arguments, target_from_args
+from prompt_cache import add_prompt_cache_arguments, apply_prompt_cache
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, stop_trace, trace_from_args
+from distributed import add_worker_arguments, check_worker_args, run_coordinator
+from rate_limiter import add_retry_arguments, apply_retry_args
+from latency_sketch import DISTRIBUTION_STATS
+from benchmark_common import (
+    DEFAULT_QUESTION, DEFAULT_WARMUP_RUNS, NUM_RUNS, PHASE_COLUMNS, SKETCH_METRICS, average_results, format_optional,
+    group_by_tag, output_throughput, run_benchmark
+)
 
-# The question to use for all benchmarks (edit as needed or pass via sys.argv)
-question = "I'd like to compare hyperscalers to assess which one is the best choice for enterprise use, in about 600 words?"
+# Output CSV filenames for each provider
+azure_csv = azure_openai_demo.DEFAULT_CSV
+gcp_csv = gcp_vertexai_demo.DEFAULT_CSV
+aws_csv = aws_bedrock_claude_demo.DEFAULT_CSV
 
-# Output CSV filenames for each script
-azure_csv = "openai_results.csv"
-gcp_csv = "vertexai_results.csv"
-aws_csv = "bedrock_claude_results.csv"
+# List of providers to run with their CSV filenames and provider names
+providers = [
+    ("Azure OpenAI", azure_openai_demo, azure_csv),
+    ("GCP Vertex AI", gcp_vertexai_demo, gcp_csv),
+    ("AWS Bedrock Claude", aws_bedrock_claude_demo, aws_csv),
+]
 
-# Paths to your scripts
-azure_script = "azure_openai_demo.py"
-gcp_script = "gcp_vertexai_demo.py"
-aws_script = "aws_bedrock_claude_demo.py"
+summary_csv = "benchmark_summary.csv"
+transposed_csv = "benchmark_summary_transposed.csv"
+tag_summary_csv = "benchmark_summary_by_tag.csv"
+cold_start_csv = "benchmark_cold_start.csv"
+phase_csv = "benchmark_phases.csv"
+region_csv = "benchmark_regions.csv"
+hedge_csv = "benchmark_hedging.csv"
 
-# List of scripts to run with their CSV filenames and provider names
-scripts = [
-    ("Azure OpenAI", azure_script, azure_csv),
-    ("GCP Vertex AI", gcp_script, gcp_csv),
-    ("AWS Bedrock Claude", aws_script, aws_csv),
+# Provider keys accepted by --regions and in model_matrix.py files (the same as load_test.py's --provider)
+provider_keys = {
+    "azure": azure_openai_demo,
+    "gcp": gcp_vertexai_demo,
+    "aws": aws_bedrock_claude_demo,
+}
+
+# Distribution columns in the summaries, e.g. "P95 Response Time (s)", read from the
+# per-provider CSV row labelled with the statistic and the metric's column
+distribution_columns = [
+    (stat, column) for column, _ in SKETCH_METRICS.values() for stat, _ in DISTRIBUTION_STATS
 ]
 
-start_time = time.time()  # Start timing
 
-for name, script, csv_file in scripts:
+def region_list(value):
+    """argparse type for --regions: "aws=us-east-1,us-west-2" -> (provider module, [region, ...])."""
+    key, _, regions = value.partition("=")
+    if key not in provider_keys or not regions:
+        raise argparse.ArgumentTypeError(
+            f"expected PROVIDER=REGION[,REGION...] with PROVIDER one of {', '.join(sorted(provider_keys))}"
+        )
+    return provider_keys[key], [region.strip() for region in regions.split(",") if region.strip()]
+
+
+def region_name(region):
+    """The name part of a region spec (Azure specs may be "name=endpoint")."""
+    return region.partition("=")[0]
+
+
+def benchmark_targets(regions=None):
+    """
+    Return the (name, provider module, CSV file, region) benchmarks to run. Providers
+    without regions in `regions` ({provider module: [region, ...]}) run once in their
+    configured region (region None); the others run once per region, each under its own
+    name and CSV file, e.g. "AWS Bedrock Claude (us-west-2)" in
+    bedrock_claude_results_us-west-2.csv.
+    """
+    targets = []
+    for name, provider, csv_file in providers:
+        provider_regions = (regions or {}).get(provider)
+        if not provider_regions:
+            targets.append((name, provider, csv_file, None))
+            continue
+        base, extension = os.path.splitext(csv_file)
+        for region in provider_regions:
+            label = region_name(region)
+            targets.append((f"{name} ({label})", provider, f"{base}_{label}{extension}", region))
+    return targets
+
+
+async def run_provider(name, provider, question, csv_file, stream=False, workload_path=None, endpoint_url=None,
+                       cache=None, store=None, run_id=None, args=None, region=None):
+    """
+    Run one provider's benchmark, reporting (rather than raising) any failure.
+    `args` is the parsed command line, for the rate limit, retry, adaptive sampling and
+    warmup options that are applied to each provider separately. `region` overrides the
+    provider's configured region (see each provider's region_config).
+    """
     print(f"\n=== Running {name} Benchmark ===\n")
     try:
-        subprocess.run(
-            [sys.executable, script, "--question", question, "--csv", csv_file],
-            check=True
+        # Each provider reads its own pass over the workload file
+        target = target_from_args(args) if args is not None else None
+        runs = args.runs if args is not None else NUM_RUNS
+        requests = load_requests(workload_path, question, runs if target is None else None)
+        config = provider.load_config(endpoint_url)
+        if region is not None:
+            config = provider.region_config(config, region)
+        if args is not None:
+            apply_retry_args(config, args)
+            apply_hedge_args(config, args)
+            requests, stream = apply_prompt_cache(requests, config, args)
+        return await run_benchmark(
+            provider, requests, csv_file, config=config, stream=stream, cache=cache, store=store, run_id=run_id,
+            target=target, warmup=args.warmup if args is not None else 0, name=name,
+            quiet=args.quiet if args is not None else False
         )
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script}: {e}")
+    except Exception as e:
+        print(f"Error running {name} benchmark: {e}")
+        return None
+
 
-end_time = time.time()  # End timing
-elapsed = end_time - start_time
+async def run_all(question, stream=False, workload_path=None, endpoint_url=None, cache=None, store=None,
+                  run_id=None, args=None, targets=None):
+    """
+    Drive every provider (and every region of a fanned-out provider, see benchmark_targets)
+    at the same time. Returns {benchmark name: averages or None}.
+    """
+    targets = targets or benchmark_targets()
+    results = await asyncio.gather(*(
+        run_provider(
+            name, provider, question, csv_file, stream, workload_path, endpoint_url, cache, store, run_id, args,
+            region
+        )
+        for name, provider, csv_file, region in targets
+    ))
+    return {name: provider_results for (name, _, _, _), provider_results in zip(targets, results)}
 
-print(f"\nAll benchmarks completed in {elapsed:.2f} seconds.")
 
-# Compile averages from each CSV into a summary file
-summary_csv = "benchmark_summary.csv"
-summary_rows = []
-header = [
-    "Provider",
-    "Average Response Time (s)",
-    "Average Prompt Tokens",
-    "Average Completion Tokens",
-    "Average Total Tokens",
-    "Average Characters",
-    "Average Words",
-    "Average Cost",
-    "Region",
-    "Timestamp"
-]
+def write_summary(targets=None):
+    """
+    Compile averages from each CSV into a summary file, one row per provider and region.
+    """
+    summary_rows = []
+    header = [
+        "Provider",
+        "Average Response Time (s)",
+        "Average Prompt Tokens",
+        "Average Completion Tokens",
+        "Average Total Tokens",
+        "Average Characters",
+        "Average Words",
+        "Average Cost",
+        "Region",
+        "Timestamp",
+        "Average TTFT (s)",
+        "Average Mean Inter-Chunk Gap (ms)",
+        "Average P95 Inter-Chunk Gap (ms)",
+        "Average Output Tokens/s",
+        "Connection Reuse Rate",
+        "Average Connection Setup (ms)",
+        "Average Retries",
+        "Average Throttle Wait (s)",
+        "Average Cached Tokens",
+        "Average Cache Savings (USD)",
+        "Failed Runs",
+        "Response Time 95% CI (±s)",
+        "Response Time Relative CI",
+    ] + [f"{stat} {column}" for stat, column in distribution_columns]
+    # Streaming and retry columns are looked up by name in each provider CSV
+    stream_columns = [
+        "TTFT (s)", "Mean Inter-Chunk Gap (ms)", "P95 Inter-Chunk Gap (ms)", "Output Tokens/s",
+        "Connection Reused", "Connection Setup (ms)", "Retries", "Throttle Wait (s)", "Cached Tokens",
+        "Cache Savings (USD)",
+    ]
 
-for name, _, csv_file in scripts:
-    if not os.path.exists(csv_file):
-        print(f"Warning: {csv_file} not found, skipping.")
-        continue
-    with open(csv_file, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-        # Accept either "Region" or "Location" for the region column
-        header_row = next(
-            (row for row in rows if row and ("Region" in row or "Location" in row) and "Timestamp" in row),
-            None
-        )
-        avg_row = next((row for row in rows if row and row[0].strip().lower() == "average"), None)
-        if header_row and avg_row:
-            # Get index for region/location and timestamp
-            region_idx = header_row.index("Region") if "Region" in header_row else (
-                header_row.index("Location") if "Location" in header_row else -1
+    for _, provider, csv_file, region in targets or benchmark_targets():
+        name = provider.PROVIDER_NAME
+        if not os.path.exists(csv_file):
+            print(f"Warning: {csv_file} not found, skipping.")
+            continue
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            rows = list(reader)
+            # Accept either "Region" or "Location" for the region column
+            header_row = next(
+                (row for row in rows if row and ("Region" in row or "Location" in row) and "Timestamp" in row),
+                None
             )
-            timestamp_idx = header_row.index("Timestamp") if "Timestamp" in header_row else -1
-            summary = [
+            avg_row = next((row for row in rows if row and row[0].strip().lower() == "average"), None)
+            ci_row = next((row for row in rows if row and row[0].endswith("CI (±)")), None)
+            if header_row and avg_row:
+                # Get index for region/location and timestamp
+                region_idx = header_row.index("Region") if "Region" in header_row else (
+                    header_row.index("Location") if "Location" in header_row else -1
+                )
+                timestamp_idx = header_row.index("Timestamp") if "Timestamp" in header_row else -1
+                summary = [
+                    name,
+                    avg_row[1],  # Average Response Time (s)
+                    avg_row[2],  # Average Prompt Tokens
+                    avg_row[3],  # Average Completion Tokens
+                    avg_row[4],  # Average Total Tokens
+                    avg_row[5],  # Average Characters
+                    avg_row[6],  # Average Words
+                    avg_row[7],  # Average Cost
+                    # A fanned-out region is named by its spec, even if every run in it failed
+                    region_name(region) if region is not None else (avg_row[region_idx] if region_idx != -1 else ""),
+                    avg_row[timestamp_idx] if timestamp_idx != -1 else "",
+                ]
+                for column in stream_columns:
+                    idx = header_row.index(column) if column in header_row else -1
+                    summary.append(avg_row[idx] if idx != -1 else "")
+                # The averages row's Error column holds e.g. "2 failed"
+                error_idx = header_row.index("Error") if "Error" in header_row else -1
+                summary.append(avg_row[error_idx].split()[0] if error_idx != -1 and avg_row[error_idx] else "")
+                # Achieved confidence interval of the mean response time, absolute and (in the
+                # Error column, e.g. "±4.8% of mean") relative to the mean
+                summary.append(ci_row[1] if ci_row else "")
+                relative = ci_row[error_idx] if ci_row and error_idx != -1 else ""
+                summary.append(relative.split()[0].lstrip("±") if relative else "")
+                for stat, column in distribution_columns:
+                    stat_row = next((row for row in rows if row and row[0] == stat), None)
+                    idx = header_row.index(column) if column in header_row else -1
+                    summary.append(stat_row[idx] if stat_row and idx != -1 else "")
+                summary_rows.append(summary)
+            else:
+                print(f"Warning: No averages or header found in {csv_file}")
+
+    # Write the summary CSV
+    with open(summary_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in summary_rows:
+            writer.writerow(row)
+
+    print(f"\nSummary written to {summary_csv}")
+    return summary_rows
+
+
+def write_transposed_summary(summary_rows):
+    """Transpose the summary so metrics are rows and providers are columns."""
+    # First, collect the provider names and their averages (excluding the "Provider" column).
+    # A provider benchmarked in several regions gets a column per region.
+    provider_names = [row[0] for row in summary_rows]
+    if len(set(provider_names)) < len(provider_names):
+        provider_names = [f"{row[0]} ({row[8]})" for row in summary_rows]
+    averages_by_provider = [row[1:] for row in summary_rows]
+
+    # Define the metric names in the order they appear in the averages
+    metric_names = [
+        "Avg. Response Time (s)",
+        "Avg. Prompt Tokens",
+        "Avg. Completion Tokens",
+        "Avg. Total Tokens",
+        "Avg. Characters",
+        "Avg. Words",
+        "Avg. Cost",
+        "Region",
+        "Timestamp",
+        "Avg. TTFT (s)",
+        "Avg. Mean Inter-Chunk Gap (ms)",
+        "Avg. P95 Inter-Chunk Gap (ms)",
+        "Avg. Output Tokens/s",
+        "Connection Reuse Rate",
+        "Avg. Connection Setup (ms)",
+        "Avg. Retries",
+        "Avg. Throttle Wait (s)",
+        "Avg. Cached Tokens",
+        "Avg. Cache Savings (USD)",
+        "Failed Runs",
+        "Response Time 95% CI (±s)",
+        "Response Time Relative CI",
+    ] + [f"{stat} {column}" for stat, column in distribution_columns]
+
+    # Prepare transposed rows: first row is header, then one row per metric
+    transposed_rows = []
+    header_row = ["Metric"] + provider_names
+    transposed_rows.append(header_row)
+
+    for i, metric in enumerate(metric_names):
+        row = [metric]
+        for provider_avg in averages_by_provider:
+            # Some providers may have fewer columns if something failed, so use a default if missing
+            value = provider_avg[i] if i < len(provider_avg) else ""
+            row.append(value)
+        transposed_rows.append(row)
+
+    # Write the transposed summary CSV
+    with open(transposed_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for row in transposed_rows:
+            writer.writerow(row)
+
+    print(f"\nTransposed summary written to {transposed_csv}")
+
+
+def write_cold_start_summary(store, run_id, targets=None):
+    """Write each provider's cold start costs next to its warm average response time."""
+    header = [
+        "Provider", "Auth (s)", "Client Construction (s)", "First Request (s)", "First Connection Setup (ms)",
+        "Warm Average Response Time (s)", "Cold Penalty (s)", "Warmup Runs"
+    ]
+    cold_starts = store.load_cold_starts(run_id)
+    with open(cold_start_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, _, _, _ in targets or benchmark_targets():
+            cold_start = cold_starts.get(name)
+            if cold_start is None:
+                continue
+            warm = average_results(store.iter_results(run_id, name, include_response=False))
+            first = cold_start.get("first_request_time")
+            setup = cold_start.get("first_connection_setup")
+            writer.writerow([
                 name,
-                avg_row[1],  # Average Response Time (s)
-                avg_row[2],  # Average Prompt Tokens
-                avg_row[3],  # Average Completion Tokens
-                avg_row[4],  # Average Total Tokens
-                avg_row[5],  # Average Characters
-                avg_row[6],  # Average Words
-                avg_row[7],  # Average Cost
-                avg_row[region_idx] if region_idx != -1 else "",
-                avg_row[timestamp_idx] if timestamp_idx != -1 else "",
+                f"{cold_start['auth_time']:.3f}",
+                f"{cold_start['client_time']:.3f}",
+                format_optional(first, ".3f"),
+                format_optional(setup * 1000 if setup is not None else None, ".1f"),
+                f"{warm['response_time']:.3f}" if warm["runs"] else "",
+                f"{first - warm['response_time']:.3f}" if first is not None and warm["runs"] else "",
+                cold_start.get("warmup_runs", 0),
+            ])
+
+    print(f"\nCold start summary written to {cold_start_csv}")
+
+
+def write_phase_summary(store, run_id, targets=None):
+    """
+    Write each provider's average latency breakdown (DNS, connect, TLS, send, server wait,
+    body, decode), each as milliseconds and as a share of the average response time. Time
+    the phases do not cover (SDK request building, event loop scheduling) is "Unaccounted".
+    """
+    header = ["Provider", "Runs", "Average Response Time (ms)"]
+    for column in PHASE_COLUMNS.values():
+        header += [column, column.replace("(ms)", "(%)")]
+    header += ["Unaccounted (ms)", "Unaccounted (%)"]
+    with open(phase_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, _, _, _ in targets or benchmark_targets():
+            averages = average_results(store.iter_results(run_id, name, include_response=False))
+            if not averages["runs"]:
+                continue
+            response_time = averages["response_time"]
+            row = [name, averages["runs"], f"{response_time * 1000:.1f}"]
+            accounted = 0.0
+            for phase in PHASE_COLUMNS:
+                value = averages["phases"][phase]
+                accounted += value or 0.0
+                share = value / response_time if value is not None and response_time else None
+                row += [format_optional(value * 1000 if value is not None else None, ".1f"),
+                        format_optional(share, ".1%")]
+            unaccounted = response_time - accounted
+            row += [
+                f"{unaccounted * 1000:.1f}",
+                format_optional(unaccounted / response_time if response_time else None, ".1%"),
             ]
-            summary_rows.append(summary)
+            writer.writerow(row)
+
+    print(f"\nLatency phase breakdown written to {phase_csv}")
+
+
+def write_hedge_summary(store, run_id, targets=None):
+    """
+    Write each provider's tail latency with and without hedging (over the same runs)
+    next to what the duplicate requests cost, so the p99 cut can be weighed against the spend.
+    """
+    header = [
+        "Provider", "Runs", "Hedged Runs", "Hedge Wins", "P50 Unhedged (s)", "P50 Hedged (s)",
+        "P95 Unhedged (s)", "P95 Hedged (s)", "P95 Reduction (%)", "P99 Unhedged (s)", "P99 Hedged (s)",
+        "P99 Reduction (%)", "Extra Tokens", "Extra Cost (USD)", "Extra Spend (%)"
+    ]
+    with open(hedge_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, _, _, _ in targets or benchmark_targets():
+            hedging = average_results(store.iter_results(run_id, name, include_response=False))["hedging"]
+            if hedging is None:
+                continue
+            row = [name, hedging.runs, hedging.hedged, hedging.won]
+            for q in (0.50, 0.95, 0.99):
+                row += [
+                    format_optional(hedging.without_hedging.quantile(q), ".3f"),
+                    format_optional(hedging.with_hedging.quantile(q), ".3f"),
+                ]
+                if q != 0.50:
+                    row.append(format_optional(hedging.reduction(q), ".1%"))
+            row += [hedging.hedge_tokens, f"{hedging.hedge_cost:.6f}", format_optional(hedging.extra_spend(), ".1%")]
+            writer.writerow(row)
+
+    print(f"\nHedging summary written to {hedge_csv}")
+
+
+def write_region_ranking(store, run_id, targets):
+    """
+    Rank each fanned-out provider's regions by average response time, fastest first, with
+    their tail latency and throughput. Throughput is the streamed output tokens/s, or
+    completion tokens per second of response time when not streaming (output_throughput).
+    """
+    header = [
+        "Provider", "Rank", "Region", "Runs", "Failed Runs", "Average Response Time (s)",
+        "P50 Response Time (s)", "P95 Response Time (s)", "Average TTFT (s)", "Output Tokens/s", "Average Cost"
+    ]
+    by_provider = {}
+    for name, provider, _, region in targets:
+        if region is None:
+            continue
+        averages = average_results(store.iter_results(run_id, name, include_response=False))
+        by_provider.setdefault(provider.PROVIDER_NAME, []).append((region_name(region), averages))
+
+    with open(region_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for provider_name, regions in by_provider.items():
+            # Regions where every run failed rank last
+            regions.sort(key=lambda item: (not item[1]["runs"], item[1]["response_time"]))
+            print(f"\n{provider_name} regions, fastest first:")
+            for rank, (region, averages) in enumerate(regions, start=1):
+                stats = averages["sketches"]["response_time"].stats()
+                throughput = output_throughput(averages)
+                writer.writerow([
+                    provider_name,
+                    rank,
+                    region,
+                    averages["runs"],
+                    averages["failed"],
+                    f"{averages['response_time']:.2f}" if averages["runs"] else "",
+                    format_optional(stats["P50"], ".2f"),
+                    format_optional(stats["P95"], ".2f"),
+                    format_optional(averages["ttft"], ".3f"),
+                    format_optional(throughput, ".1f"),
+                    f"{averages['cost']:.6f}",
+                ])
+                latency = f"{averages['response_time']:.2f} s" if averages["runs"] else "all runs failed"
+                print(f"  {rank}. {region}: {latency}, p95 {format_optional(stats['P95'], '.2f')} s, "
+                      f"{format_optional(throughput, '.1f')} output tokens/s")
+
+    print(f"\nRegion ranking written to {region_csv}")
+
+
+def write_tag_summary(store, run_id, targets=None):
+    """Write per-provider averages grouped by workload tag, read back from the results store."""
+    header = [
+        "Provider", "Tag", "Runs", "Average Response Time (s)", "Average Prompt Tokens",
+        "Average Completion Tokens", "Average Cost", "Average TTFT (s)", "Average Output Tokens/s"
+    ]
+    with open(tag_summary_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for name, _, _, _ in targets or benchmark_targets():
+            # Response text is not needed for the averages, so leave it out of memory
+            results = store.iter_results(run_id, name, include_response=False)
+            for tag, tagged in sorted(group_by_tag(results).items()):
+                averages = average_results(tagged)
+                writer.writerow([
+                    name,
+                    tag,
+                    averages["runs"],
+                    f"{averages['response_time']:.2f}",
+                    f"{averages['prompt_tokens']:.2f}",
+                    f"{averages['completion_tokens']:.2f}",
+                    f"{averages['cost']:.6f}",
+                    format_optional(averages["ttft"], ".3f"),
+                    format_optional(averages["tokens_per_sec"], ".1f"),
+                ])
+
+    print(f"\nPer-tag summary written to {tag_summary_csv}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Azure, GCP and AWS models concurrently.")
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to use for all benchmarks."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use each provider's streaming API and record TTFT, inter-chunk gaps and output tokens/sec."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to send to every provider instead of repeating --question."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send every provider's requests to this endpoint, e.g. a running simulated_provider.py."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and benchmark against it (offline, no cost)."
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=NUM_RUNS,
+        help="Requests sent to each provider when repeating --question."
+    )
+    add_cache_arguments(parser)
+    add_store_arguments(parser)
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=DEFAULT_WARMUP_RUNS,
+        help="Paid requests sent to each provider before measuring and left out of the results (default 0)."
+    )
+    parser.add_argument(
+        "--regions",
+        type=region_list,
+        action="append",
+        default=[],
+        metavar="PROVIDER=REGION[,REGION...]",
+        help="Benchmark a provider (azure, gcp or aws) in each of these regions concurrently and rank them; "
+             "repeat for several providers. Azure regions are name=endpoint or read AZURE_OPENAI_ENDPOINT_<NAME>."
+    )
+    add_retry_arguments(parser)
+    add_sampling_arguments(parser)
+    add_prompt_cache_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser)
+    add_trace_arguments(parser)
+    add_worker_arguments(parser)
+    args = parser.parse_args(argv)
+    check_worker_args(parser, args)
+    regions = dict(args.regions)
+    targets = benchmark_targets(regions)
+
+    endpoint_url = args.endpoint_url
+    server = None
+    if args.simulate:
+        server = simulated_provider.start_server()
+        endpoint_url = server.url
+        print(f"Using simulated providers at {endpoint_url}")
+
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    run_id = store.start_run(args.run_id, args.resume)
+    print(f"Appending results to {args.results_db} as run {run_id}")
+
+    start_time = time.time()  # Start timing
+    try:
+        if args.workers:
+            asyncio.run(run_coordinator(targets, store, run_id, args, endpoint_url))
         else:
-            print(f"Warning: No averages or header found in {csv_file}")
-
-# Write the summary CSV
-with open(summary_csv, mode="w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(header)
-    for row in summary_rows:
-        writer.writerow(row)
-
-print(f"\nSummary written to {summary_csv}")
-
-# Transpose the summary so metrics are rows and providers are columns
-# First, collect the provider names and their averages (excluding the "Provider" column)
-provider_names = [row[0] for row in summary_rows]
-averages_by_provider = [row[1:] for row in summary_rows]
-
-# Define the metric names in the order they appear in the averages
-metric_names = [
-    "Avg. Response Time (s)",
-    "Avg. Prompt Tokens",
-    "Avg. Completion Tokens",
-    "Avg. Total Tokens",
-    "Avg. Characters",
-    "Avg. Words",
-    "Avg. Cost",
-    "Region",
-    "Timestamp"
-]
+            asyncio.run(run_all(
+                args.question, args.stream, args.workload, endpoint_url, cache_from_args(args), store, run_id, args,
+                targets
+            ))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Completed runs are saved; continue with --resume --run-id {run_id}")
+        raise
+    finally:
+        stop_trace()
+        if server:
+            server.shutdown()
+    elapsed = time.time() - start_time  # End timing
+
+    print(f"\nAll benchmarks completed in {elapsed:.2f} seconds.")
+
+    summary_rows = write_summary(targets)
+    write_transposed_summary(summary_rows)
+    write_cold_start_summary(store, run_id, targets)
+    write_phase_summary(store, run_id, targets)
+    if args.hedge_percentile:
+        write_hedge_summary(store, run_id, targets)
+    if regions:
+        write_region_ranking(store, run_id, targets)
+    if args.workload:
+        write_tag_summary(store, run_id, targets)
+    store.close()
+
 
-# Prepare transposed rows: first row is header, then one row per metric
-transposed_rows = []
-header_row = ["Metric"] + provider_names
-transposed_rows.append(header_row)
-
-for i, metric in enumerate(metric_names):
-    row = [metric]
-    for provider_avg in averages_by_provider:
-        # Some scripts may have fewer columns if something failed, so use a default if missing
-        value = provider_avg[i] if i < len(provider_avg) else ""
-        row.append(value)
-    transposed_rows.append(row)
-
-# Write the transposed summary CSV
-with open("benchmark_summary_transposed.csv", mode="w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    for row in transposed_rows:
-        writer.writerow(row)
-
-print("\nTransposed summary written to benchmark_summary_transposed.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
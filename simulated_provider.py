@@ -0,0 +1,897 @@
+# simulated_provider.py
+# A local stand-in for the three provider APIs, so the harness can be run and load tested
+# offline without credentials or spend. One HTTP server answers:
+#
+#   Azure OpenAI   POST /openai/deployments/<deployment>/chat/completions   (JSON or SSE with stream=true)
+#   Gemini         POST .../models/<model>:generateContent | :streamGenerateContent (SSE)
+#   Bedrock        POST /model/<model>/invoke | /model/<model>/invoke-with-response-stream (AWS event stream)
+#   Gemini caches  POST .../cachedContents, DELETE .../cachedContents/<id>
+#
+# and the batch APIs (see batch_inference.py), with the object storage they read and write:
+#
+#   Azure Batch    POST /openai/files, POST /openai/batches, GET /openai/batches/<id>,
+#                  GET /openai/files/<id>/content
+#   Bedrock batch  POST /model-invocation-job, GET /model-invocation-job/<job ARN>,
+#                  S3 PUT/GET /<bucket>/<key> (path-style)
+#   Vertex batch   POST /v1/projects/<project>/locations/<region>/batchPredictionJobs, GET .../<id>,
+#                  GCS POST /upload/storage/v1/b/<bucket>/o, GET /storage/v1/b/<bucket>/o/<name>
+#
+# A batch job is queued for --batch-queue-ms, then runs at --batch-requests-per-sec; its
+# output is generated without the per-request generation delays.
+#
+# Responses are generated text with configurable time to first token, decode speed, output
+# length, 429 injection and stalls (a slow replica delaying the first token, for
+# exercising deadlines and hedging). Prompt caching is imitated too: a system prompt of at least
+# cache_min_tokens seen before (Azure automatically, Bedrock with a cache_control block, Gemini
+# through a context cache) is reported as cached input and skips the prefill time. Point a script at it with --endpoint-url, or let
+# run_all_benchmarks.py --simulate start one in-process.
+#
+#   python simulated_provider.py --port 8700 --ttft-ms 400 --tokens-per-sec 50 --throttle-rate 0.05
+#
+# A --profile JSON file can override the settings per API, e.g.
+#   {"azure": {"ttft_ms": 250}, "gcp": {"tokens_per_sec": 120}, "aws": {"throttle_rate": 0.1}}
+
+import sys
+import json
+import math
+import time
+import uuid
+import base64
+import random
+import struct
+import zlib
+import argparse
+import datetime
+import threading
+from email import policy
+from email.parser import BytesParser
+from urllib.parse import parse_qs, unquote, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SETTINGS = {
+    "ttft_ms": 300.0,  # Median time to first token
+    "ttft_sigma": 0.25,  # Log-normal spread of TTFT (0 = fixed)
+    "prefill_ms_per_token": 0.0,  # Extra time to first token per prompt token
+    "tokens_per_sec": 60.0,  # Median decode speed
+    "tokens_per_sec_sigma": 0.1,  # Log-normal spread of decode speed (0 = fixed)
+    "output_tokens": 400,  # Median response length, capped by the request's max tokens
+    "output_tokens_sigma": 0.2,  # Log-normal spread of response length (0 = fixed)
+    "chunk_tokens": 4,  # Tokens per streamed chunk
+    "throttle_rate": 0.0,  # Fraction of requests rejected with HTTP 429
+    "retry_after": 1,  # Seconds advertised in the Retry-After header of a 429
+    "stall_rate": 0.0,  # Fraction of requests that stall before their first token
+    "stall_ms": 5000.0,  # Extra time to first token of a stalled request
+    "cache_min_tokens": 1024,  # Shortest system prompt the simulated prompt caches accept
+    "batch_queue_ms": 2000.0,  # Time a batch job waits before it starts running
+    "batch_requests_per_sec": 20.0,  # Rate a running batch job works through its requests
+    "batch_failure_rate": 0.0,  # Fraction of batch requests that fail
+}
+
+# Which settings section applies to each API
+API_NAMES = ["azure", "gcp", "aws"]
+
+WORDS = (
+    "cloud enterprise scale region latency compliance workload migration network identity "
+    "storage compute pricing support availability resilience security governance platform"
+).split()
+
+
+# Each API's name for the simulated batch states
+AZURE_BATCH_STATUS = {"queued": "validating", "running": "in_progress", "completed": "completed"}
+BEDROCK_JOB_STATUS = {"queued": "Scheduled", "running": "InProgress", "completed": "Completed"}
+VERTEX_JOB_STATE = {"queued": "JOB_STATE_PENDING", "running": "JOB_STATE_RUNNING", "completed": "JOB_STATE_SUCCEEDED"}
+
+
+def sample_lognormal(median, sigma, rng):
+    """Draw from a log-normal distribution with the given median; sigma 0 returns the median."""
+    if sigma <= 0:
+        return median
+    return median * math.exp(rng.gauss(0, sigma))
+
+
+def count_tokens(text):
+    """Rough token count for prompts (about 0.75 words per token)."""
+    return max(1, round(len(text.split()) / 0.75))
+
+
+class SimulatedResponse:
+    """The sampled timings and text for one simulated request."""
+
+    def __init__(self, settings, prompt_text, max_tokens, rng, cached_tokens=0):
+        self.settings = settings
+        self.prompt_tokens = count_tokens(prompt_text)
+        self.cached_tokens = cached_tokens
+        tokens = round(sample_lognormal(settings["output_tokens"], settings["output_tokens_sigma"], rng))
+        self.output_tokens = max(1, min(tokens, max_tokens or tokens))
+        self.ttft = (
+            sample_lognormal(settings["ttft_ms"], settings["ttft_sigma"], rng)
+            + settings["prefill_ms_per_token"] * (self.prompt_tokens - cached_tokens)
+        ) / 1000
+        if settings["stall_rate"] and rng.random() < settings["stall_rate"]:
+            self.ttft += settings["stall_ms"] / 1000
+        self.tokens_per_sec = sample_lognormal(
+            settings["tokens_per_sec"], settings["tokens_per_sec_sigma"], rng
+        )
+        self.words = [rng.choice(WORDS) for _ in range(self.output_tokens)]
+
+    def chunks(self):
+        """Yield text chunks, sleeping to reproduce TTFT and decode speed."""
+        size = max(1, int(self.settings["chunk_tokens"]))
+        time.sleep(self.ttft)
+        for i in range(0, len(self.words), size):
+            if i:
+                time.sleep(size / self.tokens_per_sec)
+            yield " ".join(self.words[i:i + size]) + " "
+
+    def full_text(self):
+        """Sleep for the whole generation, then return the complete text."""
+        return "".join(self.chunks())
+
+    def text(self):
+        """The complete text without sleeping, for batch jobs (which report no per-request timing)."""
+        size = max(1, int(self.settings["chunk_tokens"]))
+        return "".join(" ".join(self.words[i:i + size]) + " " for i in range(0, len(self.words), size))
+
+
+def encode_event(headers, payload):
+    """Encode one AWS event-stream message (string headers only)."""
+    encoded_headers = b""
+    for name, value in headers.items():
+        name_bytes = name.encode("utf-8")
+        value_bytes = value.encode("utf-8")
+        encoded_headers += struct.pack("B", len(name_bytes)) + name_bytes
+        encoded_headers += struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+    total_length = 12 + len(encoded_headers) + len(payload) + 4
+    prelude = struct.pack("!II", total_length, len(encoded_headers))
+    message = prelude + struct.pack("!I", zlib.crc32(prelude)) + encoded_headers + payload
+    return message + struct.pack("!I", zlib.crc32(message))
+
+
+def bedrock_chunk_event(message):
+    """Wrap an Anthropic streaming message in a Bedrock `chunk` event."""
+    payload = json.dumps({"bytes": base64.b64encode(json.dumps(message).encode("utf-8")).decode("ascii")})
+    return encode_event(
+        {":event-type": "chunk", ":content-type": "application/json", ":message-type": "event"},
+        payload.encode("utf-8"),
+    )
+
+
+def azure_prompt(body):
+    """(prompt text, system prompt text) of a chat completions request body."""
+    messages = body.get("messages", [])
+    prompt_text = " ".join(str(m.get("content", "")) for m in messages)
+    system_text = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+    return prompt_text, system_text
+
+
+def azure_usage(sim, cached=0):
+    return {
+        "prompt_tokens": sim.prompt_tokens,
+        "completion_tokens": sim.output_tokens,
+        "total_tokens": sim.prompt_tokens + sim.output_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def azure_completion(completion_id, created, model, sim, text, cached=0):
+    """A non-streamed chat completion response body."""
+    return {
+        "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+        "choices": [{
+            "index": 0, "finish_reason": "stop",
+            "message": {"role": "assistant", "content": text},
+        }],
+        "usage": azure_usage(sim, cached),
+    }
+
+
+def gemini_prompt(body):
+    """(prompt text, system instruction text) of a generateContent request body."""
+    prompt_text = " ".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    system_text = " ".join(part.get("text", "") for part in (body.get("systemInstruction") or {}).get("parts", []))
+    return prompt_text, system_text
+
+
+def gemini_response(model, sim, text, final, cached=0):
+    """One generateContent response (or streamed chunk); the final one carries finishReason and the usage."""
+    chunk = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}],
+        "modelVersion": model,
+        "usageMetadata": {"promptTokenCount": sim.prompt_tokens},
+    }
+    if cached:
+        chunk["usageMetadata"]["cachedContentTokenCount"] = cached
+    if final:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+        chunk["usageMetadata"].update({
+            "candidatesTokenCount": sim.output_tokens,
+            "totalTokenCount": sim.prompt_tokens + sim.output_tokens,
+        })
+    return chunk
+
+
+def bedrock_prompt(body):
+    """(prompt text, system prompt blocks) of an Anthropic messages request body."""
+    prompt_text = " ".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for message in body.get("messages", [])
+        for block in (message.get("content") if isinstance(message.get("content"), list) else [message.get("content", "")])
+    )
+    system = body.get("system") or []
+    system_blocks = system if isinstance(system, list) else [{"type": "text", "text": system}]
+    return prompt_text, system_blocks
+
+
+def bedrock_message(message_id, model, text, usage):
+    """A non-streamed Anthropic messages response body."""
+    return {
+        "id": message_id, "type": "message", "role": "assistant", "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": usage,
+    }
+
+
+def iso_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def read_jsonl(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+def to_jsonl(items):
+    return "".join(json.dumps(item) + "\n" for item in items).encode("utf-8")
+
+
+def multipart_fields(content_type, data):
+    """{field name: (filename, value bytes)} of a multipart/form-data request body."""
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + data
+    )
+    return {
+        part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.iter_parts()
+    }
+
+
+def azure_batch_response(body, model, settings, rng):
+    prompt_text, _ = azure_prompt(body)
+    sim = SimulatedResponse(settings, prompt_text, body.get("max_tokens") or body.get("max_completion_tokens"), rng)
+    return azure_completion(f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), model, sim, sim.text())
+
+
+def gemini_batch_response(body, model, settings, rng):
+    prompt_text, system_text = gemini_prompt(body)
+    prompt_text = f"{system_text} {prompt_text}" if system_text else prompt_text
+    sim = SimulatedResponse(settings, prompt_text, (body.get("generationConfig") or {}).get("maxOutputTokens"), rng)
+    return gemini_response(model, sim, sim.text(), True)
+
+
+def bedrock_batch_response(body, model, settings, rng):
+    prompt_text, system_blocks = bedrock_prompt(body)
+    system_text = " ".join(block.get("text", "") for block in system_blocks)
+    prompt_text = f"{system_text} {prompt_text}" if system_text else prompt_text
+    sim = SimulatedResponse(settings, prompt_text, body.get("max_tokens"), rng)
+    usage = {"input_tokens": sim.prompt_tokens, "output_tokens": sim.output_tokens}
+    return bedrock_message(f"msg_{uuid.uuid4().hex}", model, sim.text(), usage)
+
+
+class SimulatedBatch:
+    """
+    One simulated batch job: queued for batch_queue_ms, then running for as long as its
+    requests take at batch_requests_per_sec. The state follows from the clock, and the
+    responses are generated the first time they are asked for once the job has completed.
+    """
+
+    def __init__(self, records, respond, model, settings, rng, **info):
+        self.records = records  # [(record id, request body)]
+        self.respond = respond  # The API's *_batch_response function
+        self.model = model
+        self.settings = settings
+        self.rng = rng
+        self.info = info  # The API's own fields, e.g. the input and output locations
+        self.created = time.time()
+        self.started = self.created + settings["batch_queue_ms"] / 1000
+        self.finished = self.started + len(records) / settings["batch_requests_per_sec"]
+        self.lock = threading.Lock()
+        self.outputs = None
+
+    def state(self):
+        """"queued", "running" or "completed"."""
+        now = time.time()
+        if now < self.started:
+            return "queued"
+        return "running" if now < self.finished else "completed"
+
+    def processed(self):
+        """Requests worked through so far."""
+        elapsed = max(0.0, min(time.time(), self.finished) - self.started)
+        return min(len(self.records), int(elapsed * self.settings["batch_requests_per_sec"]))
+
+    def results(self):
+        """[(record id, request body, response body or None, error message or None)]."""
+        with self.lock:
+            if self.outputs is None:
+                self.outputs = []
+                for record_id, body in self.records:
+                    if self.rng.random() < self.settings["batch_failure_rate"]:
+                        self.outputs.append((record_id, body, None, "Request failed (simulated)."))
+                    else:
+                        response = self.respond(body, self.model, self.settings, self.rng)
+                        self.outputs.append((record_id, body, response, None))
+            return self.outputs
+
+    def failed(self):
+        return sum(1 for _, _, _, error in self.results() if error)
+
+
+class SimulatedProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse behaves like the real APIs
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # --- response helpers ---
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_bytes(self, status, data, content_type="application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_chunked(self, content_type, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- routing ---
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        data = self.read_body()
+        path = self.path.split("?")[0]
+        if self.handle_batch_api("POST", path, data):
+            return
+        body = json.loads(data or b"{}")
+
+        if path.endswith("/cachedContents"):
+            self.create_cached_content(body)
+            return
+        if path.endswith("/chat/completions"):
+            api, handler = "azure", self.handle_azure
+        elif path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+            api, handler = "gcp", self.handle_gemini
+        elif path.startswith("/model/") and (path.endswith("/invoke") or path.endswith("/invoke-with-response-stream")):
+            api, handler = "aws", self.handle_bedrock
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {path}"}})
+            return
+
+        settings = self.server.settings_for(api)
+        if self.server.rng.random() < settings["throttle_rate"]:
+            self.send_throttle(api, settings)
+            return
+        handler(path, body, settings)
+
+    def do_GET(self):
+        if not self.handle_batch_api("GET", self.path.split("?")[0], b""):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_PUT(self):
+        data = self.read_body()
+        if not self.handle_batch_api("PUT", self.path.split("?")[0], data):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def handle_batch_api(self, method, path, data):
+        """Serve a batch or object storage request; returns False if `path` is not one."""
+        if method == "POST" and path.endswith("/openai/files"):
+            self.azure_upload_file(data)
+        elif method == "POST" and path.endswith("/openai/batches"):
+            self.azure_create_batch(json.loads(data))
+        elif method == "GET" and "/openai/batches/" in path:
+            self.azure_get_batch(path.rsplit("/", 1)[1])
+        elif method == "GET" and "/openai/files/" in path and path.endswith("/content"):
+            self.azure_file_content(path.split("/")[-2])
+        elif method == "POST" and path == "/model-invocation-job":
+            self.bedrock_create_job(json.loads(data))
+        elif method == "GET" and path.startswith("/model-invocation-job/"):
+            self.bedrock_get_job(unquote(path[len("/model-invocation-job/"):]).split("/")[-1])
+        elif method == "POST" and path.startswith("/upload/storage/v1/b/"):
+            self.gcs_upload(path.split("/")[5], data)
+        elif method == "GET" and path.startswith("/storage/v1/b/"):
+            _, _, _, _, bucket, _, name = path.split("/", 6)
+            self.send_object(f"gs://{bucket}/{unquote(name)}")
+        elif method == "POST" and path.endswith("/batchPredictionJobs"):
+            self.vertex_create_job(path[len("/v1/"):-len("/batchPredictionJobs")], json.loads(data))
+        elif method == "GET" and "/batchPredictionJobs/" in path:
+            self.vertex_get_job(path[len("/v1/"):])
+        elif method in ("PUT", "GET") and path.count("/") >= 2:
+            # Anything else is an S3 object, addressed path-style
+            _, bucket, key = path.split("/", 2)
+            if method == "PUT":
+                self.server.objects[f"s3://{bucket}/{unquote(key)}"] = data
+                self.send_bytes(200, b"", headers={"ETag": f'"{uuid.uuid4().hex}"'})
+            else:
+                self.send_object(f"s3://{bucket}/{unquote(key)}")
+        else:
+            return False
+        return True
+
+    def do_DELETE(self):
+        self.server.cached_contents.pop(self.path.split("?")[0].split("/")[-1], None)
+        self.send_json(200, {})
+
+    def send_throttle(self, api, settings):
+        headers = {"Retry-After": str(settings["retry_after"])}
+        if api == "azure":
+            self.send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded (simulated)."}}, headers)
+        elif api == "gcp":
+            self.send_json(429, {"error": {
+                "code": 429, "message": "Resource exhausted (simulated).", "status": "RESOURCE_EXHAUSTED"
+            }}, headers)
+        else:
+            headers["x-amzn-ErrorType"] = "ThrottlingException"
+            self.send_json(429, {"message": "Too many requests (simulated)."}, headers)
+
+    def new_response(self, settings, prompt_text, max_tokens, cached_tokens=0):
+        return SimulatedResponse(settings, prompt_text, max_tokens, self.server.new_rng(), cached_tokens)
+
+    def cache_prefix(self, api, settings, system_text):
+        """
+        Look a system prompt up in one API's simulated prompt cache, adding it if it is long
+        enough. Returns (cached tokens, tokens written to the cache).
+        """
+        tokens = count_tokens(system_text) if system_text else 0
+        if tokens < settings["cache_min_tokens"]:
+            return 0, 0
+        with self.server.rng_lock:
+            if (api, system_text) in self.server.prompt_cache:
+                return tokens, 0
+            self.server.prompt_cache.add((api, system_text))
+        return 0, tokens
+
+    # --- Azure OpenAI chat completions ---
+
+    def handle_azure(self, path, body, settings):
+        prompt_text, system_text = azure_prompt(body)
+        # Azure caches long prompt prefixes automatically
+        cached, _ = self.cache_prefix("azure", settings, system_text)
+        sim = self.new_response(
+            settings, prompt_text, body.get("max_tokens") or body.get("max_completion_tokens"), cached
+        )
+        model = body.get("model") or path.split("/")[-3]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            self.send_json(200, azure_completion(completion_id, created, model, sim, sim.full_text(), cached))
+            return
+
+        def sse(chunk):
+            self.write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+
+        def chunk_event(delta, finish_reason=None):
+            return {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        self.start_chunked("text/event-stream")
+        for text in sim.chunks():
+            sse(chunk_event({"content": text}))
+        sse(chunk_event({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            sse({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [], "usage": azure_usage(sim, cached),
+            })
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.end_chunked()
+
+    # --- Gemini generateContent ---
+
+    def handle_gemini(self, path, body, settings):
+        prompt_text, system_text = gemini_prompt(body)
+        cached = 0
+        if body.get("cachedContent"):
+            # A context cache holds the system instruction
+            system_text = self.server.cached_contents.get(body["cachedContent"].split("/")[-1], "")
+            cached = count_tokens(system_text)
+        prompt_text = f"{system_text} {prompt_text}" if system_text else prompt_text
+        generation_config = body.get("generationConfig") or {}
+        sim = self.new_response(settings, prompt_text, generation_config.get("maxOutputTokens"), cached)
+        model = path.split("/models/")[-1].split(":")[0]
+
+        if path.endswith(":generateContent"):
+            self.send_json(200, gemini_response(model, sim, sim.full_text(), True, cached))
+            return
+
+        self.start_chunked("text/event-stream")
+        def sse(text, final):
+            chunk = gemini_response(model, sim, text, final, cached)
+            self.write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\r\n\r\n")
+
+        pending = None
+        # Hold one chunk back so the last one can carry finishReason and the final usage
+        for text in sim.chunks():
+            if pending is not None:
+                sse(pending, False)
+            pending = text
+        sse(pending or "", True)
+        self.end_chunked()
+
+    # --- Gemini context caches ---
+
+    def create_cached_content(self, body):
+        text = " ".join(part.get("text", "") for part in (body.get("systemInstruction") or {}).get("parts", []))
+        cache_id = uuid.uuid4().hex
+        self.server.cached_contents[cache_id] = text
+        self.send_json(200, {
+            "name": f"cachedContents/{cache_id}",
+            "model": body.get("model"),
+            "usageMetadata": {"totalTokenCount": count_tokens(text)},
+        })
+
+    # --- Batch jobs and object storage ---
+
+    def new_batch(self, api, records, respond, model, **info):
+        return SimulatedBatch(records, respond, model, self.server.settings_for(api), self.server.new_rng(), **info)
+
+    def send_object(self, location):
+        data = self.server.objects.get(location)
+        if data is None:
+            self.send_json(404, {"error": {"code": 404, "message": f"No such object: {location}"}})
+            return
+        self.send_bytes(200, data)
+
+    def azure_upload_file(self, data):
+        fields = multipart_fields(self.headers.get("Content-Type", ""), data)
+        filename, content = fields["file"]
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.server.objects[file_id] = content
+        self.send_json(200, {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": fields["purpose"][1].decode("utf-8"), "status": "processed",
+        })
+
+    def azure_create_batch(self, body):
+        lines = read_jsonl(self.server.objects.get(body.get("input_file_id"), b""))
+        if not lines:
+            self.send_json(400, {"error": {"code": "invalid_request", "message": "Input file is empty or missing."}})
+            return
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self.server.batches[batch_id] = self.new_batch(
+            "azure", [(line["custom_id"], line["body"]) for line in lines], azure_batch_response,
+            lines[0]["body"].get("model", ""), input_file_id=body["input_file_id"], endpoint=body.get("endpoint"),
+            completion_window=body.get("completion_window", "24h"),
+        )
+        self.azure_get_batch(batch_id)
+
+    def azure_get_batch(self, batch_id):
+        batch = self.server.batches.get(batch_id)
+        if batch is None:
+            self.send_json(404, {"error": {"code": "not_found", "message": f"Batch {batch_id} not found."}})
+            return
+        state = batch.state()
+        info = batch.info
+        if state == "completed" and "output_file_id" not in info:
+            outputs, errors = [], []
+            for record_id, _, response, error in batch.results():
+                line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": record_id, "error": None}
+                if error:
+                    line["response"] = {
+                        "status_code": 500, "body": {"error": {"code": "server_error", "message": error}}
+                    }
+                    errors.append(line)
+                else:
+                    line["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": response}
+                    outputs.append(line)
+            info["output_file_id"] = info["error_file_id"] = None
+            if outputs:
+                info["output_file_id"] = f"file-{uuid.uuid4().hex}"
+                self.server.objects[info["output_file_id"]] = to_jsonl(outputs)
+            if errors:
+                info["error_file_id"] = f"file-{uuid.uuid4().hex}"
+                self.server.objects[info["error_file_id"]] = to_jsonl(errors)
+        failed = batch.failed() if state == "completed" else 0
+        self.send_json(200, {
+            "id": batch_id, "object": "batch", "endpoint": info["endpoint"], "errors": None,
+            "input_file_id": info["input_file_id"], "completion_window": info["completion_window"],
+            "status": AZURE_BATCH_STATUS[state], "output_file_id": info.get("output_file_id"),
+            "error_file_id": info.get("error_file_id"), "created_at": int(batch.created),
+            "in_progress_at": int(batch.started) if state != "queued" else None,
+            "completed_at": int(batch.finished) if state == "completed" else None,
+            "request_counts": {"total": len(batch.records), "completed": batch.processed() - failed, "failed": failed},
+        })
+
+    def azure_file_content(self, file_id):
+        self.send_object(file_id)
+
+    def bedrock_create_job(self, body):
+        input_uri = body["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        lines = read_jsonl(self.server.objects.get(input_uri, b""))
+        if not lines:
+            self.send_json(400, {"message": f"No records found in {input_uri}."},
+                           {"x-amzn-ErrorType": "ValidationException"})
+            return
+        job_id = uuid.uuid4().hex[:12]
+        self.server.batches[job_id] = self.new_batch(
+            "aws", [(line.get("recordId") or f"{n:011d}", line["modelInput"]) for n, line in enumerate(lines)],
+            bedrock_batch_response, body["modelId"],
+            job_arn=f"arn:aws:bedrock:us-east-1:000000000000:model-invocation-job/{job_id}", request=body,
+        )
+        self.send_json(200, {"jobArn": self.server.batches[job_id].info["job_arn"]})
+
+    def bedrock_get_job(self, job_id):
+        batch = self.server.batches.get(job_id)
+        if batch is None:
+            self.send_json(404, {"message": f"Job {job_id} not found."},
+                           {"x-amzn-ErrorType": "ResourceNotFoundException"})
+            return
+        state = batch.state()
+        request = batch.info["request"]
+        input_uri = request["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        output_uri = request["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+        status = BEDROCK_JOB_STATUS[state]
+        if state == "completed":
+            # Written to <output prefix>/<job id>/<input file name>.out, as Bedrock does
+            location = f"{output_uri.rstrip('/')}/{job_id}/{input_uri.rsplit('/', 1)[-1]}.out"
+            if location not in self.server.objects:
+                lines = []
+                for record_id, body, response, error in batch.results():
+                    line = {"recordId": record_id, "modelInput": body}
+                    if error:
+                        line["error"] = {"errorCode": 500, "errorMessage": error}
+                    else:
+                        line["modelOutput"] = response
+                    lines.append(line)
+                self.server.objects[location] = to_jsonl(lines)
+            if batch.failed():
+                status = "PartiallyCompleted"
+        job = {
+            "jobArn": batch.info["job_arn"], "jobName": request.get("jobName"), "modelId": batch.model,
+            "roleArn": request.get("roleArn"), "status": status, "submitTime": iso_time(batch.created),
+            "lastModifiedTime": iso_time(min(time.time(), batch.finished)),
+            "inputDataConfig": request["inputDataConfig"], "outputDataConfig": request["outputDataConfig"],
+        }
+        if state == "completed":
+            job["endTime"] = iso_time(batch.finished)
+        self.send_json(200, job)
+
+    def gcs_upload(self, bucket, data):
+        name = parse_qs(urlsplit(self.path).query)["name"][0]
+        self.server.objects[f"gs://{bucket}/{name}"] = data
+        self.send_json(200, {"kind": "storage#object", "bucket": bucket, "name": name, "size": str(len(data))})
+
+    def vertex_create_job(self, parent, body):
+        input_uri = body["inputConfig"]["gcsSource"]["uris"][0]
+        lines = read_jsonl(self.server.objects.get(input_uri, b""))
+        if not lines:
+            self.send_json(400, {"error": {
+                "code": 400, "message": f"No instances found in {input_uri}.", "status": "INVALID_ARGUMENT"
+            }})
+            return
+        name = f"{parent}/batchPredictionJobs/{random.randrange(10 ** 18)}"
+        self.server.batches[name] = self.new_batch(
+            "gcp", [(str(n), line["request"]) for n, line in enumerate(lines)], gemini_batch_response,
+            body["model"].rsplit("/", 1)[-1], request=body,
+        )
+        self.vertex_get_job(name)
+
+    def vertex_get_job(self, name):
+        batch = self.server.batches.get(name)
+        if batch is None:
+            self.send_json(404, {"error": {"code": 404, "message": f"{name} not found.", "status": "NOT_FOUND"}})
+            return
+        state = batch.state()
+        request = batch.info["request"]
+        job = {
+            "name": name, "displayName": request.get("displayName"), "model": request["model"],
+            "inputConfig": request["inputConfig"], "outputConfig": request["outputConfig"],
+            "state": VERTEX_JOB_STATE[state], "createTime": iso_time(batch.created),
+            "updateTime": iso_time(min(time.time(), batch.finished)),
+        }
+        if state != "queued":
+            job["startTime"] = iso_time(batch.started)
+        if state == "completed":
+            prefix = request["outputConfig"]["gcsDestination"]["outputUriPrefix"].rstrip("/")
+            directory = f"{prefix}/prediction-model-{iso_time(batch.finished)}"
+            if f"{directory}/predictions.jsonl" not in self.server.objects:
+                lines = []
+                for _, body, response, error in batch.results():
+                    line = {"status": error or "", "processed_time": iso_time(batch.finished), "request": body}
+                    if response is not None:
+                        line["response"] = response
+                    lines.append(line)
+                self.server.objects[f"{directory}/predictions.jsonl"] = to_jsonl(lines)
+            failed = batch.failed()
+            job["endTime"] = iso_time(batch.finished)
+            job["outputInfo"] = {"gcsOutputDirectory": directory}
+            job["completionStats"] = {"successfulCount": str(len(batch.records) - failed), "failedCount": str(failed)}
+        self.send_json(200, job)
+
+    # --- Bedrock Anthropic messages ---
+
+    def handle_bedrock(self, path, body, settings):
+        prompt_text, system_blocks = bedrock_prompt(body)
+        system_text = " ".join(block.get("text", "") for block in system_blocks)
+        cached = written = 0
+        if any(block.get("cache_control") for block in system_blocks):
+            cached, written = self.cache_prefix("aws", settings, system_text)
+        prompt_text = f"{system_text} {prompt_text}" if system_text else prompt_text
+        sim = self.new_response(settings, prompt_text, body.get("max_tokens"), cached)
+        # Anthropic's input_tokens leaves out the tokens read from or written to the cache
+        usage = {
+            "input_tokens": sim.prompt_tokens - cached - written,
+            "cache_read_input_tokens": cached,
+            "cache_creation_input_tokens": written,
+        }
+        model = path.split("/")[2]
+        message_id = f"msg_{uuid.uuid4().hex}"
+        headers = {
+            "x-amzn-bedrock-input-token-count": str(sim.prompt_tokens),
+            "x-amzn-bedrock-output-token-count": str(sim.output_tokens),
+        }
+
+        if path.endswith("/invoke"):
+            started = time.perf_counter()
+            text = sim.full_text()
+            headers["x-amzn-bedrock-invocation-latency"] = str(int((time.perf_counter() - started) * 1000))
+            usage["output_tokens"] = sim.output_tokens
+            self.send_json(200, bedrock_message(message_id, model, text, usage), headers)
+            return
+
+        headers["x-amzn-bedrock-content-type"] = "application/json"
+        self.start_chunked("application/vnd.amazon.eventstream", headers)
+        started = time.perf_counter()
+        first_byte = None
+        self.write_chunk(bedrock_chunk_event({
+            "type": "message_start",
+            "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": dict(usage, output_tokens=1),
+            },
+        }))
+        self.write_chunk(bedrock_chunk_event({
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+        }))
+        for text in sim.chunks():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            self.write_chunk(bedrock_chunk_event({
+                "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text},
+            }))
+        self.write_chunk(bedrock_chunk_event({"type": "content_block_stop", "index": 0}))
+        self.write_chunk(bedrock_chunk_event({
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": sim.output_tokens},
+        }))
+        self.write_chunk(bedrock_chunk_event({
+            "type": "message_stop",
+            "amazon-bedrock-invocationMetrics": {
+                "inputTokenCount": sim.prompt_tokens,
+                "outputTokenCount": sim.output_tokens,
+                "invocationLatency": int((time.perf_counter() - started) * 1000),
+                "firstByteLatency": int((first_byte or 0) * 1000),
+            },
+        }))
+        self.end_chunked()
+
+
+class SimulatedProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings=None, profile=None, seed=None, verbose=False):
+        super().__init__(address, SimulatedProviderHandler)
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.profile = profile or {}
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.prompt_cache = set()  # (API, system prompt) cached by Azure/Bedrock requests
+        self.cached_contents = {}  # Gemini context cache id -> system instruction text
+        self.objects = {}  # Uploaded and batch output files: Azure file id, "s3://..." or "gs://..." -> bytes
+        self.batches = {}  # Batch job id (Azure), job id (Bedrock) or job name (Vertex) -> SimulatedBatch
+
+    def handle_error(self, request, client_address):
+        # Clients that give up on a request (deadlines, losing hedges) close the connection mid-response
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def settings_for(self, api):
+        """Return the settings for one API: defaults, then command-line settings, then the profile section."""
+        return dict(self.settings, **self.profile.get(api, {}))
+
+    def new_rng(self):
+        """Per-request RNG seeded from the server RNG, so handler threads never share one."""
+        with self.rng_lock:
+            return random.Random(self.rng.random())
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(host="127.0.0.1", port=0, settings=None, profile=None, seed=None):
+    """Start a simulated provider server on a background thread and return it (see `.url`)."""
+    server = SimulatedProviderServer((host, port), settings, profile, seed)
+    thread = threading.Thread(target=server.serve_forever, name="simulated-provider", daemon=True)
+    thread.start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Azure, Gemini and Bedrock APIs.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8700, help="Port to listen on.")
+    for name, default in DEFAULT_SETTINGS.items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            type=type(default),
+            default=default,
+            help=f"Default: {default}."
+        )
+    parser.add_argument("--profile", type=str, default=None, help="JSON file with per-API setting overrides.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible timings.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = {name: getattr(args, name) for name in DEFAULT_SETTINGS}
+    profile = None
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+        unknown = set(profile) - set(API_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown profile sections: {', '.join(sorted(unknown))} (expected {API_NAMES})")
+    server = SimulatedProviderServer((args.host, args.port), settings, profile, args.seed, args.verbose)
+    print(f"Simulated provider listening on {server.url} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
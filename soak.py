@@ -0,0 +1,355 @@
+# soak.py
+# Long-running soak / monitoring mode: sample each provider on a fixed schedule for hours
+# or days to catch time-of-day degradation. Requests go through the same path as the
+# benchmark scripts (send_workload_request: rate limiter, retries, deadlines, tracing).
+#
+# Memory stays constant however long it runs. Nothing is kept per request: each result is
+# appended to the results store and folded into rolling windows (by default the last 5
+# minutes, hour and day). A window is a ring of sub-window slots, each holding counters and
+# a LatencySketch per metric, and expired slots are dropped. Every --snapshot-every the
+# windows' summaries are printed and saved to the store's snapshots table, and each
+# provider's whole-run sketches are saved so latency_sketch.py can merge them.
+#
+#   python soak.py --interval 60 --windows 5m 1h 24h --duration 72h
+#   python soak.py --simulate --interval 1 --windows 10s 1m --snapshot-every 10s --duration 2m
+
+import time
+import argparse
+import asyncio
+import datetime
+import collections
+
+import simulated_provider
+from workload import load_requests
+from latency_sketch import LatencySketch
+from results_store import ResultsStore, add_store_arguments
+from hedging import add_hedge_arguments, apply_hedge_args
+from metrics_server import add_metrics_arguments, metrics_from_args
+from timeline_trace import add_trace_arguments, set_run, stop_trace, trace_from_args
+from rate_limiter import add_retry_arguments, apply_retry_args, limiter_from_config
+from run_all_benchmarks import provider_keys
+from benchmark_common import (
+    DEFAULT_QUESTION, SKETCH_METRICS, needs_client, print_cold_start, send_workload_request, start_client
+)
+
+DEFAULT_INTERVAL = 60.0  # Seconds between requests to each provider
+DEFAULT_WINDOWS = ["5m", "1h", "24h"]
+DEFAULT_SNAPSHOT_EVERY = 300.0
+
+# Sub-windows per rolling window: a window covers its length to within one slot
+WINDOW_SLOTS = 12
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def duration(value):
+    """argparse type for durations: "90", "90s", "5m", "1h" or "2d" -> seconds."""
+    unit = value[-1:].lower()
+    try:
+        if unit in DURATION_UNITS:
+            seconds = float(value[:-1]) * DURATION_UNITS[unit]
+        else:
+            seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a duration such as 90s, 5m, 1h or 2d, not {value!r}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("durations must be positive")
+    return seconds
+
+
+class WindowSlot:
+    """Counters and one LatencySketch per SKETCH_METRICS field for one slice of a window."""
+
+    def __init__(self):
+        self.runs = 0
+        self.failed = 0
+        self.throttled = 0
+        self.cost = 0.0
+        self.sketches = {field: LatencySketch() for field in SKETCH_METRICS}
+
+    def add(self, result):
+        if result.get("error"):
+            self.failed += 1
+            self.throttled += bool(result.get("throttled"))
+            return
+        self.runs += 1
+        self.cost += result["cost"]
+        for field, sketch in self.sketches.items():
+            sketch.add(result.get(field))
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.failed += other.failed
+        self.throttled += other.throttled
+        self.cost += other.cost
+        for field, sketch in self.sketches.items():
+            sketch.merge(other.sketches[field])
+        return self
+
+
+class RollingWindow:
+    """
+    The results of the last `length` seconds, kept as at most `slots` WindowSlots of
+    length / slots seconds each. Adding a result or summarizing drops the slots that have
+    slid out of the window, so memory is bounded by the slot count, not the request count.
+    """
+
+    def __init__(self, label, length, slots=WINDOW_SLOTS):
+        self.label = label
+        self.length = length
+        self.slot_count = slots
+        self.slot_length = length / slots
+        self.slots = collections.deque()  # (slot number, WindowSlot), oldest first
+
+    def expire(self, now):
+        oldest = int(now // self.slot_length) - self.slot_count + 1
+        while self.slots and self.slots[0][0] < oldest:
+            self.slots.popleft()
+
+    def add(self, result, now):
+        number = int(now // self.slot_length)
+        if not self.slots or self.slots[-1][0] != number:
+            self.slots.append((number, WindowSlot()))
+        self.expire(now)
+        self.slots[-1][1].add(result)
+
+    def summary(self, now):
+        """Return the window's runs, failures, throttles, cost and each metric's distribution stats."""
+        self.expire(now)
+        merged = WindowSlot()
+        for _, slot in self.slots:
+            merged.merge(slot)
+        return {
+            "window_seconds": self.length,
+            "runs": merged.runs,
+            "failed": merged.failed,
+            "throttled": merged.throttled,
+            "error_rate": merged.failed / (merged.runs + merged.failed) if merged.runs + merged.failed else None,
+            "cost": merged.cost,
+            "stats": {field: sketch.stats() for field, sketch in merged.sketches.items()},
+        }
+
+
+class SoakMonitor:
+    """One provider's rolling windows plus whole-run sketches, fed one result at a time."""
+
+    def __init__(self, name, windows, stored_sketches=None):
+        self.name = name
+        self.windows = [RollingWindow(label, length) for label, length in windows]
+        self.totals = WindowSlot()
+        # On --resume, carry on from the run's saved sketches ({metric: sketch dict})
+        # instead of overwriting them with this session's results alone
+        for field, data in (stored_sketches or {}).items():
+            if field in self.totals.sketches:
+                self.totals.sketches[field] = LatencySketch.from_dict(data)
+
+    def add(self, result, now):
+        for window in self.windows:
+            window.add(result, now)
+        self.totals.add(result)
+
+
+def parse_window(value):
+    """argparse type for --windows: "5m" -> ("5m", 300.0)."""
+    return value, duration(value)
+
+
+def print_snapshot(monitor, summaries):
+    """Print one line per window: runs, failures and response time / TTFT percentiles."""
+    print(f"{monitor.name} at {datetime.datetime.now().isoformat(timespec='seconds')}:")
+    for label, summary in summaries.items():
+        latency = summary["stats"]["response_time"]
+        ttft = summary["stats"]["ttft"]
+        line = f"  last {label}: {summary['runs']} runs, {summary['failed']} failed ({summary['throttled']} throttled)"
+        if latency["P50"] is not None:
+            line += f", response time p50/p95/p99 {latency['P50']:.2f} / {latency['P95']:.2f} / {latency['P99']:.2f} s"
+        if ttft["P50"] is not None:
+            line += f", TTFT p50/p95 {ttft['P50']:.3f} / {ttft['P95']:.3f} s"
+        print(line)
+
+
+def take_snapshot(monitors, store, run_id):
+    """Save (and print) every provider's window summaries and whole-run sketches."""
+    now = time.monotonic()
+    taken_at = datetime.datetime.now().isoformat()
+    for monitor in monitors:
+        summaries = {window.label: window.summary(now) for window in monitor.windows}
+        for label, summary in summaries.items():
+            store.save_snapshot(run_id, monitor.name, taken_at, label, summary)
+        for field, sketch in monitor.totals.sketches.items():
+            store.save_sketch(run_id, monitor.name, field, sketch.to_dict())
+        print_snapshot(monitor, summaries)
+
+
+async def soak_provider(provider, config, monitor, requests, store, run_id, interval, stop_at):
+    """
+    Send one request every `interval` seconds until `stop_at` (a time.monotonic() deadline,
+    or None to run until interrupted). A request that overruns the interval delays the
+    next one instead of queueing extra requests behind it.
+    """
+    name = monitor.name
+    client = None
+    if needs_client(config):
+        client, cold_start = await start_client(provider, config)
+        store.save_cold_start(run_id, name, cold_start)
+        print_cold_start(name, cold_start)
+    index = store.next_run_index(run_id, name)
+    next_send = time.monotonic()
+    try:
+        for request in requests:
+            set_run(name, index)
+            result = await send_workload_request(provider, client, config, request)
+            monitor.add(result, time.monotonic())
+            store.append(run_id, name, index, result)
+            status = f"error: {result['error']}" if result["error"] else f"{result['response_time']:.2f} s"
+            print(f"{name} run {index + 1}: {status}")
+            index += 1
+
+            next_send = max(next_send + interval, time.monotonic())
+            if stop_at is not None and next_send >= stop_at:
+                break
+            await asyncio.sleep(next_send - time.monotonic())
+    finally:
+        if client is not None:
+            await provider.close_client(client)
+
+
+async def snapshot_loop(monitors, store, run_id, every):
+    while True:
+        await asyncio.sleep(every)
+        take_snapshot(monitors, store, run_id)
+
+
+async def run_soak(providers, endpoint_url, store, run_id, args):
+    """
+    Soak every provider ({key: provider module}) concurrently until --duration runs out
+    (or Ctrl-C), snapshotting every --snapshot-every and once more at the end.
+    """
+    stop_at = time.monotonic() + args.duration if args.duration else None
+    monitors = []
+    soaks = []
+    stored = store.load_sketches(run_id)
+    for provider in providers.values():
+        config = provider.load_config(endpoint_url)
+        config["stream"] = args.stream
+        config["response_cache"] = None
+        apply_retry_args(config, args)
+        apply_hedge_args(config, args)
+        config["rate_limiter"] = limiter_from_config(config)
+        name = provider.PROVIDER_NAME
+        sketches = {metric: data for (provider_name, metric), data in stored.items() if provider_name == name}
+        monitor = SoakMonitor(name, args.windows, sketches)
+        monitors.append(monitor)
+        # Each provider reads its own endless pass over the workload
+        requests = load_requests(args.workload, args.question, None)
+        soaks.append(soak_provider(provider, config, monitor, requests, store, run_id, args.interval, stop_at))
+
+    snapshots = asyncio.ensure_future(snapshot_loop(monitors, store, run_id, args.snapshot_every))
+    try:
+        results = await asyncio.gather(*soaks, return_exceptions=True)
+        for monitor, result in zip(monitors, results):
+            if isinstance(result, Exception):
+                print(f"Error soaking {monitor.name}: {result}")
+    finally:
+        snapshots.cancel()
+        take_snapshot(monitors, store, run_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sample providers on a schedule for hours or days, tracking rolling-window latency."
+    )
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        choices=sorted(provider_keys),
+        default=list(provider_keys),
+        help="Providers to soak (default: all)."
+    )
+    parser.add_argument(
+        "--interval",
+        type=duration,
+        default=DEFAULT_INTERVAL,
+        help="Time between requests to each provider, e.g. 30s or 5m."
+    )
+    parser.add_argument(
+        "--windows",
+        nargs="+",
+        type=parse_window,
+        default=[parse_window(window) for window in DEFAULT_WINDOWS],
+        help="Rolling windows to track, e.g. 5m 1h 24h."
+    )
+    parser.add_argument(
+        "--snapshot-every",
+        type=duration,
+        default=DEFAULT_SNAPSHOT_EVERY,
+        help="How often to print the windows and save them to the results store."
+    )
+    parser.add_argument(
+        "--duration",
+        type=duration,
+        default=None,
+        help="Stop after this long, e.g. 8h or 3d (default: run until interrupted)."
+    )
+    parser.add_argument(
+        "--question",
+        type=str,
+        default=DEFAULT_QUESTION,
+        help="The question to send to every provider."
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        default=None,
+        help="A JSONL workload file to cycle through instead of repeating --question."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Use each provider's streaming API and track TTFT and output tokens/sec."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        default=None,
+        help="Send every provider's requests to this endpoint, e.g. a running simulated_provider.py."
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Start an in-process simulated provider and soak it (offline, no cost)."
+    )
+    add_store_arguments(parser)
+    add_retry_arguments(parser)
+    add_hedge_arguments(parser)
+    add_metrics_arguments(parser, quiet=False)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+
+    providers = {key: provider_keys[key] for key in args.providers}
+    endpoint_url = args.endpoint_url
+    server = None
+    if args.simulate:
+        server = simulated_provider.start_server()
+        endpoint_url = server.url
+        print(f"Using simulated providers at {endpoint_url}")
+
+    metrics_from_args(args)
+    trace_from_args(args)
+    store = ResultsStore(args.results_db)
+    try:
+        run_id = store.start_run(args.run_id, args.resume)
+        print(f"Appending results and snapshots to {args.results_db} as run {run_id}")
+        try:
+            asyncio.run(run_soak(providers, endpoint_url, store, run_id, args))
+        except KeyboardInterrupt:
+            print(f"\nStopped. Runs and snapshots are saved; continue with --resume --run-id {run_id}")
+    finally:
+        stop_trace()
+        if server:
+            server.shutdown()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
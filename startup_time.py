@@ -0,0 +1,173 @@
+# startup_time.py
+# Startup-time benchmark for the suite's entry points. Each `benchmark.py COMMAND --help`
+# is started as a fresh interpreter several times and timed, and once more under
+# `python -X importtime` to break the time down by imported module and to catch a
+# provider SDK (or numpy) being imported before it is needed. Results go to
+# startup_time.csv; with --baseline (an earlier startup_time.csv) any command that got
+# slower by more than --max-regression fails the run, so import regressions are caught:
+#
+#   python startup_time.py
+#   python startup_time.py --baseline startup_baseline.csv --max-regression 25
+
+import os
+import csv
+import sys
+import time
+import argparse
+import subprocess
+from statistics import median
+
+from benchmark import COMMANDS
+
+startup_csv = "startup_time.csv"
+
+DEFAULT_REPEATS = 5
+DEFAULT_MAX_REGRESSION = 25.0  # Percent slower than the baseline that fails the run
+
+# Changes smaller than this are process startup noise, whatever the percentage
+MIN_REGRESSION_MS = 20.0
+
+# Heavy packages that only a provider's client (or latency_model.py's fit) should import
+HEAVY_MODULES = ["openai", "google.genai", "google.auth", "boto3", "botocore", "numpy"]
+
+# The row for a bare interpreter, the floor under every command
+INTERPRETER = "(interpreter)"
+
+HEADER = ["Command", "Wall Time (ms)", "Import Time (ms)", "Modules Imported", "Heavy Imports", "Slowest Imports"]
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark.py")
+
+
+def command_line(command):
+    if command == INTERPRETER:
+        return [sys.executable, "-c", "pass"]
+    return [sys.executable, BENCHMARK, command, "--help"]
+
+
+def parse_importtime(stderr):
+    """Return (module, self µs, cumulative µs, depth) for each line of -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def heavy_imports(imports):
+    """The HEAVY_MODULES that were imported."""
+    names = {name for name, _, _, _ in imports}
+    return [module for module in HEAVY_MODULES if module in names]
+
+
+def measure(command, repeats):
+    """Median wall time of `repeats` fresh starts of a command, plus one -X importtime breakdown."""
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run(command_line(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start_time) * 1000)
+    args = command_line(command)
+    traced = subprocess.run(args[:1] + ["-X", "importtime"] + args[1:], capture_output=True, text=True, check=True)
+    imports = parse_importtime(traced.stderr)
+    top_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+    return {
+        "command": command,
+        "wall_ms": median(times),
+        "import_ms": sum(self_us for _, self_us, _, _ in imports) / 1000,
+        "modules": len(imports),
+        "heavy": heavy_imports(imports),
+        "slowest": [(name, cumulative_us / 1000) for name, _, cumulative_us, _ in top_level[:3]],
+    }
+
+
+def write_startup_csv(rows):
+    with open(startup_csv, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow([
+                row["command"],
+                f"{row['wall_ms']:.1f}",
+                f"{row['import_ms']:.1f}",
+                row["modules"],
+                " ".join(row["heavy"]),
+                "; ".join(f"{name} {ms:.1f} ms" for name, ms in row["slowest"]),
+            ])
+    print(f"\nStartup times written to {startup_csv}")
+
+
+def load_baseline(path):
+    """Return {command: wall time in ms} from an earlier startup_time.csv."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["Command"]: float(row["Wall Time (ms)"]) for row in csv.DictReader(f)}
+
+
+def regressions(rows, baseline, max_regression):
+    """Return (command, baseline ms, ms, change) for each command slower than the baseline allows."""
+    failed = []
+    for row in rows:
+        before = baseline.get(row["command"])
+        # The bare interpreter is the machine's floor, not something this code can regress
+        if row["command"] == INTERPRETER or before is None or before <= 0:
+            continue
+        change = row["wall_ms"] / before - 1
+        if change * 100 > max_regression and row["wall_ms"] - before > MIN_REGRESSION_MS:
+            failed.append((row["command"], before, row["wall_ms"], change))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the startup and import time of each benchmark.py command.")
+    parser.add_argument(
+        "--commands",
+        nargs="+",
+        choices=sorted(COMMANDS),
+        default=list(COMMANDS),
+        help="Commands to time (default: all)."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=DEFAULT_REPEATS,
+        help="Fresh starts per command; the median is reported."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="An earlier startup_time.csv to compare against."
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=DEFAULT_MAX_REGRESSION,
+        help="With --baseline, percent slower than the baseline that fails the run."
+    )
+    args = parser.parse_args(argv)
+    # Read before startup_time.csv is rewritten, which may be the baseline itself
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    rows = []
+    for command in [INTERPRETER] + args.commands:
+        row = measure(command, args.repeats)
+        rows.append(row)
+        heavy = f", imports {', '.join(row['heavy'])}" if row["heavy"] else ""
+        print(f"{command}: {row['wall_ms']:.1f} ms ({row['import_ms']:.1f} ms importing "
+              f"{row['modules']} modules{heavy})")
+    write_startup_csv(rows)
+
+    if baseline is not None:
+        failed = regressions(rows, baseline, args.max_regression)
+        for command, before, after, change in failed:
+            print(f"REGRESSION: {command} starts in {after:.1f} ms, {change:+.0%} against {before:.1f} ms")
+        if failed:
+            return 1
+        print(f"No startup regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
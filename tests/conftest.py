@@ -0,0 +1,28 @@
+# The benchmark scripts are flat modules at the repository root; make them importable
+# however pytest is started.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import simulated_provider
+
+# Simulated provider timings fast enough for tests: a few milliseconds per request and batch
+FAST_SETTINGS = {
+    "ttft_ms": 5.0, "ttft_sigma": 0.0, "tokens_per_sec": 5000.0, "tokens_per_sec_sigma": 0.0, "output_tokens": 20,
+    "output_tokens_sigma": 0.0, "batch_queue_ms": 50.0, "batch_requests_per_sec": 1000.0,
+}
+
+
+@pytest.fixture
+def simulator():
+    """A fast in-process simulated provider; yields its URL."""
+    server = simulated_provider.start_server(settings=FAST_SETTINGS, seed=1)
+    try:
+        yield server.url
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,15 @@
+import pytest
+
+from adaptive_sampling import t_critical
+
+
+@pytest.mark.parametrize("df, confidence, table_value", [
+    (1, 0.95, 12.706),
+    (2, 0.95, 4.303),
+    (3, 0.95, 3.182),
+    (10, 0.95, 2.228),
+    (5, 0.99, 4.032),
+])
+def test_t_critical_matches_table(df, confidence, table_value):
+    # Exact for df 1 and 2, otherwise within 1% of the table (from df 5 at 99% confidence)
+    assert t_critical(df, confidence) == pytest.approx(table_value, rel=0.01)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import simulated_provider
+import azure_openai_demo
+import batch_inference
+from conftest import FAST_SETTINGS
+from workload import make_request
+from run_all_benchmarks import provider_keys
+
+REQUESTS = [make_request(f"question {i}", tags=["batch"]) for i in range(4)]
+
+
+def test_batch_pricing_scales_every_price():
+    config = azure_openai_demo.load_config("http://127.0.0.1:8700")
+    priced = batch_inference.batch_pricing(config)
+    for field in batch_inference.PRICE_FIELDS:
+        if field in config:
+            assert priced[field] == pytest.approx(config[field] * config["batch_price_factor"])
+
+
+@pytest.mark.parametrize("key", sorted(provider_keys))
+def test_batch_lifecycle_against_the_simulator(key, simulator):
+    provider = provider_keys[key]
+    summary = asyncio.run(batch_inference.run_batch(provider, REQUESTS, simulator, poll_interval=0.02, timeout=30))
+    assert summary["error"] is None
+    assert provider.BATCH_STATES[summary["state"]] == "completed"
+    assert (summary["succeeded"], summary["failed"]) == (4, 0)
+    assert [r["record"] for r in summary["results"]] == [batch_inference.record_id(i) for i in range(4)]
+    assert all(r["tags"] == ["batch"] and r["completion_tokens"] > 0 for r in summary["results"])
+    # Batch prices are the provider's batch_price_factor of the realtime price
+    factor = provider.load_config(simulator)["batch_price_factor"]
+    assert summary["cost"] == pytest.approx(summary["realtime_price"] * factor)
+    assert summary["queued_time"] >= 0 and summary["wall_time"] > 0
+
+
+def test_failed_records_are_reported_per_request():
+    server = simulated_provider.start_server(settings=dict(FAST_SETTINGS, batch_failure_rate=1.0), seed=1)
+    try:
+        summary = asyncio.run(batch_inference.run_batch(
+            provider_keys["azure"], REQUESTS, server.url, poll_interval=0.02, timeout=30
+        ))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert summary["error"] is None
+    assert summary["failed"] == 4
+    assert all(r["error"] for r in summary["results"])
+
+
+def test_missing_endpoint_is_reported_not_raised(monkeypatch):
+    monkeypatch.delenv("AZURE_OPENAI_ENDPOINT", raising=False)
+    monkeypatch.delenv("AZURE_OPENAI_DEPLOYMENT", raising=False)
+    summary = asyncio.run(batch_inference.run_batch(provider_keys["azure"], REQUESTS, None, poll_interval=0.02))
+    assert summary["error"]
+    assert summary["results"] == []
+
+
+def test_main_writes_the_summaries(simulator, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    batch_inference.main(["--endpoint-url", simulator, "--providers", "aws", "--runs", "2", "--poll-interval", "0.02"])
+    summary = (tmp_path / batch_inference.batch_csv).read_text(encoding="utf-8").splitlines()
+    assert summary[0].startswith("Provider,Batch Job,Status")
+    assert summary[1].startswith("AWS Bedrock Claude,")
+    requests = (tmp_path / batch_inference.batch_requests_csv).read_text(encoding="utf-8").splitlines()
+    assert len(requests) == 3
@@ -0,0 +1,24 @@
+import pytest
+
+from compare_runs import mann_whitney
+
+
+def test_mann_whitney_with_ties():
+    # Ranks: 1 -> 1, the three 2s -> 3, the two 3s -> 5.5, 4 -> 7, 5 -> 8. The baseline rank
+    # sum is 12.5, so U = 2.5 against a mean of 8. The tie term is (27 - 3) + (8 - 2) = 30,
+    # so sigma^2 = 4 * 4 / 12 * (9 - 30 / 56) and z = (5.5 - 0.5) / sigma = 1.4884.
+    assert mann_whitney([1, 2, 2, 3], [2, 3, 4, 5]) == pytest.approx(0.13666, abs=1e-5)
+
+
+def test_mann_whitney_is_symmetric():
+    baseline = [1.1, 1.3, 1.3, 1.6, 2.0, 2.2]
+    candidate = [1.3, 1.9, 2.4, 2.4, 2.8, 3.1]
+    assert mann_whitney(baseline, candidate) == pytest.approx(mann_whitney(candidate, baseline))
+
+
+def test_mann_whitney_all_tied():
+    assert mann_whitney([2.0] * 5, [2.0] * 5) == 1.0
+
+
+def test_mann_whitney_separated_samples():
+    assert mann_whitney(list(range(10)), list(range(20, 30))) < 0.001
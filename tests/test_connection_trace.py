@@ -0,0 +1,140 @@
+import socket
+import asyncio
+
+import pytest
+
+import connection_trace
+import azure_openai_demo
+from connection_trace import PHASES, RequestTrace, current_trace
+
+
+def trace_of(events):
+    trace = RequestTrace()
+    trace.events = dict(events)
+    return trace
+
+
+def test_phases_on_a_new_httpcore_connection():
+    trace = trace_of({
+        "connection.connect_tcp.started": 0.0,
+        "dns.started": 0.0,
+        "dns.complete": 0.010,
+        "connection.connect_tcp.complete": 0.030,
+        "connection.start_tls.started": 0.030,
+        "connection.start_tls.complete": 0.080,
+        "http11.send_request_headers.started": 0.080,
+        "http11.send_request_body.complete": 0.085,
+        "http11.receive_response_headers.complete": 0.585,
+        "http11.receive_response_body.complete": 0.785,
+        "decode.started": 0.785,
+        "decode.complete": 0.790,
+    })
+    phases = trace.phases()
+    expected = {"dns": 0.010, "connect": 0.020, "tls": 0.050, "send": 0.005, "server_wait": 0.5, "body": 0.2,
+                "decode": 0.005}
+    assert list(phases) == PHASES
+    assert phases == pytest.approx(expected)
+    assert trace.connection_reused() is False
+    assert trace.connection_setup() == pytest.approx(0.080)
+
+
+def test_phases_on_a_reused_connection():
+    trace = trace_of({
+        "http11.send_request_headers.started": 0.0,
+        "http11.send_request_body.complete": 0.001,
+        "http11.receive_response_headers.complete": 0.301,
+        "response.body.complete": 0.401,
+    })
+    phases = trace.phases()
+    assert (phases["dns"], phases["connect"], phases["tls"]) == (0.0, 0.0, 0.0)
+    assert phases["body"] == pytest.approx(0.1)
+    assert phases["decode"] is None
+    assert trace.connection_reused() is True
+    assert trace.connection_setup() == 0.0
+
+
+def test_bedrock_tls_is_the_rest_of_connect():
+    trace = trace_of({
+        "connection.connect.started": 0.0,
+        "connection.connect_tcp.started": 0.0,
+        "dns.started": 0.0,
+        "dns.complete": 0.005,
+        "connection.connect_tcp.complete": 0.025,
+        "connection.connect.complete": 0.065,
+        "request.write.started": 0.065,
+        "request.write.complete": 0.070,
+        "response.headers.complete": 0.470,
+        "response.body.complete": 0.570,
+        "decode.complete": 0.575,
+    })
+    phases = trace.phases()
+    assert phases["connect"] == pytest.approx(0.020)
+    assert phases["tls"] == pytest.approx(0.040)
+    assert phases["send"] == pytest.approx(0.005)
+    # The SDK parsed the body itself, so decode runs from the body's end
+    assert phases["decode"] == pytest.approx(0.005)
+
+
+def test_untraced_request_has_no_phases():
+    trace = RequestTrace()
+    assert trace.phases() == {phase: None for phase in PHASES}
+    assert trace.connection_reused() is None
+
+
+def test_create_connection_falls_back_across_addresses(monkeypatch):
+    addresses = [
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("2001:db8::1", 443, 0, 0)),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", 443)),
+    ]
+    monkeypatch.setattr(connection_trace.socket, "getaddrinfo", lambda *args: addresses)
+    tried = []
+
+    def create_connection(address, *args, **kwargs):
+        tried.append(address)
+        if ":" in address[0]:
+            raise OSError("network unreachable")
+        return "connected"
+
+    wrapper = connection_trace.traced_create_connection(create_connection)
+    trace = RequestTrace()
+    token = current_trace.set(trace)
+    try:
+        assert wrapper(("bedrock.example", 443), 5) == "connected"
+        assert tried == [("2001:db8::1", 443), ("192.0.2.1", 443)]
+
+        def unreachable(address, *args, **kwargs):
+            raise OSError(f"unreachable {address[0]}")
+
+        with pytest.raises(OSError, match="192.0.2.1"):
+            connection_trace.traced_create_connection(unreachable)(("bedrock.example", 443), 5)
+    finally:
+        current_trace.reset(token)
+    assert "dns.complete" in trace.events
+
+
+def test_simulated_azure_requests_are_traced(simulator):
+    config = azure_openai_demo.load_config(simulator)
+    config["stream"] = True
+
+    async def send_two():
+        client = azure_openai_demo.create_client(config)
+        traces = []
+        try:
+            for _ in range(2):
+                trace = RequestTrace()
+                token = current_trace.set(trace)
+                try:
+                    await azure_openai_demo.send_request(client, config, "hi")
+                finally:
+                    current_trace.reset(token)
+                traces.append(trace)
+        finally:
+            await azure_openai_demo.close_client(client)
+        return traces
+
+    for trace in asyncio.run(send_two()):
+        phases = trace.phases()
+        assert trace.connection_reused() is False  # The SDK closes a stream at [DONE]
+        assert phases["connect"] is not None
+        assert phases["server_wait"] > 0
+        assert phases["body"] is not None
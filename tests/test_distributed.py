@@ -0,0 +1,71 @@
+import asyncio
+import argparse
+
+import pytest
+
+import run_all_benchmarks
+from results_store import ResultsStore
+from distributed import TargetShare, share, worker_options
+
+
+def test_share_splits_requests_round_robin_and_skips_completed():
+    requests = [f"q{i}" for i in range(7)]
+    shares = [list(share(requests, worker, 3, {4})) for worker in range(3)]
+    assert shares == [[(0, "q0"), (3, "q3"), (6, "q6")], [(1, "q1")], [(2, "q2"), (5, "q5")]]
+
+
+def test_worker_options_divide_rate_limits():
+    args = argparse.Namespace(rpm=600, tpm=None, regions=["aws=us-west-2"], runs=10)
+    options = worker_options(args, "http://127.0.0.1:8700", 4)
+    assert options["rpm"] == 150
+    assert options["tpm"] is None
+    assert options["endpoint_url"] == "http://127.0.0.1:8700"
+    assert "regions" not in options
+
+
+class FailingWarmupProvider:
+    PROVIDER_NAME = "Failing"
+
+    def __init__(self):
+        self.closed = False
+
+    def load_config(self, endpoint_url=None):
+        return {"max_tokens": 10, "input_token_price": 0, "output_token_price": 0}
+
+    def authenticate(self, config):
+        return None
+
+    def create_client(self, config):
+        return object()
+
+    async def close_client(self, client):
+        self.closed = True
+
+    async def send_request(self, client, config, prompt):
+        raise KeyboardInterrupt  # Not an Exception, so it escapes the retry loop like a cancellation
+
+
+def test_prepare_closes_the_client_when_warmup_fails():
+    provider = FailingWarmupProvider()
+    options = argparse.Namespace(
+        endpoint_url=None, workload=None, question="hi", runs=2, prompt_cache=False, stream=False, rpm=None,
+        tpm=None, max_retries=0, deadline=None, hedge_percentile=None, hedge_min_samples=10,
+    )
+    target = TargetShare("Failing", provider, None, options, 0, 1, set())
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(target.prepare(warmup=1))
+    assert provider.closed
+
+
+def test_two_local_workers_share_one_run(simulator, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    run_all_benchmarks.main([
+        "--endpoint-url", simulator, "--workers", "2", "--runs", "5", "--run-id", "w1", "--quiet",
+    ])
+    store = ResultsStore("benchmark_results.db")
+    try:
+        for name, _, _ in run_all_benchmarks.providers:
+            assert store.completed_runs("w1", name) == set(range(5))
+            assert store.load_sketches("w1")[(name, "response_time")]["count"] == 5
+    finally:
+        store.close()
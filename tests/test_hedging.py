@@ -0,0 +1,89 @@
+import time
+import asyncio
+
+import pytest
+
+from hedging import LOSER_WAIT_FACTOR, DeadlineExceeded, HedgePolicy, send_attempt
+
+
+def scripted_send(*delays):
+    """A send() whose n-th call answers after delays[n] seconds (an exception instance is raised instead)."""
+    calls = []
+
+    async def send(provider, client, config, prompt):
+        delay = delays[len(calls)]
+        calls.append(delay)
+        if isinstance(delay, Exception):
+            raise delay
+        await asyncio.sleep(delay)
+        return {"response_time": delay, "ttft": None, "total_tokens": 10, "cost": 0.01}
+
+    send.calls = calls
+    return send
+
+
+def policy_hedging_after(seconds):
+    policy = HedgePolicy(95, min_samples=1)
+    policy.sketch.add(seconds)
+    return policy
+
+
+def attempt(config, send):
+    return asyncio.run(send_attempt(None, None, config, "hi", send))
+
+
+def test_fast_primary_is_not_hedged():
+    send = scripted_send(0.01)
+    result = attempt({"hedge": policy_hedging_after(0.2)}, send)
+    assert len(send.calls) == 1
+    assert result["hedged"] is False
+    assert result["unhedged_time"] == result["response_time"]
+
+
+def test_hedge_wins_and_the_loser_is_measured():
+    send = scripted_send(0.15, 0.02)
+    result = attempt({"hedge": policy_hedging_after(0.05)}, send)
+    assert len(send.calls) == 2
+    assert result["hedged"] is True
+    assert result["hedge_won"] is True
+    # Measured from the primary's start: the hedge delay plus the hedge's own latency
+    assert result["response_time"] == pytest.approx(0.07, abs=0.03)
+    # The primary finished within the loser wait, so its latency and tokens are real
+    assert result["unhedged_time"] == 0.15
+    assert result["hedge_tokens"] == 10
+
+
+def test_primary_wins_after_hedge_was_sent():
+    send = scripted_send(0.08, 0.5)
+    result = attempt({"hedge": policy_hedging_after(0.05)}, send)
+    assert result["hedged"] is True
+    assert result["hedge_won"] is False
+    assert result["response_time"] == 0.08
+
+
+def test_hung_loser_is_abandoned_without_a_deadline():
+    send = scripted_send(60, 0.02)
+    start_time = time.perf_counter()
+    result = attempt({"hedge": policy_hedging_after(0.05)}, send)
+    elapsed = time.perf_counter() - start_time
+    assert result["hedge_won"] is True
+    assert elapsed < 0.07 * LOSER_WAIT_FACTOR + 0.2
+    # Without the hedge the request would have taken at least as long as it was waited for
+    assert result["response_time"] < result["unhedged_time"] <= elapsed
+    assert result["hedge_tokens"] == 0
+
+
+def test_deadline_abandons_a_slow_attempt():
+    start_time = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        attempt({"deadline": 0.1}, scripted_send(5))
+    assert time.perf_counter() - start_time < 0.5
+
+
+def test_deadline_exceeded_is_a_timeout():
+    assert issubclass(DeadlineExceeded, TimeoutError)
+
+
+def test_primary_error_is_raised_when_nothing_succeeds():
+    with pytest.raises(ConnectionError):
+        attempt({"deadline": 1.0}, scripted_send(ConnectionError("reset")))
@@ -0,0 +1,42 @@
+import random
+import statistics
+
+from latency_sketch import DEFAULT_RELATIVE_ACCURACY, LatencySketch
+
+
+def sketch_of(values):
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 0.6) for _ in range(2000)]
+    sketch = sketch_of(values)
+    # "inclusive" interpolates between ranks at q * (n - 1), as LatencySketch.quantile does
+    exact = statistics.quantiles(values, n=100, method="inclusive")
+    for percentile in (1, 10, 50, 90, 95, 99):
+        expected = exact[percentile - 1]
+        assert abs(sketch.quantile(percentile / 100) - expected) <= DEFAULT_RELATIVE_ACCURACY * expected
+
+
+def test_merge_matches_one_sketch_of_all_values():
+    rng = random.Random(11)
+    first = [rng.uniform(0.5, 20) for _ in range(300)]
+    second = [rng.uniform(0.5, 20) for _ in range(500)]
+    merged = sketch_of(first).merge(sketch_of(second))
+    combined = sketch_of(first + second)
+    assert merged.count == combined.count == 800
+    assert merged.min == min(first + second)
+    assert merged.max == max(first + second)
+    assert merged.buckets == combined.buckets
+    assert abs(merged.mean() - statistics.mean(first + second)) < 1e-9
+    assert abs(merged.stddev() - statistics.stdev(first + second)) < 1e-9
+
+
+def test_merge_survives_round_trip_through_dict():
+    sketch = sketch_of([0.0, 1.2, 3.4, 5.6])
+    restored = LatencySketch.from_dict(sketch.to_dict())
+    assert restored.stats() == sketch.stats()
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import BURST_SECONDS, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_starts_full(clock):
+    bucket = TokenBucket(600)
+    assert bucket.rate == 10
+    assert bucket.tokens == bucket.capacity == 10 * BURST_SECONDS
+
+
+def test_refill_adds_rate_per_second_up_to_capacity(clock):
+    bucket = TokenBucket(600)
+    bucket.tokens = 0
+    clock.now += 2.5
+    bucket.refill()
+    assert bucket.tokens == pytest.approx(25)
+    clock.now += 60
+    bucket.refill()
+    assert bucket.tokens == bucket.capacity
+
+
+def test_refund_is_capped_at_capacity(clock):
+    bucket = TokenBucket(600)
+    bucket.tokens = bucket.capacity - 5
+    bucket.refund(50)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_acquire_waits_for_refill():
+    bucket = TokenBucket(6000)  # 100 per second
+    bucket.tokens = 0
+
+    waited = asyncio.run(bucket.acquire(5))
+    assert waited == pytest.approx(0.05, abs=0.01)
+    assert bucket.tokens < 1
+
+
+def test_oversized_request_leaves_bucket_in_debt(clock):
+    bucket = TokenBucket(60)
+    waited = asyncio.run(bucket.acquire(bucket.capacity + 4))
+    assert waited == 0
+    assert bucket.tokens == -4
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from response_cache import KEY_FIELDS, CacheMissError, ResponseCache, cache_key
+
+CONFIG = {
+    "model": "gpt-4", "deployment": "gpt-4", "region": "eastus2", "endpoint_url": None, "system": None,
+    "max_tokens": 100, "temperature": 1.0, "top_p": 1.0, "seed": None, "stream": False,
+}
+
+
+class FakeProvider:
+    PROVIDER_NAME = "Fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def send_request(self, client, config, prompt):
+        self.calls += 1
+        result = {"response_time": 0.25, "total_tokens": 10, "response": f"answer {self.calls}", "error": None}
+        if config.get("keep_raw"):
+            result["raw"] = {"id": self.calls}
+        return result
+
+
+@pytest.mark.parametrize("field", KEY_FIELDS)
+def test_every_key_field_changes_the_key(field):
+    changed = dict(CONFIG, **{field: "something else"})
+    assert cache_key("Fake", changed, "hi") != cache_key("Fake", CONFIG, "hi")
+
+
+def test_endpoint_separates_simulated_from_real_responses():
+    simulated = dict(CONFIG, endpoint_url="http://127.0.0.1:8700", region="local")
+    assert cache_key("Fake", simulated, "hi") != cache_key("Fake", dict(simulated, endpoint_url=None), "hi")
+
+
+def test_fields_outside_the_key_are_ignored():
+    assert cache_key("Fake", dict(CONFIG, rate_limiter=object()), "hi") == cache_key("Fake", CONFIG, "hi")
+
+
+def test_record_then_replay(tmp_path):
+    provider = FakeProvider()
+    recorder = ResponseCache(str(tmp_path), mode="record")
+    recorded = asyncio.run(recorder.send(provider, None, CONFIG, "hi"))
+    assert "raw" not in recorded
+
+    replayer = ResponseCache(str(tmp_path), mode="replay", replay_timing="instant")
+    replayed = asyncio.run(replayer.send(provider, None, CONFIG, "hi"))
+    assert replayed["response"] == "answer 1"
+    assert replayed["cached"] is True
+    assert provider.calls == 1
+
+    # A different endpoint is a different request, so it is a miss rather than a stale hit
+    with pytest.raises(CacheMissError):
+        asyncio.run(replayer.send(provider, None, dict(CONFIG, endpoint_url="http://127.0.0.1:8700"), "hi"))
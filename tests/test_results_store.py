@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import azure_openai_demo
+from workload import make_request
+from results_store import ResultsStore
+from benchmark_common import error_result, make_result, run_benchmark
+
+
+def stored_result(response):
+    return {"response_time": 1.0, "total_tokens": 10, "response": response, "error": None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def test_completed_runs_excludes_failures(store):
+    run_id = store.start_run("r1")
+    store.append(run_id, "Azure OpenAI", 0, stored_result("a"))
+    store.append(run_id, "Azure OpenAI", 1, dict(stored_result(""), error="HTTP 500"))
+    store.append(run_id, "Azure OpenAI", 2, stored_result("c"))
+    store.append(run_id, "GCP Vertex AI", 5, stored_result("d"))
+    assert store.completed_runs(run_id, "Azure OpenAI") == {0, 2}
+    assert store.next_run_index(run_id, "Azure OpenAI") == 3
+    assert store.next_run_index(run_id, "AWS Bedrock Claude") == 0
+
+
+def test_resume_picks_the_latest_run_and_survives_reopening(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.start_run("first")
+    run_id = store.start_run("second")
+    store.append(run_id, "Azure OpenAI", 0, stored_result("a"))
+    store.close()
+
+    store = ResultsStore(path)
+    try:
+        assert store.start_run(resume=True) == "second"
+        assert [r["response"] for r in store.iter_results("second", "Azure OpenAI")] == ["a"]
+    finally:
+        store.close()
+
+
+def test_resume_with_nothing_to_resume(store):
+    with pytest.raises(ValueError):
+        store.start_run(resume=True)
+
+
+def test_resumed_benchmark_skips_completed_runs(store, simulator, tmp_path):
+    run_id = store.start_run("r1")
+    config = azure_openai_demo.load_config(simulator)
+    store.append(run_id, "Azure OpenAI", 0, make_result(config, 1.0, 4, 6, 10, "kept"))
+    store.append(run_id, "Azure OpenAI", 1, error_result(config, RuntimeError("interrupted")))
+    requests = [make_request(f"question {i}") for i in range(3)]
+
+    averages = asyncio.run(run_benchmark(
+        azure_openai_demo, requests, str(tmp_path / "azure.csv"), config=config, store=store, run_id=run_id
+    ))
+
+    results = list(store.iter_results(run_id, "Azure OpenAI"))
+    assert [r["run_index"] for r in results] == [0, 1, 2]
+    # The completed run is left alone; the failed one is retried and the missing one sent
+    assert results[0]["response"] == "kept"
+    assert all(r["error"] is None and r["response"] for r in results)
+    assert store.completed_runs(run_id, "Azure OpenAI") == {0, 1, 2}
+    assert averages["sketches"]["response_time"].count == 3
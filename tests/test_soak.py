@@ -0,0 +1,32 @@
+from latency_sketch import LatencySketch
+from soak import RollingWindow, SoakMonitor
+
+
+def result(response_time, error=None):
+    return {"error": error, "throttled": False, "cost": 0.01, "response_time": response_time, "ttft": None}
+
+
+def test_rolling_window_expires_old_slots():
+    window = RollingWindow("1m", 60, slots=12)  # 5 s slots
+    window.add(result(1.0), now=0)
+    window.add(result(2.0), now=30)
+    window.add(result(None, error="boom"), now=31)
+    assert window.summary(now=59)["runs"] == 2
+    # At 62 s the slot holding the first result (0-5 s) has slid out of the window
+    summary = window.summary(now=62)
+    assert summary["runs"] == 1
+    assert summary["failed"] == 1
+    assert summary["stats"]["response_time"]["Max"] == 2.0
+    # And a minute after the last result, nothing is left
+    assert window.summary(now=95)["runs"] == 0
+    assert len(window.slots) == 0
+
+
+def test_resumed_monitor_keeps_stored_sketches():
+    stored = LatencySketch()
+    for value in (1.0, 2.0, 3.0):
+        stored.add(value)
+    monitor = SoakMonitor("Azure OpenAI", [("1m", 60)], {"response_time": stored.to_dict()})
+    monitor.add(result(4.0), now=0)
+    assert monitor.totals.sketches["response_time"].count == 4
+    assert monitor.totals.sketches["response_time"].max == 4.0
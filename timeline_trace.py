@@ -0,0 +1,235 @@
+# timeline_trace.py
+# Per-request timeline export. Averages stop explaining a run once requests are concurrent,
+# retried or hedged; with --trace-file every request is written as trace events in the
+# Chrome Trace Event format, which chrome://tracing and https://ui.perfetto.dev open as a
+# timeline of the whole session:
+#
+#   python run_all_benchmarks.py --simulate --stream --trace-file benchmark_trace.json
+#
+# Each provider (or region / model variant) is a process in the timeline and each request
+# an async track on it, holding:
+#
+#   request        span from entering the retry loop to the final result (or cancellation)
+#   queued         span waiting on the client-side rate limiter (rate_limiter.py)
+#   attempt        span of one call to the provider, with "sent", "first token", one
+#                  "chunk" per streamed content chunk and "done" instants
+#   hedge          a hedge's duplicate call (hedging.py), on its own track
+#   retry          instant for a failed attempt, with its error and whether it was throttled
+#   throttle wait  span of the backoff sleep before the next attempt
+#
+# Every event carries the provider and run index; "done" and the request's end carry the
+# token counts. Events are written to the file as they happen, one per line, rather than
+# held in memory, so a soak or load test can be traced for as long as it runs.
+
+import json
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+
+# The running TraceWriter, or None when no --trace-file was given (every hook is then a no-op)
+writer = None
+
+# (name, run index) of the request the current task is sending, set by the run loops
+current_run = contextvars.ContextVar("current_run", default=(None, None))
+
+# The RequestSpan of the request the current task is sending, for traced_send to find
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class TraceWriter:
+    """Streams Chrome Trace Event JSON (the array format) to a file, one event per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("[\n")
+        self.lock = threading.Lock()
+        self.first = True
+        self.origin = time.perf_counter()  # Timestamps are microseconds from here
+        self.pids = {}  # Process name -> pid
+        self.ids = itertools.count(1)  # Async track ids
+
+    def timestamp(self, perf_time):
+        return round((perf_time - self.origin) * 1_000_000, 1)
+
+    def pid(self, name):
+        """The pid for a provider name, naming the process in the timeline the first time it is seen."""
+        with self.lock:
+            if name in self.pids:
+                return self.pids[name]
+            pid = self.pids[name] = len(self.pids) + 1
+        self.write({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+        return pid
+
+    def write(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(line if self.first else ",\n" + line)
+            self.first = False
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.write("\n]\n")
+                self.file.close()
+
+
+class RequestSpan:
+    """One request's async track: the provider it is labelled with and its calls in flight."""
+
+    def __init__(self, name, run_index):
+        self.name = name
+        self.pid = writer.pid(name)
+        self.id = next(writer.ids)
+        self.args = {"provider": name, "run": run_index}
+        self.open_calls = 0
+        self.token = None
+
+    def event(self, phase, name, perf_time=None, track=None, **args):
+        if writer is None:
+            # The trace was finished while this request was still running
+            return
+        writer.write({
+            "name": name,
+            "cat": "request",
+            "ph": phase,
+            "ts": writer.timestamp(time.perf_counter() if perf_time is None else perf_time),
+            "pid": self.pid,
+            "tid": 0,
+            "id": self.id if track is None else track,
+            "args": dict(self.args, **args),
+        })
+
+
+def start_trace(path):
+    """Start writing the timeline to `path` and make the request path emit events to it."""
+    global writer
+    writer = TraceWriter(path)
+    return writer
+
+
+def stop_trace():
+    """Finish the trace file, if one is being written."""
+    global writer
+    if writer is not None:
+        writer.close()
+        print(f"Request timeline written to {writer.path}")
+        writer = None
+
+
+def set_run(name, run_index):
+    """Label the current task's following requests with `name` (e.g. a region or model variant) and run index."""
+    current_run.set((name, run_index))
+
+
+def token_args(result):
+    return {
+        "prompt_tokens": result["prompt_tokens"],
+        "completion_tokens": result["completion_tokens"],
+        "total_tokens": result["total_tokens"],
+    }
+
+
+def request_started(provider):
+    """Open a request's track; returns its RequestSpan, or None when not tracing."""
+    if writer is None:
+        return None
+    name, run_index = current_run.get()
+    span = RequestSpan(name or provider.PROVIDER_NAME, run_index)
+    span.token = current_request.set(span)
+    span.event("b", "request")
+    return span
+
+
+def waited(span, name, started):
+    """Record a wait ("queued" or "throttle wait") that began at perf_counter time `started`."""
+    if span is None:
+        return
+    now = time.perf_counter()
+    if now - started < 0.0005:
+        # The limiter let the request straight through
+        return
+    span.event("b", name, started)
+    span.event("e", name, now)
+
+
+def retried(span, error, throttled):
+    if span is not None:
+        span.event("n", "retry", error=str(error), throttled=throttled)
+
+
+def request_done(span, result):
+    if span is None:
+        return
+    span.event("e", "request", error=result["error"], retries=result["retries"], **token_args(result))
+    current_request.reset(span.token)
+
+
+def request_aborted(span, error):
+    """Close a request's track when it is cancelled or raises instead of returning a result."""
+    if span is None:
+        return
+    cancelled = isinstance(error, asyncio.CancelledError)
+    span.event("e", "request", error="cancelled" if cancelled else str(error) or type(error).__name__)
+    current_request.reset(span.token)
+
+
+def call_started():
+    """
+    Open one call to the provider on the current request's track. A call made while
+    another is still running is a hedge and gets a track of its own.
+    Returns (span, track id, name, sent time), or None when not tracing.
+    """
+    span = current_request.get()
+    if span is None or writer is None:
+        return None
+    name = "hedge" if span.open_calls else "attempt"
+    track = next(writer.ids) if span.open_calls else span.id
+    span.open_calls += 1
+    sent = time.perf_counter()
+    span.event("b", name, sent, track)
+    span.event("n", "sent", sent, track)
+    return span, track, name, sent
+
+
+def call_done(call, trace, result=None, error=None):
+    """
+    Close a call opened by call_started, adding its first token and chunk instants from the
+    RequestTrace (connection_trace.py) and its token counts or error.
+    """
+    if call is None:
+        return
+    span, track, name, sent = call
+    span.open_calls -= 1
+    if writer is None:
+        return
+    chunk_times = trace.chunk_times or []
+    for n, chunk_time in enumerate(chunk_times):
+        if n == 0:
+            span.event("n", "first token", chunk_time, track)
+        span.event("n", "chunk", chunk_time, track, chunk=n + 1)
+    args = token_args(result) if result is not None else {"error": str(error) or type(error).__name__}
+    now = time.perf_counter()
+    span.event("n", "done", now, track, **args)
+    span.event("e", name, now, track, **args)
+
+
+def add_trace_arguments(parser):
+    """Add the shared --trace-file option to a script's argument parser."""
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default=None,
+        help="Write every request's timeline to this Chrome trace / Perfetto JSON file."
+    )
+
+
+def trace_from_args(args):
+    """Start the timeline trace if --trace-file was given; returns the TraceWriter or None."""
+    if args.trace_file is None:
+        return None
+    return start_trace(args.trace_file)
@@ -0,0 +1,99 @@
+# workload.py
+# JSONL workload files: one request per line, read lazily so arbitrarily large files are
+# never held in memory. Each line is a JSON object such as
+#
+#   {"prompt": "Summarise ...", "system": "You are terse.", "max_tokens": 512,
+#    "temperature": 0.2, "tags": ["summarise", "short"]}
+#
+# Only "prompt" is required. "max_tokens", "temperature" and "system" override the
+# provider's defaults for that request; "tags" group results in the summary.
+
+import json
+
+# Request fields that override the provider config for a single call
+OVERRIDE_FIELDS = ["system", "max_tokens", "temperature"]
+
+
+def make_request(prompt, system=None, max_tokens=None, temperature=None, tags=None):
+    """Build a workload request item."""
+    if isinstance(tags, str):
+        tags = [tags]
+    return {
+        "prompt": prompt,
+        "system": system,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "tags": list(tags or []),
+    }
+
+
+def read_workload(path):
+    """Yield request items from a JSONL workload file one line at a time."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+            if not isinstance(data, dict) or not data.get("prompt"):
+                raise ValueError(f"{path}:{line_number}: each line needs a non-empty 'prompt'")
+            yield make_request(
+                data["prompt"],
+                data.get("system"),
+                data.get("max_tokens"),
+                data.get("temperature"),
+                data.get("tags"),
+            )
+
+
+def cycle_workload(path):
+    """Yield request items forever, re-reading the file from the start each time it runs out."""
+    while True:
+        empty = True
+        for request in read_workload(path):
+            empty = False
+            yield request
+        if empty:
+            raise ValueError(f"{path}: workload file has no requests")
+
+
+def repeat_question(question, num_runs=None):
+    """Yield the same question `num_runs` times (the classic --question benchmark), or forever when None."""
+    runs = 0
+    while num_runs is None or runs < num_runs:
+        runs += 1
+        yield make_request(question)
+
+
+def load_requests(workload_path, question, num_runs):
+    """
+    Return the request iterator for a script: the workload file if given, else the repeated
+    question. With `num_runs` None (adaptive sampling) the requests never run out and the
+    caller decides when to stop, cycling through the workload file as needed.
+    """
+    if workload_path:
+        return read_workload(workload_path) if num_runs is not None else cycle_workload(workload_path)
+    return repeat_question(question, num_runs)
+
+
+def to_jsonl(items):
+    """Encode items as JSONL bytes, e.g. a batch job's input file."""
+    return "".join(json.dumps(item) + "\n" for item in items).encode("utf-8")
+
+
+def parse_jsonl(text):
+    """Decode JSONL text, e.g. a batch job's output file, skipping blank lines."""
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def request_config(config, request):
+    """Return the provider config with this request's overrides applied."""
+    overrides = {field: request[field] for field in OVERRIDE_FIELDS if request.get(field) is not None}
+    if not overrides:
+        return config
+    merged = dict(config)
+    merged.update(overrides)
+    return merged